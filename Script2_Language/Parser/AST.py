@@ -0,0 +1,364 @@
+"""
+AST node classes for the Script2 language parser
+
+Every node type has a small integer opcode so consumers can dispatch with an
+integer comparison instead of comparing string tags. Nodes use __slots__, so they
+carry no per-instance dict.
+
+Statement line numbers are not stored on the nodes: the block built by the parser
+keeps the line of every statement under it, nested ones included, in one array
+(StatementBlock.lines, walked with StatementBlock.statement_lines()). A line
+number in an int object of its own costs more than most nodes do.
+
+Nodes also behave like the tuples the parser used to produce, e.g.
+('if', condition, body) or ('do', command, *args): indexing, len(), iteration,
+repr() and equality all go through legacy(), so code written against the tuple
+AST keeps working while it is moved over to attribute access.
+
+Literals are typed by the lexer: integers are ints and quoted strings are
+StringLiteral, so only identifiers reach the AST as plain str.
+"""
+
+# Opcodes, one per node type. They start at 1 so an opcode is never falsy.
+OP_SCRIPT = 1
+OP_STATEMENTS = 2
+OP_IF = 3
+OP_IF_ELSE = 4
+OP_DO = 5
+OP_SET = 6
+OP_EVERY = 7
+OP_MULTIPLY = 8
+OP_DIVIDE = 9
+OP_INCREMENT = 10
+OP_DECREMENT = 11
+OP_BINARY = 12
+
+# Operator lexemes that build a BinaryExpression (legacy form: (operator, left, right))
+BINARY_OPERATORS = frozenset(['==', '!=', '<', '>', '<=', '>=', 'AND', '&&', '+', '-', '*', '/'])
+
+class Node:
+    """
+    Base class of all AST nodes. Every node class defines legacy(), which returns
+    the node as the tuple the parser used to produce; the tuple behaviour below
+    is built on it.
+    """
+    __slots__ = ()
+    op = None
+    tag = None
+    # Attributes holding nested statement lists, in source order
+    blocks = ()
+    # Constructor arguments, in order (the node's whole value, e.g. for serializing it)
+    fields = ()
+
+    def __getitem__(self, index):
+        return self.legacy()[index]
+
+    def __len__(self):
+        return len(self.legacy())
+
+    def __iter__(self):
+        return iter(self.legacy())
+
+    def __bool__(self):
+        return True
+
+    def __repr__(self):
+        return repr(self.legacy())
+
+    def __eq__(self, other):
+        # Structural comparison, line numbers are not part of a node's value
+        if isinstance(other, (Node, tuple)):
+            return self.legacy() == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.legacy())
+
+class StringLiteral(str):
+    """A quoted string from the script. The value is the text between the quotes."""
+    __slots__ = ()
+
+    def source(self):
+        """The literal as written in the script, quotes included"""
+        return f'"{self}"'
+
+    def __repr__(self):
+        return f"StringLiteral({str.__repr__(self)})"
+
+# Marks the end of a statement list in StatementBlock.statement_lines()
+_DONE = object()
+
+class Script(Node):
+    """COMPUTER_PLAYER player BEGIN ... END"""
+    __slots__ = ('player', 'body', 'lineno')
+    op = OP_SCRIPT
+    tag = 'script'
+    fields = ('player', 'body', 'lineno')
+
+    def __init__(self, player, body, lineno=0):
+        self.player = player
+        self.body = body
+        self.lineno = lineno
+
+    def legacy(self):
+        return ('script', self.player, self.body)
+
+class StatementBlock(Node):
+    """
+    BEGIN statement_list END. When built by the parser it also records, as arrays:
+    lines, the line of every statement in the block, nested ones included, in
+    source order; firsts, the index in lines of each statement of the block itself;
+    starts, the source offset of each statement of the block itself. With the
+    offset and line of the closing END, incremental reparsing uses these to find
+    statement spans.
+    """
+    __slots__ = ('statements', 'lineno', 'lines', 'firsts', 'starts', 'end_lexpos', 'end_lineno')
+    op = OP_STATEMENTS
+    tag = 'statements'
+    fields = __slots__
+
+    def __init__(self, statements, lineno=0, lines=None, firsts=None, starts=None, end_lexpos=None, end_lineno=0):
+        self.statements = statements
+        self.lineno = lineno
+        self.lines = lines
+        self.firsts = firsts
+        self.starts = starts
+        self.end_lexpos = end_lexpos
+        self.end_lineno = end_lineno
+
+    def legacy(self):
+        return ('statements', self.statements)
+
+    def statement_lines(self):
+        """Yield (statement, line) for every statement in the block, nested ones included, in source order"""
+        lines = iter(self.lines) if self.lines is not None else None
+        stack = [iter(self.statements)]
+        while stack:
+            statement = next(stack[-1], _DONE)
+            if statement is _DONE:
+                stack.pop()
+                continue
+            yield statement, next(lines) if lines is not None else None
+            # Push the nested blocks last to first so the first one is walked next
+            if isinstance(statement, Node):
+                for name in reversed(statement.blocks):
+                    stack.append(iter(getattr(statement, name)))
+
+    def statement_lineno(self, index):
+        """Line of the index-th statement of the block itself"""
+        return self.lines[self.firsts[index]]
+
+class IfStatement(Node):
+    __slots__ = ('condition', 'body')
+    op = OP_IF
+    tag = 'if'
+    blocks = ('body',)
+    fields = __slots__
+
+    def __init__(self, condition, body):
+        self.condition = condition
+        self.body = body
+
+    def legacy(self):
+        return ('if', self.condition, self.body)
+
+class IfElseStatement(Node):
+    __slots__ = ('condition', 'body', 'else_body')
+    op = OP_IF_ELSE
+    tag = 'if-else'
+    blocks = ('body', 'else_body')
+    fields = __slots__
+
+    def __init__(self, condition, body, else_body):
+        self.condition = condition
+        self.body = body
+        self.else_body = else_body
+
+    def legacy(self):
+        return ('if-else', self.condition, self.body, self.else_body)
+
+class DoStatement(tuple, Node):
+    """
+    DO command args..., where args is a tuple. A DO node is its own legacy tuple
+    ('do', command, *args), so it costs a single object however many arguments it
+    has, and indexing, len(), repr() and equality are plain tuple operations.
+    """
+    __slots__ = ()
+    op = OP_DO
+    tag = 'do'
+    fields = ('command', 'args')
+
+    def __new__(cls, command, args=()):
+        return tuple.__new__(cls, ('do', command) + tuple(args))
+
+    @property
+    def command(self):
+        return self[1]
+
+    @property
+    def args(self):
+        return self[2:]
+
+    def legacy(self):
+        return tuple(self)
+
+    def __reduce__(self):
+        return (DoStatement, (self[1], self[2:]))
+
+class SetStatement(Node):
+    __slots__ = ('target', 'value')
+    op = OP_SET
+    tag = 'set'
+    fields = __slots__
+
+    def __init__(self, target, value):
+        self.target = target
+        self.value = value
+
+    def legacy(self):
+        return ('set', self.target, self.value)
+
+class EveryStatement(Node):
+    """EVERY period [offset] BEGIN ... END, offset is None when omitted"""
+    __slots__ = ('period', 'offset', 'body')
+    op = OP_EVERY
+    tag = 'every'
+    blocks = ('body',)
+    fields = __slots__
+
+    def __init__(self, period, offset, body):
+        self.period = period
+        self.offset = offset
+        self.body = body
+
+    def legacy(self):
+        return ('every', self.period, self.offset, self.body)
+
+class _ArithmeticStatement(Node):
+    """Layout shared by MULTIPLY and DIVIDE: target left right"""
+    __slots__ = ('target', 'left', 'right')
+    fields = __slots__
+
+    def __init__(self, target, left, right):
+        self.target = target
+        self.left = left
+        self.right = right
+
+    def legacy(self):
+        return (self.tag, self.target, self.left, self.right)
+
+class MultiplyStatement(_ArithmeticStatement):
+    """MULTIPLY target left right"""
+    __slots__ = ()
+    op = OP_MULTIPLY
+    tag = 'multiply'
+
+class DivideStatement(_ArithmeticStatement):
+    """DIVIDE target left right"""
+    __slots__ = ()
+    op = OP_DIVIDE
+    tag = 'divide'
+
+class _StepStatement(Node):
+    """Layout shared by INCREMENT and DECREMENT: target amount"""
+    __slots__ = ('target', 'amount')
+    fields = __slots__
+
+    def __init__(self, target, amount):
+        self.target = target
+        self.amount = amount
+
+    def legacy(self):
+        return (self.tag, self.target, self.amount)
+
+class IncrementStatement(_StepStatement):
+    """INCREMENT target amount"""
+    __slots__ = ()
+    op = OP_INCREMENT
+    tag = 'increment'
+
+class DecrementStatement(_StepStatement):
+    """DECREMENT target amount"""
+    __slots__ = ()
+    op = OP_DECREMENT
+    tag = 'decrement'
+
+class BinaryExpression(Node):
+    """left operator right, where operator is the source lexeme ('+', '==', '&&', ...)"""
+    __slots__ = ('operator', 'left', 'right')
+    op = OP_BINARY
+    fields = __slots__
+
+    def __init__(self, operator, left, right):
+        self.operator = operator
+        self.left = left
+        self.right = right
+
+    @property
+    def tag(self):
+        return self.operator
+
+    def legacy(self):
+        return (self.operator, self.left, self.right)
+
+# Node class of each opcode
+NODE_CLASSES = {cls.op: cls for cls in (
+    Script, StatementBlock, IfStatement, IfElseStatement, DoStatement, SetStatement, EveryStatement,
+    MultiplyStatement, DivideStatement, IncrementStatement, DecrementStatement, BinaryExpression
+)}
+
+def _expression_operands(value):
+    """Operands of a legacy (operator, left, right) tuple, nothing for anything else"""
+    if isinstance(value, tuple) and len(value) == 3 and value[0] in BINARY_OPERATORS:
+        return value[1:]
+    return ()
+
+def _build_expression(value, operands, depth):
+    if operands:
+        return BinaryExpression(value[0], *operands)
+    return value
+
+def _expression(value):
+    # Imported here: the walker imports this module
+    from Parser.Walker import walk
+    return walk(value, post=_build_expression, children=_expression_operands)
+
+def _do_statement(command, *args):
+    return DoStatement(command, args)
+
+# Builders for each legacy tuple tag, called with the tuple items after the tag
+LEGACY_BUILDERS = {
+    'script': Script,
+    'statements': StatementBlock,
+    'if': lambda condition, body: IfStatement(_expression(condition), body),
+    'if-else': lambda condition, body, else_body: IfElseStatement(_expression(condition), body, else_body),
+    'do': _do_statement,
+    'set': lambda target, value: SetStatement(target, _expression(value)),
+    'every': EveryStatement,
+    'multiply': MultiplyStatement,
+    'divide': DivideStatement,
+    'increment': IncrementStatement,
+    'decrement': DecrementStatement,
+}
+
+def as_node(value, aliases=None):
+    """
+    Build a node from a legacy tuple. Nested statement lists are left as they are,
+    they are converted when they are visited. Nodes, tuples with an unknown tag or
+    the wrong number of items and anything else are returned unchanged.
+    aliases maps other tag names onto the parser's tags.
+    """
+    if isinstance(value, Node) or not isinstance(value, tuple) or not value:
+        return value
+    tag = value[0]
+    if aliases:
+        tag = aliases.get(tag, tag)
+    if tag in BINARY_OPERATORS:
+        return _expression(value)
+    builder = LEGACY_BUILDERS.get(tag)
+    if builder is None:
+        return value
+    try:
+        return builder(*value[1:])
+    except TypeError:
+        return value
@@ -0,0 +1,110 @@
+"""
+Parse diagnostics for the Script2 language parser
+"""
+import sys
+from collections import deque
+import ply.yacc as yacc
+
+# Number of parser actions kept for error reports
+DEFAULT_TRACE_SIZE = 32
+
+class SyntaxErrorInfo:
+    """One syntax error found while parsing: where it is and the token the parser could not accept"""
+    __slots__ = ('lineno', 'token_type', 'value', 'lexpos')
+
+    def __init__(self, lineno, token_type, value, lexpos=None):
+        self.lineno = lineno          # Line of the offending token (last line read at end of script)
+        self.token_type = token_type  # Token type, or None at the end of the script
+        self.value = value
+        self.lexpos = lexpos
+
+    def __str__(self):
+        if self.token_type is None:
+            return f"line {self.lineno}: unexpected end of script"
+        return f"line {self.lineno}: unexpected {self.token_type} '{self.value}'"
+
+    def __repr__(self):
+        return f"SyntaxErrorInfo({self.lineno!r}, {self.token_type!r}, {self.value!r}, {self.lexpos!r})"
+
+class ArgumentErrorInfo(SyntaxErrorInfo):
+    """A DO statement whose arguments fit none of the shapes in its command signature"""
+    __slots__ = ('args', 'expected')
+
+    def __init__(self, lineno, command, args, expected, lexpos=None):
+        super().__init__(lineno, 'DO', command, lexpos)
+        self.args = args          # Arguments as parsed
+        self.expected = expected  # Shape strings the command accepts
+
+    def __str__(self):
+        given = ' '.join(str(arg) for arg in self.args) or 'no arguments'
+        shapes = ' or '.join(f"'{shape}'" if shape else 'no arguments' for shape in self.expected)
+        return f"line {self.lineno}: DO {self.value} takes {shapes}, got {given}"
+
+    def __repr__(self):
+        return (f"ArgumentErrorInfo({self.lineno!r}, {self.value!r}, {self.args!r}, "
+                f"{self.expected!r}, {self.lexpos!r})")
+
+class Script2SyntaxError(Exception):
+    """
+    Raised when a script has syntax errors. errors lists every one found in the
+    parse, in source order, and ast is the partial AST of the statements the
+    parser recovered (None when not even the script header could be read).
+    """
+    def __init__(self, errors, ast=None, details=''):
+        self.errors = errors
+        self.ast = ast
+        count = len(errors)
+        lines = [f"Parsing failed: {count} syntax error{'s' if count != 1 else ''}"]
+        lines.extend(f"  {error}" for error in errors)
+        if details:
+            lines.append(details)
+        super().__init__('\n'.join(lines))
+
+class ParseTrace:
+    """
+    Ring buffer of the most recent tokens shifted and rules reduced by the parser.
+    Recording is a single deque append, so it stays on for production parses.
+    """
+    def __init__(self, size=DEFAULT_TRACE_SIZE):
+        self.events = deque(maxlen=size)
+
+    def clear(self):
+        self.events.clear()
+
+    def shift(self, tok):
+        self.events.append(('shift', tok))
+
+    def reduce(self, rule):
+        self.events.append(('reduce', rule))
+
+    def format(self):
+        """Render the buffered actions, oldest first"""
+        lines = []
+        for action, item in self.events:
+            if action == 'shift':
+                lines.append(f"  shift  {item.type} '{item.value}' (line {item.lineno})")
+            else:
+                lines.append(f"  reduce {item}")
+        return '\n'.join(lines) if lines else '  (no parser actions recorded)'
+
+def _traced_reduction(func, rule):
+    """Wrap a production function so each reduction is recorded in the parser trace"""
+    def reduce(p):
+        p.parser.trace.reduce(rule)
+        return func(p)
+    reduce.__name__ = func.__name__
+    reduce.__doc__ = func.__doc__
+    return reduce
+
+def trace_reductions(parser, trace=None):
+    """Attach a ParseTrace to the parser and record every reduction into it"""
+    parser.trace = trace if trace is not None else ParseTrace()
+    for production in parser.productions:
+        if production.callable is not None:
+            production.callable = _traced_reduction(production.callable, production.str)
+    return parser.trace
+
+def debug_reparse(parser, lexer, script_code, stream=None):
+    """Parse a script again with full PLY debug tracing. Only used after a parse has failed."""
+    logger = yacc.PlyLogger(stream if stream is not None else sys.stderr)
+    return parser.parse(script_code, lexer=lexer, debug=logger)
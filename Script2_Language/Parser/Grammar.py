@@ -1,36 +1,35 @@
 """
 Grammar rules for the Script2 language parser
 """
-import sys
-import os
-
-# Fix import path if needed
-sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
-from Utils.Constants_Loader import STATE_TOKENS, DO_COMMANDS, OPERATORS
-
-# Dynamically build the state_token rule based on constants
-state_token_rule = '\n        state_token : ' + '\n                   | '.join(STATE_TOKENS)
-
-# Dynamically build a general DO command rule
-do_commands_rule = '\n        do_command : ' + '\n                  | '.join(DO_COMMANDS)
 
 # Production rules
 grammar_rules = {
     'script': '''
-        script : COMPUTER_PLAYER IDENTIFIER statements
-              | COMPUTER_PLAYER IDENTIFIER statements SCRIPT_END
+        script : COMPUTER_PLAYER operand statements
+              | COMPUTER_PLAYER operand statements SCRIPT_END
     ''',
 
     'statements': '''
         statements : BEGIN statement_list END
     ''',
 
+    # Left recursive so long blocks reduce one statement at a time on a flat parser stack.
+    # The error alternative drops a broken statement and resumes at the next statement boundary.
     'statement_list': '''
-        statement_list : statement statement_list
-                     | statement
+        statement_list : statement_list statement
+                     | statement_list error
                      | empty
     ''',
 
+    # Same as statement_list, for the blocks of an IF. Kept apart because these blocks can
+    # also be closed by ENDIF: error recovery then only resumes on an ENDIF inside an IF,
+    # and a stray ENDIF anywhere else is skipped instead of ending the enclosing block.
+    'if_statement_list': '''
+        if_statement_list : if_statement_list statement
+                        | if_statement_list error
+                        | empty
+    ''',
+
     'statement': '''
         statement : if_statement
                  | do_statement
@@ -43,136 +42,21 @@ grammar_rules = {
     ''',
 
     'if_statement': '''
-        if_statement : IF LPAREN expression RPAREN BEGIN statement_list END ENDIF
-                    | IF LPAREN expression RPAREN BEGIN statement_list ENDIF
-                    | IF LPAREN expression RPAREN BEGIN statement_list END ELSE BEGIN statement_list END ENDIF
-                    | IF LPAREN expression RPAREN BEGIN statement_list END ELSE BEGIN statement_list ENDIF
+        if_statement : IF LPAREN expression RPAREN BEGIN if_statement_list END ENDIF
+                    | IF LPAREN expression RPAREN BEGIN if_statement_list ENDIF
+                    | IF LPAREN expression RPAREN BEGIN if_statement_list END ELSE BEGIN if_statement_list END ENDIF
+                    | IF LPAREN expression RPAREN BEGIN if_statement_list END ELSE BEGIN if_statement_list ENDIF
+                    | IF error ENDIF
     ''',
 
+    # One production for every DO command: which arguments a command takes is checked
+    # against its signature in constants.json (see Signatures.py), not by the grammar
     'do_statement': '''
-        do_statement : DO DISABLE_USER_INPUTS
-                    | DO PARTIAL_BUILDING_COUNT
-                    | DO ENABLE_USER_INPUTS
-                    | DO ONLY_STAND_AT_MARKERS
-                    | DO DELAY_MAIN_DRUM_TOWER
-                    | DO FLYBY_CREATE_NEW
-                    | DO TRIGGER_LEVEL_WON
-                    | DO COUNT_BLUE_IN_HOUSES IDENTIFIER
-                    | DO COUNT_BLUE_SHAPES IDENTIFIER
-                    | DO COUNT_BLUE_WITH_BUILD_COMMAND IDENTIFIER
-                    | DO MOVE_SHAMAN_TO_MARKER IDENTIFIER
-                    | DO IS_PLAYER_IN_WORLD_VIEW IDENTIFIER
-                    | DO GIVE_MANA_TO_PLAYER IDENTIFIER IDENTIFIER
-                    | DO TARGET_BLUE_SHAMAN
-                    | DO GET_NUM_PEOPLE_BEING_PREACHED IDENTIFIER IDENTIFIER
-                    | DO CLEAR_GUARDING_FROM IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO SET_AUTO_HOUSE ON
-                    | DO SET_AUTO_HOUSE OFF
-                    | DO SET_AUTO_BUILD ON
-                    | DO SET_AUTO_BUILD OFF
-                    | DO PREACH_AT_MARKER IDENTIFIER
-                    | DO CALL_TO_ARMS
-                    | DO FLYBY_ALLOW_INTERRUPT ON
-                    | DO FLYBY_ALLOW_INTERRUPT OFF
-                    | DO FLYBY_SET_EVENT_POS IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO FLYBY_SET_EVENT_ANGLE IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO FLYBY_SET_EVENT_ZOOM IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO FLYBY_SET_EVENT_TOOLTIP IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO FLYBY_SET_END_TARGET IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO REMOVE_PLAYER_THING IDENTIFIER IDENTIFIER
-                    | DO GIVE_PLAYER_SPELL IDENTIFIER IDENTIFIER
-                    | DO ZOOM_TO IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO KILL_TEAM_IN_AREA IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO SET_MSG_TIMEOUT IDENTIFIER
-                    | DO FLASH_BUTTON IDENTIFIER ON 
-                    | DO FLASH_BUTTON IDENTIFIER OFF
-                    | DO FLYBY_START
-                    | DO CLEAR_ALL_MSG
-                    | DO GIVE_UP_AND_SULK ON
-                    | DO GIVE_UP_AND_SULK OFF
-                    | DO TRAIN_PEOPLE_NOW IDENTIFIER IDENTIFIER
-                    | DO DEFEND_SHAMEN IDENTIFIER
-                    | DO REMOVE_HEAD_AT_POS IDENTIFIER IDENTIFIER
-                    | DO GET_HEIGHT_AT_POS IDENTIFIER IDENTIFIER
-                    | DO TRIGGER_THING IDENTIFIER
-                    | DO GET_NUM_ONE_OFF_SPELLS IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO GET_HEAD_TRIGGER_COUNT IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO CREATE_MSG_INFORMATION IDENTIFIER
-                    | DO SET_REINCARNATION ON
-                    | DO SET_REINCARNATION OFF
-                    | DO SET_DEFENCE_RADIUS IDENTIFIER
-                    | DO TURN_PUSH ON
-                    | DO TURN_PUSH OFF
-                    | DO SET_MSG_AUTO_OPEN_DLG
-                    | DO SET_MSG_DELETE_ON_OK
-                    | DO SET_BUCKET_USAGE ON
-                    | DO SET_BUCKET_USAGE OFF
-                    | DO FIX_WILD_IN_AREA IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO SET_ATTACK_VARIABLE IDENTIFIER
-                    | DO SET_BUCKET_COUNT_FOR_SPELL IDENTIFIER IDENTIFIER
-                    | DO SET_SPELL_ENTRY IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO STATE_SPELL_DEFENCE IDENTIFIER IDENTIFIER ON
-                    | DO STATE_SPELL_DEFENCE IDENTIFIER IDENTIFIER OFF
-                    | DO GET_SPELLS_CAST IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO SET_MARKER_ENTRY IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO MARKER_ENTRIES IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO COUNT_PEOPLE_IN_MARKER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO ATTACK IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO ATTACK IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO ATTACK IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO TURN_PANEL_ON IDENTIFIER
-                    | DO CREATE_MSG_INFORMATION_ZOOM IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO IDENTIFIER ON
-                    | DO IDENTIFIER OFF
-                    | DO state_token ON
-                    | DO state_token OFF
-                    | DO state_token INTEGER INTEGER
-                    | DO state_token INTEGER INTEGER INTEGER
-                    | DO state_token INTEGER INTEGER ON
-                    | DO state_token INTEGER INTEGER OFF
-                    | DO CONVERT_AT_MARKER IDENTIFIER 
-                    | DO DELETE_SMOKE_STUFF IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO CONVERT_AT_MARKER INTEGER
-                    | DO BUILD_MAIN_DRUM_TOWER
-                    | DO IS_BUILDING_NEAR IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER 
-                    | DO BOAT_PATROL IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO TRIGGER_LEVEL_LOST
-                    | DO IS_PRISON_ON_LEVEL IDENTIFIER
-                    | DO REMOVE_TIMER
-                    | DO GUARD_BETWEEN_MARKERS IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO IS_SHAMAN_AVAILABLE_FOR_ATTACK IDENTIFIER
-                    | DO HAS_TIMER_REACHED_ZERO
-                    | DO CREATE_MSG_NARRATIVE IDENTIFIER
-                    | DO SEND_SHAMEN_DEFENDERS_HOME
-                    | DO COUNT_ANGELS IDENTIFIER IDENTIFIER
-                    | DO NAV_CHECK IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO SPELL_AT_MARKER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO SET_DRUM_TOWER_POS IDENTIFIER IDENTIFIER
-                    | DO PUT_PERSON_IN_DT IDENTIFIER IDENTIFIER IDENTIFIER 
-                    | DO SEND_ALL_PEOPLE_TO_MARKER IDENTIFIER
-                    | DO BUILD_DRUM_TOWER IDENTIFIER IDENTIFIER
-                    | DO PRAY_AT_HEAD IDENTIFIER IDENTIFIER
-                    | DO I_HAVE_ONE_SHOT IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO GIVE_ONE_SHOT IDENTIFIER IDENTIFIER
-                    | DO SET_NO_BLUE_REINC IDENTIFIER
-                    | DO AUTO_MESSAGES OFF
-                    | DO MARVELLOUS_HOUSE_DEATH
-                    | DO EXTRA_WOOD_COLLECTION ON
-                    | DO EXTRA_WOOD_COLLECTION OFF
-                    | DO SET_TIMER_GOING IDENTIFIER
-                    | DO SET_WOOD_COLLECTION_RADII IDENTIFIER IDENTIFIER IDENTIFIER IDENTIFIER
-                    | DO TARGET_BLUE_DRUM_TOWERS
-                    | DO TARGET_S_WARRIORS
-                    | DO SET_BASE_MARKER IDENTIFIER
-                    | DO SET_BASE_RADIUS IDENTIFIER
-                    | DO do_command arg_list
+        do_statement : DO IDENTIFIER arg_list
     ''',
-    
-    'do_command': do_commands_rule,
-    
+
     'arg_list': '''
-        arg_list : arg arg_list
-                | arg
+        arg_list : arg_list arg
                 | empty
     ''',
     
@@ -191,28 +75,32 @@ grammar_rules = {
     ''',
 
     'every_statement': '''
-        every_statement : EVERY IDENTIFIER IDENTIFIER BEGIN statement_list END
-                       | EVERY IDENTIFIER BEGIN statement_list END
+        every_statement : EVERY operand operand BEGIN statement_list END
+                       | EVERY operand BEGIN statement_list END
     ''',
 
     'multiply_statement': '''
-        multiply_statement : MULTIPLY IDENTIFIER IDENTIFIER IDENTIFIER
+        multiply_statement : MULTIPLY IDENTIFIER operand operand
     ''',
 
     'increment_statement': '''
-        increment_statement : INCREMENT IDENTIFIER IDENTIFIER
+        increment_statement : INCREMENT IDENTIFIER operand
     ''',
 
     'decrement_statement': '''
-        decrement_statement : DECREMENT IDENTIFIER IDENTIFIER
+        decrement_statement : DECREMENT IDENTIFIER operand
     ''',
 
     'divide_statement': '''
-        divide_statement : DIVIDE IDENTIFIER IDENTIFIER IDENTIFIER
+        divide_statement : DIVIDE IDENTIFIER operand operand
     ''',
     
-    # Use the dynamically built state token rule
-    'state_token': state_token_rule,
+    # A single value: a name or a typed literal
+    'operand': '''
+        operand : IDENTIFIER
+               | INTEGER
+               | STRING
+    ''',
 
     'expression': '''
         expression : IDENTIFIER
@@ -230,7 +118,7 @@ grammar_rules = {
                   | expression PLUS expression
                   | expression MINUS expression
                   | expression TIMES expression
-                  | expression DIVIDE expression
+                  | expression SLASH expression
     ''',
 
     'empty': '''
@@ -243,5 +131,5 @@ precedence = (
     ('left', 'AND'),  # Lowest precedence
     ('left', 'EQ', 'LT', 'GT', 'LTE', 'GTE', 'NEQ'),
     ('left', 'PLUS', 'MINUS'),
-    ('left', 'TIMES', 'DIVIDE')
+    ('left', 'TIMES', 'SLASH')
 )
\ No newline at end of file
@@ -0,0 +1,99 @@
+"""
+Structural hashes of Script2 AST subtrees
+
+Each node is hashed from its opcode and the hashes of its fields, Merkle style, so
+two subtrees with the same statements, commands and values get the same hash
+wherever they appear. Positions (line numbers and offsets) are left out: a block
+copied to another place or another script hashes the same. Hashes are 16 byte
+blake2b digests, computed bottom-up in one walk over the tree.
+"""
+from hashlib import blake2b
+import sys
+import os
+
+# Fix import path if needed
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from Parser.AST import Node, DoStatement, StringLiteral, StatementBlock, Script, NODE_CLASSES
+from Parser.Walker import walk
+
+HASH_SIZE = 16
+
+# Fields that only say where a node is in the source
+_POSITION_FIELDS = frozenset(('lineno', 'lines', 'firsts', 'starts', 'end_lexpos', 'end_lineno'))
+
+# Fields hashed for each node class, in order
+_HASHED_FIELDS = {
+    cls: tuple(name for name in cls.fields if name not in _POSITION_FIELDS)
+    for cls in (Script, StatementBlock)
+}
+
+_OPCODE_BYTES = {op: op.to_bytes(1, 'little') for op in NODE_CLASSES}
+
+def _opcode_bytes(node):
+    """Opcode part of a node's hash; node classes defined outside the parser are told apart by name"""
+    opcode = _OPCODE_BYTES.get(node.op)
+    if opcode is None or NODE_CLASSES[node.op] is not type(node):
+        name = f"{type(node).__module__}.{type(node).__qualname__}:{node.op}".encode('utf-8')
+        opcode = b'x' + len(name).to_bytes(4, 'little') + name
+    return opcode
+
+def _leaf_bytes(value):
+    """Tagged encoding of a value that is not a node, so 1, '1' and "1" differ"""
+    value_type = type(value)
+    if value_type is str:
+        return b's' + value.encode('utf-8')
+    if value_type is int:
+        return b'i' + str(value).encode('ascii')
+    if value_type is StringLiteral:
+        return b'l' + value.encode('utf-8')
+    if value is None:
+        return b'n'
+    return b'r' + repr(value).encode('utf-8')
+
+def subtree_hashes(root, hashes=None):
+    """
+    Hash root and every node and statement list under it. Returns a dict mapping
+    id() of each node and list to its hash; it is only valid while the tree is alive.
+    Subtrees already in hashes are not hashed again.
+    """
+    if hashes is None:
+        hashes = {}
+    _hash(root, hashes)
+    return hashes
+
+def structural_hash(node):
+    """Hash of one subtree"""
+    return _hash(node, {})
+
+def _children(value):
+    if type(value) is DoStatement:
+        return value[1:]
+    if isinstance(value, Node):
+        if NODE_CLASSES.get(value.op) is not type(value):
+            return value.legacy()  # Node classes defined elsewhere are hashed by their whole value
+        return [getattr(value, name) for name in _HASHED_FIELDS.get(type(value), value.fields)]
+    return value
+
+def _hash(root, hashes):
+    # Each node and list stands in its parent as b'#' and its digest, a leaf as its tagged bytes
+
+    def pre(value, depth):
+        if isinstance(value, Node) or type(value) is list:
+            digest = hashes.get(id(value))
+            return None if digest is None else b'#' + digest
+        return _leaf_bytes(value)  # Leaves are hashed into their parent
+
+    def post(value, child_parts, depth):
+        parts = [_opcode_bytes(value) if isinstance(value, Node) else b'[']
+        for part in child_parts:
+            # Length prefix keeps the concatenation of the parts unambiguous
+            parts.append(len(part).to_bytes(4, 'little'))
+            parts.append(part)
+        digest = blake2b(b''.join(parts), digest_size=HASH_SIZE).digest()
+        hashes[id(value)] = digest
+        return b'#' + digest
+
+    part = walk(root, pre, post, _children)
+    if part[:1] == b'#':
+        return part[1:]
+    return blake2b(part, digest_size=HASH_SIZE).digest()
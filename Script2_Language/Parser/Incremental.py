@@ -0,0 +1,88 @@
+"""
+Incremental reparsing of edited top-level statements for the Script2 language parser
+"""
+import sys
+import os
+from array import array
+from bisect import bisect_right
+
+# Fix import path if needed
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from Parser.AST import Node, OP_SCRIPT, OP_STATEMENTS
+
+# Wraps a run of top-level statements so it parses as a script of its own. It is
+# kept on the first line of the fragment so the fragment's line numbers are unchanged,
+# and END follows the fragment on its last line so a comment left open there fails the parse.
+FRAGMENT_PREFIX = 'COMPUTER_PLAYER 0 BEGIN '
+FRAGMENT_SUFFIX = ' END'
+
+class EditRegion:
+    """The run of top-level statements touched by a text edit"""
+    def __init__(self, block, first, last, start, end, delta):
+        self.block = block          # StatementBlock holding the statements
+        self.first = first          # Index of the first statement to reparse
+        self.last = last            # Index of the last statement to reparse
+        self.start = start          # Offset of the region in the old and the new text
+        self.end = end              # Offset just past the region in the new text
+        self.delta = delta          # Change in text length made by the edit
+
+    def fragment(self, script_code):
+        """The region of the edited script, wrapped so it can be parsed on its own"""
+        return FRAGMENT_PREFIX + script_code[self.start:self.end] + FRAGMENT_SUFFIX
+
+def find_edit_region(ast, script_code, start, end, replacement):
+    """
+    Find the top-level statements affected by replacing script_code[start:end] with
+    replacement. Returns an EditRegion, or None when the edit cannot be handled by
+    reparsing statements alone and the whole script has to be parsed again.
+    """
+    if not isinstance(ast, Node) or ast.op != OP_SCRIPT:
+        return None
+    block = ast.body
+    if not isinstance(block, Node) or block.op != OP_STATEMENTS or not block.starts or block.lines is None:
+        return None
+    starts = block.starts
+
+    # Edits before the first statement or reaching the closing END change the script frame
+    if start < starts[0] or end >= block.end_lexpos or start > end:
+        return None
+    # A quote can pair with another one anywhere in the script, so it is never local
+    if '"' in replacement or '"' in script_code[start:end]:
+        return None
+
+    first = bisect_right(starts, start) - 1
+    last = bisect_right(starts, end) - 1
+    old_end = starts[last + 1] if last + 1 < len(starts) else block.end_lexpos
+    delta = len(replacement) - (end - start)
+    return EditRegion(block, first, last, starts[first], old_end + delta, delta)
+
+def splice_region(region, fragment_block, line_delta):
+    """
+    Replace the statements of the region with those parsed from its fragment, and move
+    the statements after it by the change in text length and line count of the edit
+    """
+    block = region.block
+    lines, firsts, starts = block.lines, block.firsts, block.starts
+    following = region.last + 1
+    # Span of the region's statements, nested ones included, in the line array
+    lines_start = firsts[region.first]
+    lines_end = firsts[following] if following < len(firsts) else len(lines)
+
+    if line_delta:
+        for index in range(lines_end, len(lines)):
+            lines[index] += line_delta
+    if region.delta:
+        for index in range(following, len(starts)):
+            starts[index] += region.delta
+    size_delta = len(fragment_block.lines) - (lines_end - lines_start)
+    if size_delta:
+        for index in range(following, len(firsts)):
+            firsts[index] += size_delta
+
+    offset = region.start - len(FRAGMENT_PREFIX)
+    block.statements[region.first:following] = fragment_block.statements
+    lines[lines_start:lines_end] = fragment_block.lines
+    firsts[region.first:following] = array('I', [first + lines_start for first in fragment_block.firsts])
+    starts[region.first:following] = array('I', [pos + offset for pos in fragment_block.starts])
+    block.end_lexpos += region.delta
+    block.end_lineno += line_delta
@@ -6,6 +6,11 @@ import json
 import os
 import sys
 
+# Fix import path if needed
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from Parser.AST import StringLiteral
+from Parser.Symbols import intern_symbol
+
 # Load tokens from JSON file
 def load_tokens():
     script_dir = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
@@ -34,7 +39,7 @@ t_RPAREN = r'\)'
 t_PLUS    = r'\+'
 t_MINUS   = r'-'
 t_TIMES   = r'\*'
-t_DIVIDE  = r'/'
+t_SLASH   = r'/'  # Not DIVIDE, which is the keyword starting a DIVIDE statement
 t_LOGICAL_AND = r'&&'
 t_NEQ = r'!='
 
@@ -42,15 +47,8 @@ def t_COMMENT(t):
     r'//.*'
     pass  # Ignore comments
 
-def t_IDENTIFIER(t):
-    r'-?\d+|"[^"]*"|[a-zA-Z_][a-zA-Z0-9_]*'
-    # Check if token is a reserved keyword
-    if t.value in tokens:
-        t.type = t.value
-    else:
-        t.type = 'IDENTIFIER'
-    return t
-
+# Literal rules come before t_IDENTIFIER (PLY tries function rules in definition order),
+# so numbers and quoted strings reach the parser with typed values
 def t_INTEGER(t):
     r'-?\d+'  # Added minus sign to support negative integers
     t.value = int(t.value)
@@ -58,7 +56,17 @@ def t_INTEGER(t):
 
 def t_STRING(t):
     r'"[^"]*"'
-    t.value = t.value[1:-1]  # Remove quotes
+    t.value = StringLiteral(t.value[1:-1])  # Remove quotes
+    return t
+
+def t_IDENTIFIER(t):
+    r'[a-zA-Z_][a-zA-Z0-9_]*'
+    t.value = intern_symbol(t.value)  # One shared object per name
+    # Check if token is a reserved keyword
+    if t.value in tokens:
+        t.type = t.value
+    else:
+        t.type = 'IDENTIFIER'
     return t
 
 # Define a function to handle tokens
@@ -75,11 +83,49 @@ def t_error(t):
 # Build the lexer
 lexer = lex.lex()
 
+class TokenStream:
+    """
+    Token source handed to the parser so a script is lexed exactly once.
+    Remembers the last token produced for error reporting, and records
+    every token in the parse trace when one is given.
+    """
+    def __init__(self, lexer, trace=None):
+        self.lexer = lexer
+        self.trace = trace
+        self.last_token = None
+        # Line number of the first line of the input (set when parsing a fragment of a script)
+        self.start_lineno = 1
+
+    def input(self, data):
+        self.lexer.lineno = self.start_lineno
+        self.last_token = None
+        self.lexer.last_token = None
+        self.lexer.input(data)
+
+    def token(self):
+        tok = self.lexer.token()
+        if tok is not None:
+            self.last_token = tok
+            self.lexer.last_token = tok
+            if self.trace is not None:
+                self.trace.shift(tok)
+        return tok
+
+    @property
+    def lineno(self):
+        return self.lexer.lineno
+
+    @property
+    def lexpos(self):
+        return self.lexer.lexpos
+
 # Add this function
-def test_lexer(data, debug=False):
-    """Test the lexer with the given data"""
-    lexer.lineno = 1
-    lexer.input(data)
+def test_lexer(data, debug=False, source=None):
+    """Test the lexer (or another token source) with the given data"""
+    if source is None:
+        source = lexer
+    source.lineno = 1
+    source.input(data)
     
     if debug:
         print("TOKEN SEQUENCE:")
@@ -87,7 +133,7 @@ def test_lexer(data, debug=False):
     # Process all tokens
     tokens_found = []
     while True:
-        tok = lexer.token()
+        tok = source.token()
         if not tok:
             break
         tokens_found.append(tok)
@@ -95,6 +141,6 @@ def test_lexer(data, debug=False):
             print(f"{tok.lineno}: {tok.type} '{tok.value}'")
     
     # Store the last token for error reporting
-    lexer.last_token = tokens_found[-1] if tokens_found else None
+    source.last_token = tokens_found[-1] if tokens_found else None
     
     return tokens_found
\ No newline at end of file
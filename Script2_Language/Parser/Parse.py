@@ -2,14 +2,25 @@
 Script2_Parser - Library for parsing Populous: The Beginning Script files
 """
 import ply.yacc as yacc
+import copy
+import functools
 import sys
 import os
+from array import array
 
 # Fix import path - use relative import
 # Import grammar rules and lexer from local Parser directory
 sys.path.append(os.path.dirname(os.path.realpath(__file__)))
 from Parser.Grammar import grammar_rules, precedence as grammar_precedence
 from Parser.Lexer import lexer, tokens, test_lexer
+from Parser.Diagnostics import trace_reductions, ParseTrace, SyntaxErrorInfo, ArgumentErrorInfo
+from Parser.Signatures import check_do_arguments
+from Parser.AST import (
+    Script, StatementBlock, IfStatement, IfElseStatement, DoStatement, SetStatement,
+    EveryStatement, MultiplyStatement, DivideStatement, IncrementStatement,
+    DecrementStatement, BinaryExpression
+)
+from Utils.Parser_Cache import parse_table_file
 
 # Define precedence - use imported precedence
 precedence = grammar_precedence
@@ -18,85 +29,134 @@ precedence = grammar_precedence
 def p_script(p):
     exec(f'p_script.__doc__ = """{grammar_rules["script"]}"""')
     if len(p) <= 4:  # Without SCRIPT_END
-        p[0] = ('script', p[2], p[3])
+        p[0] = Script(p[2], p[3], p.lineno(1))
     else:  # With SCRIPT_END
-        p[0] = ('script', p[2], p[3])
+        p[0] = Script(p[2], p[3], p.lineno(1))
 p_script.__doc__ = grammar_rules['script']
 
+class BlockLayout:
+    """
+    Line and offset arrays of a statement list while it is parsed, carried on its
+    grammar symbol: the line of every statement in the list, nested ones included,
+    in source order, and the index in lines and source offset of each list item
+    """
+    __slots__ = ('lines', 'firsts', 'starts')
+
+    def __init__(self):
+        self.lines = array('I')
+        self.firsts = array('I')
+        self.starts = array('I')
+
 # Create p_statements with the right docstring
 def p_statements(p):
-    p[0] = ('statements', p[2])
+    # Keep the statement lines, and where each top-level statement and the closing END start, for incremental reparsing
+    layout = p.slice[2].layout
+    p[0] = StatementBlock(p[2], p.lineno(1), layout.lines, layout.firsts, layout.starts, p.lexpos(3), p.lineno(3))
 p_statements.__doc__ = grammar_rules['statements']
 
 # Create p_statement_list with the right docstring
 def p_statement_list(p):
     if len(p) == 3:
-        p[0] = [p[1]] + p[2]
-    elif len(p) == 2 and p[1] is not None:  # Only add if not empty
-        p[0] = [p[1]]
+        layout = p.slice[1].layout
+        # Append to the list built so far instead of copying it
+        if p.slice[2].type == 'error':
+            pass  # Statement dropped by error recovery, the error is already recorded
+        elif p[2] is not None:  # Only add if not empty
+            statement = p.slice[2]
+            p[1].append(p[2])
+            layout.firsts.append(len(layout.lines))
+            layout.starts.append(statement.first.lexpos)
+            layout.lines.append(statement.first.lineno)
+            if statement.lines:
+                layout.lines.extend(statement.lines)
+        p[0] = p[1]
+        p.slice[0].layout = layout
     else:
         p[0] = []
+        p.slice[0].layout = BlockLayout()
 p_statement_list.__doc__ = grammar_rules['statement_list']
 
+# Create p_if_statement_list with the right docstring
+def p_if_statement_list(p):
+    p_statement_list(p)
+p_if_statement_list.__doc__ = grammar_rules['if_statement_list']
+
 # Create p_statement with the right docstring
 def p_statement(p):
     p[0] = p[1]
+    # Each statement rule records its first token, and a statement with nested blocks
+    # the lines of the statements in them, which statement_list collects
+    p.slice[0].first = p.slice[1].first
+    p.slice[0].lines = getattr(p.slice[1], 'lines', None)
 p_statement.__doc__ = grammar_rules['statement']
 
 # Create p_if_statement with the right docstring
 def p_if_statement(p):
-    if len(p) <= 9:  # Simple IF statement (with or without END before ENDIF)
-        p[0] = ('if', p[3], p[6])
+    p.slice[0].first = p.slice[1]
+    if len(p) == 4:  # IF error ENDIF, the broken IF is dropped
+        p[0] = None
+    elif len(p) <= 9:  # Simple IF statement (with or without END before ENDIF)
+        p[0] = IfStatement(p[3], p[6])
+        p.slice[0].lines = p.slice[6].layout.lines
     else:  # IF-ELSE statement
-        p[0] = ('if-else', p[3], p[6], p[10])
+        p[0] = IfElseStatement(p[3], p[6], p[10])
+        p.slice[0].lines = p.slice[6].layout.lines + p.slice[10].layout.lines
 p_if_statement.__doc__ = grammar_rules['if_statement']
 
 # Create p_do_statement with the right docstring
 def p_do_statement(p):
-    if len(p) == 3 and p[2] == 'do_command':
-        # This handles the general case DO command arg_list
-        p[0] = tuple(['do', p[2]] + p[3] if p[3] else [])
-    else:
-        # Original case for specific DO commands
-        args = [p[i] for i in range(2, len(p))]
-        p[0] = tuple(['do'] + args)
+    p.slice[0].first = p.slice[1]
+    args = tuple(p[3])
+    expected = check_do_arguments(p[2], args)
+    if expected is None:
+        p[0] = DoStatement(p[2], args)
+    else:  # Arguments that fit no signature of the command, the statement is dropped
+        record_error(p.parser, ArgumentErrorInfo(p.lineno(1), p[2], args, expected, p.lexpos(1)))
+        p[0] = None
 p_do_statement.__doc__ = grammar_rules['do_statement']
 
 # Create p_set_statement with the right docstring
 def p_set_statement(p):
+    p.slice[0].first = p.slice[1]
     if len(p) == 4:
-        p[0] = ('set', p[2], p[3])
+        p[0] = SetStatement(p[2], p[3])
     else:
-        p[0] = ('set', p[2], 0)  # Default to 0 for missing values
+        p[0] = SetStatement(p[2], 0)  # Default to 0 for missing values
 p_set_statement.__doc__ = grammar_rules['set_statement']
 
 # Create p_every_statement with the right docstring
 def p_every_statement(p):
-    if len(p) == 7:  # With offset: EVERY IDENTIFIER IDENTIFIER BEGIN statement_list END
-        p[0] = ('every', p[2], p[3], p[5])
-    else:  # Without offset: EVERY IDENTIFIER BEGIN statement_list END
-        p[0] = ('every', p[2], None, p[4])  # Use None as placeholder for missing offset
+    p.slice[0].first = p.slice[1]
+    if len(p) == 7:  # With offset: EVERY operand operand BEGIN statement_list END
+        p[0] = EveryStatement(p[2], p[3], p[5])
+        p.slice[0].lines = p.slice[5].layout.lines
+    else:  # Without offset: EVERY operand BEGIN statement_list END
+        p[0] = EveryStatement(p[2], None, p[4])  # Use None as placeholder for missing offset
+        p.slice[0].lines = p.slice[4].layout.lines
 p_every_statement.__doc__ = grammar_rules['every_statement']
 
 # Create p_multiply_statement with the right docstring
 def p_multiply_statement(p):
-    p[0] = ('multiply', p[2], p[3], p[4])
+    p.slice[0].first = p.slice[1]
+    p[0] = MultiplyStatement(p[2], p[3], p[4])
 p_multiply_statement.__doc__ = grammar_rules['multiply_statement']
 
 # Create p_increment_statement with the right docstring
 def p_increment_statement(p):
-    p[0] = ('increment', p[2], p[3])
+    p.slice[0].first = p.slice[1]
+    p[0] = IncrementStatement(p[2], p[3])
 p_increment_statement.__doc__ = grammar_rules['increment_statement']
 
 # Create p_decrement_statement with the right docstring
 def p_decrement_statement(p):
-    p[0] = ('decrement', p[2], p[3])
+    p.slice[0].first = p.slice[1]
+    p[0] = DecrementStatement(p[2], p[3])
 p_decrement_statement.__doc__ = grammar_rules['decrement_statement']
 
-# Create p_state_token with the right docstring
-def p_state_token(p):
+# Create p_operand with the right docstring
+def p_operand(p):
     p[0] = p[1]
-p_state_token.__doc__ = grammar_rules['state_token']
+p_operand.__doc__ = grammar_rules['operand']
 
 # Create p_expression with the right docstring
 def p_expression(p):
@@ -110,7 +170,7 @@ def p_expression(p):
         right = 0
         if len(p) > 3:
             right = p[3] if p[3] is not None else 0
-        p[0] = (p[2], left, right)
+        p[0] = BinaryExpression(p[2], left, right)
 p_expression.__doc__ = grammar_rules['expression']
 
 # Create p_empty with the right docstring
@@ -120,36 +180,39 @@ p_empty.__doc__ = grammar_rules['empty']
 
 # Replace the existing p_error function with this improved version
 
-def p_error(p):
+def handle_syntax_error(active_parser, p):
+    """
+    Record a syntax error on the parser that hit it. The parser then discards
+    tokens until the statement_list error rule lets it resume at the next statement,
+    so a single parse collects every error in the script.
+    """
     if p:
-        print(f"Syntax error at line {p.lineno}, token={p.type}, value={p.value}")
-        
+        if active_parser.report_errors:
+            print(f"Syntax error at line {p.lineno}, token={p.type}, value={p.value}")
+        active_parser.errors.append(SyntaxErrorInfo(p.lineno, p.type, p.value, p.lexpos))
+
         # Store additional error context
-        parser.error_token = p
-        parser.error_line = p.lineno if hasattr(p, 'lineno') else 'unknown'
-        
-        # Try to recover by skipping the problematic token
-        parser.errok()
-        
-        # Skip to next statement boundary for better recovery
-        while True:
-            tok = parser.token()
-            if not tok or tok.type in ['BEGIN', 'END', 'IF', 'ELSE', 'DO', 'SET', 'EVERY', 'ENDIF', 'SCRIPT_END']:
-                break
-        
-        return tok
+        active_parser.error_token = p
+        active_parser.error_line = p.lineno if hasattr(p, 'lineno') else 'unknown'
     else:
-        print("Syntax error at EOF")
+        if active_parser.report_errors:
+            print("Syntax error at EOF")
+        # The line is filled in by the caller, which knows the last token read
+        active_parser.errors.append(SyntaxErrorInfo(None, None, None))
 
-def p_do_command(p):
-    p[0] = p[1]
-p_do_command.__doc__ = grammar_rules['do_command']
+def record_error(active_parser, error):
+    """Record an error found by a production rule, such as DO arguments that fit no signature"""
+    if active_parser.report_errors:
+        print(f"Argument error at {error}")
+    active_parser.errors.append(error)
+
+def p_error(p):
+    return handle_syntax_error(parser, p)
 
 def p_arg_list(p):
     if len(p) == 3:
-        p[0] = [p[1]] + p[2]  # Multiple arguments
-    elif len(p) == 2:
-        p[0] = [p[1]]         # Single argument
+        p[1].append(p[2])     # Another argument, appended in place
+        p[0] = p[1]
     else:
         p[0] = []             # No arguments
 p_arg_list.__doc__ = grammar_rules['arg_list']
@@ -159,8 +222,75 @@ def p_arg(p):
 p_arg.__doc__ = grammar_rules['arg']
 
 def p_divide_statement(p):
-    p[0] = ('divide', p[2], p[3], p[4])
+    p.slice[0].first = p.slice[1]
+    p[0] = DivideStatement(p[2], p[3], p[4])
 p_divide_statement.__doc__ = grammar_rules['divide_statement']
 
+def _load_cached_parser(this_module, table_file):
+    """
+    Build a parser from pickled tables. Raises if the file cannot be read or does not fit
+    the production functions; unlike yacc.yacc(), it never rebuilds or writes table_file.
+    """
+    tables = yacc.LRTable()
+    tables.read_pickle(table_file)
+    tables.bind_callables(vars(this_module))
+    return yacc.LRParser(tables, this_module.p_error)
+
+def build_parser():
+    """
+    Build the parser, loading the LALR tables from the cache when the grammar is unchanged.
+    Tables are generated only when no cached file exists for the current grammar hash.
+    """
+    this_module = sys.modules[__name__]
+    table_file = parse_table_file(grammar_rules, precedence)
+    if table_file is None:
+        return yacc.yacc(module=this_module, debug=False, write_tables=False)
+
+    if os.path.exists(table_file):
+        try:
+            # The file name carries the grammar hash, so the signature check can be skipped
+            return _load_cached_parser(this_module, table_file)
+        except Exception as e:
+            print(f"Ignoring unreadable parse table cache {table_file}: {str(e)}")
+
+    # Write to a private file first so concurrent processes never read a partial table
+    temp_file = f"{table_file}.{os.getpid()}.tmp"
+    built_parser = yacc.yacc(module=this_module, debug=False, picklefile=temp_file)
+    try:
+        os.replace(temp_file, table_file)
+    except OSError as e:
+        print(f"Ignoring unwritable parse table cache {table_file}: {str(e)}")
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+    return built_parser
+
 # Build the parser
-parser = yacc.yacc()
\ No newline at end of file
+parser = build_parser()
+
+# Keep a cheap record of recent reductions for error reports
+trace_reductions(parser)
+
+# PLY reduces a state with a single reduction without looking at the next token. An error
+# rule reduced that way on a token that cannot follow it raises the same error again, and
+# the parser loops forever on that token; making it check the token lets the token be skipped.
+for state, action in list(parser.defaulted_states.items()):
+    if action < 0 and 'error' in parser.productions[-action].str.split():
+        del parser.defaulted_states[state]
+
+# Print syntax errors as they are found (turned off while trying an incremental reparse)
+parser.report_errors = True
+parser.errors = []
+
+def clone_parser():
+    """
+    Create a parser that shares the LALR tables of the module parser but owns its
+    parse stacks, error context and trace, so several can run on different threads
+    """
+    clone = copy.copy(parser)
+    clone.errorfunc = functools.partial(handle_syntax_error, clone)
+    clone.trace = ParseTrace()
+    clone.error_token = None
+    clone.error_line = None
+    clone.errors = []
+    return clone
\ No newline at end of file
@@ -0,0 +1,163 @@
+"""
+Hand-written scanner backend for the Script2 language parser.
+
+Produces the same token stream as the PLY lexer in Lexer.py, but matches
+each token with a single compiled pattern, resolves keywords through a
+frozenset and counts line numbers once per whitespace run.
+"""
+import os
+import re
+import sys
+import time
+from ply.lex import LexToken
+
+# Fix import path if needed
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from Parser.Lexer import tokens, lexer as ply_lexer
+from Parser.AST import StringLiteral
+from Parser.Symbols import intern_symbol
+
+# Reserved words are looked up in constant time instead of scanning the token tuple
+KEYWORDS = frozenset(tokens)
+
+# Operator lexemes and their token types (mirrors the t_ string rules in Lexer.py)
+OPERATOR_TYPES = {
+    '&&': 'LOGICAL_AND',
+    '==': 'EQ',
+    '<=': 'LTE',
+    '>=': 'GTE',
+    '!=': 'NEQ',
+    '(': 'LPAREN',
+    ')': 'RPAREN',
+    '+': 'PLUS',
+    '*': 'TIMES',
+    '<': 'LT',
+    '>': 'GT',
+    '/': 'SLASH',
+    '-': 'MINUS',
+}
+
+# Group numbers of the master pattern
+SKIP, INTEGER, STRING, WORD, OPERATOR, ILLEGAL = 1, 2, 3, 4, 5, 6
+
+# One pattern for the whole language. Alternatives are tried in the same order
+# as the PLY master regex, so comments win over '/' and '-5' is a single integer.
+MASTER_PATTERN = re.compile(r'''
+    ((?:[ \t\n]+|//[^\n]*)+)                        # whitespace, newlines and comments
+  | (-?\d+)                                         # integer literals
+  | "([^"]*)"                                       # string literals, without the quotes
+  | ([a-zA-Z_][a-zA-Z0-9_]*)                        # identifiers and keywords
+  | (&&|==|<=|>=|!=|[()+*<>/-])                     # operators
+  | (.)                                             # anything else is illegal
+''', re.VERBOSE | re.DOTALL)
+
+class Scanner:
+    """Drop-in replacement for the PLY lexer object used by the parser"""
+    def __init__(self):
+        self.lineno = 1
+        self.lexpos = 0
+        self.lexdata = ''
+        self._tokens = iter(())
+
+    def clone(self):
+        return Scanner()
+
+    def input(self, data):
+        self.lexdata = data
+        self.lexpos = 0
+        self._tokens = self._scan(data)
+
+    def token(self):
+        return next(self._tokens, None)
+
+    def _scan(self, data):
+        keywords = KEYWORDS
+        intern_name = intern_symbol
+        operator_types = OPERATOR_TYPES
+        lineno = self.lineno
+        for match in MASTER_PATTERN.finditer(data):
+            kind = match.lastindex
+            if kind == SKIP:
+                lineno += match.group(SKIP).count('\n')
+                self.lineno = lineno
+                continue
+
+            value = match.group(kind)
+            if kind == WORD:
+                value = intern_name(value)  # One shared object per name
+                token_type = value if value in keywords else 'IDENTIFIER'
+            elif kind == INTEGER:
+                token_type = 'INTEGER'
+                value = int(value)
+            elif kind == STRING:
+                token_type = 'STRING'
+                value = StringLiteral(value)
+            elif kind == OPERATOR:
+                token_type = operator_types[value]
+            else:
+                print(f"Illegal character '{value}' at token {lineno}")
+                continue
+
+            tok = LexToken()
+            tok.type = token_type
+            tok.value = value
+            tok.lineno = lineno
+            tok.lexpos = match.start()
+            self.lexpos = match.end()
+            yield tok
+
+def _count_tokens(lexer, data):
+    lexer.lineno = 1
+    lexer.input(data)
+    count = 0
+    while lexer.token() is not None:
+        count += 1
+    return count
+
+def benchmark_lexers(paths, repeat=5):
+    """
+    Compare tokens/sec of the PLY lexer and the Scanner over a set of script files
+
+    Args:
+        paths: Script2 files to tokenize
+        repeat: Number of passes over the corpus for each backend
+
+    Returns:
+        Dictionary mapping backend name to tokens per second
+    """
+    sources = []
+    for path in paths:
+        with open(path, 'r') as f:
+            sources.append(f.read())
+
+    results = {}
+    for name, backend in (('ply', ply_lexer.clone()), ('scanner', Scanner())):
+        total_tokens = 0
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for data in sources:
+                total_tokens += _count_tokens(backend, data)
+        elapsed = time.perf_counter() - start
+        results[name] = total_tokens / elapsed if elapsed > 0 else float('inf')
+        print(f"{name:8} {total_tokens // repeat} tokens/pass, {results[name]:,.0f} tokens/sec")
+
+    if results.get('ply'):
+        print(f"scanner speedup: {results['scanner'] / results['ply']:.2f}x")
+    return results
+
+if __name__ == '__main__':
+    # Usage: python Scanner.py <corpus directory or .SCR files> [repeat]
+    if len(sys.argv) < 2:
+        print("Usage: python Scanner.py <corpus directory or .SCR files> [repeat]")
+        sys.exit(1)
+    targets = sys.argv[1:]
+    repeat = 5
+    if len(targets) > 1 and targets[-1].isdigit():
+        repeat = int(targets.pop())
+    script_paths = []
+    for target in targets:
+        if os.path.isdir(target):
+            script_paths.extend(os.path.join(target, f) for f in sorted(os.listdir(target)) if f.lower().endswith('.scr'))
+        else:
+            script_paths.append(target)
+    benchmark_lexers(script_paths, repeat)
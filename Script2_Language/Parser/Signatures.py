@@ -0,0 +1,66 @@
+"""
+Argument signatures of Script2 DO commands
+
+The grammar parses every DO statement as a command name followed by any arguments;
+which arguments a command takes is checked here, against the do_signatures table of
+constants.json. A signature is a list of shapes, one string per accepted argument list:
+"arg" stands for any value and "ON|OFF" (or "ON", "OFF") for those switch words, so
+"arg ON|OFF" reads like the command's syntax. A null signature accepts any arguments.
+Adding a command only needs a new table entry, not new parser tables.
+"""
+import sys
+import os
+
+# Fix import path if needed
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from Utils.Constants_Loader import STATE_TOKENS, STATE_SIGNATURES, DEFAULT_DO_SIGNATURE, DO_SIGNATURES
+
+SWITCHES = frozenset(('ON', 'OFF'))
+
+def compile_shape(shape):
+    """Turn a shape string into a tuple with None for a value and the set of allowed words for a switch"""
+    return tuple(None if kind == 'arg' else frozenset(kind.split('|')) for kind in shape.split())
+
+def compile_signatures(do_signatures, state_tokens=(), state_signatures=()):
+    """
+    Map each command to the shape strings and compiled shapes it accepts, or to None
+    when any arguments are accepted. State commands also take state_signatures.
+    """
+    table = {}
+    for command, shapes in do_signatures.items():
+        table[command] = None if shapes is None else list(shapes)
+    for command in state_tokens:
+        shapes = table.setdefault(command, [])
+        if shapes is not None:
+            shapes.extend(shape for shape in state_signatures if shape not in shapes)
+    return {command: None if shapes is None else tuple((shape, compile_shape(shape)) for shape in shapes)
+            for command, shapes in table.items()}
+
+signatures = compile_signatures(DO_SIGNATURES, STATE_TOKENS, STATE_SIGNATURES)
+default_signature = tuple((shape, compile_shape(shape)) for shape in DEFAULT_DO_SIGNATURE)
+
+def matches(shape, args):
+    """True if args fit a compiled shape"""
+    if len(shape) != len(args):
+        return False
+    for kind, arg in zip(shape, args):
+        if kind is None:
+            if arg in SWITCHES:
+                return False
+        elif arg not in kind:
+            return False
+    return True
+
+def check_do_arguments(command, args):
+    """
+    Check the arguments of a DO command. Returns None if they fit its signature,
+    otherwise the shape strings the command accepts. Commands missing from the
+    table take the default signature.
+    """
+    signature = signatures.get(command, default_signature)
+    if signature is None:
+        return None
+    for _, shape in signature:
+        if matches(shape, args):
+            return None
+    return [text for text, _ in signature]
@@ -0,0 +1,20 @@
+"""
+Shared objects for the identifiers of a Script2 conversion run
+
+The lexers pass every identifier through intern_symbol(), so each name is one shared
+str object however often it appears: the AST holds no duplicate strings, and a lookup
+of a name in a table keyed by the same object finds it by identity, with its hash
+already cached. Names are interned with sys.intern, which is also what Python does for
+the identifier-like string constants of the mapping tables written as literals, so
+those tables already share the objects; tables whose keys are built at run time are
+passed through intern_keys(). Interned strings are released once nothing refers to
+them, so no table here grows over a run.
+"""
+import sys
+
+# Return the shared object for a name
+intern_symbol = sys.intern
+
+def intern_keys(mapping):
+    """Return a copy of mapping keyed by the shared objects of its (string) keys"""
+    return {intern_symbol(key) if type(key) is str else key: value for key, value in mapping.items()}
@@ -0,0 +1,91 @@
+"""
+Depth-first AST walker with an explicit stack
+
+Passes over the AST (variable extraction, script generation, conversion) are
+written as hooks for walk() instead of recursive functions, so a deeply nested
+script or a long expression chain never hits Python's recursion limit, and
+descending a level costs a list append instead of a call frame.
+
+    walk(root, pre, post, children)
+
+pre(node, depth) is called when a node is entered. It returns None to visit the
+node's children, or any other value to use as the node's result; the children and
+post are then skipped. post(node, results, depth) is called when a node is left,
+with the results of its children in order, and returns the node's result.
+children(node) returns a sequence of what to visit under a node; leaves (names,
+numbers, strings) are visited like nodes, with no children of their own. walk()
+returns the result of root.
+"""
+import sys
+import os
+
+# Fix import path if needed
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from Parser.AST import Node, OP_SCRIPT, OP_STATEMENTS, OP_IF, OP_IF_ELSE, OP_SET, OP_EVERY, OP_BINARY
+
+_DONE = object()
+_NO_CHILDREN = ()
+
+def node_children(node):
+    """Everything under a node that can hold other nodes: nested statements and expression operands"""
+    if not isinstance(node, Node):
+        return node if type(node) is list else _NO_CHILDREN
+    op = node.op
+    if op == OP_STATEMENTS:
+        return node.statements
+    if op == OP_SCRIPT:
+        return (node.body,)
+    if op == OP_IF:
+        return [node.condition, *node.body]
+    if op == OP_IF_ELSE:
+        return [node.condition, *node.body, *node.else_body]
+    if op == OP_EVERY:
+        return node.body
+    if op == OP_SET:
+        return (node.value,)
+    if op == OP_BINARY:
+        return (node.left, node.right)
+    return _NO_CHILDREN
+
+def statement_children(node):
+    """Only the statements under a node, for passes that handle expressions as a whole"""
+    if not isinstance(node, Node):
+        return node if type(node) is list else _NO_CHILDREN
+    op = node.op
+    if op == OP_STATEMENTS:
+        return node.statements
+    if op == OP_SCRIPT:
+        return (node.body,)
+    if op == OP_IF_ELSE:
+        return [*node.body, *node.else_body]
+    if op == OP_IF or op == OP_EVERY:
+        return node.body
+    return _NO_CHILDREN
+
+def walk(root, pre=None, post=None, children=node_children):
+    """Walk the tree under root depth first, calling pre and post on every node (see the module docstring)"""
+    results = []
+    # Frames of the nodes being walked: (node, iterator over its children, results of its children)
+    stack = [(_DONE, iter((root,)), results)]
+    while stack:
+        node, pending, child_results = stack[-1]
+        child = next(pending, _DONE)
+        if child is _DONE:
+            stack.pop()
+            if stack:
+                depth = len(stack) - 1
+                stack[-1][2].append(post(node, child_results, depth) if post is not None else None)
+            continue
+        depth = len(stack) - 1
+        if pre is not None:
+            result = pre(child, depth)
+            if result is not None:
+                child_results.append(result)
+                continue
+        grandchildren = children(child)
+        if not grandchildren:
+            # A leaf is left right away, without a frame of its own
+            child_results.append(post(child, [], depth) if post is not None else None)
+            continue
+        stack.append((child, iter(grandchildren), []))
+    return results[0]
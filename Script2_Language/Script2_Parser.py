@@ -3,53 +3,319 @@ Script2_Service - Functions for parsing and generating Populous: The Beginning S
 """
 import sys
 import os
+import threading
 import traceback
+from contextlib import contextmanager
 
 # Fix import path if needed
 sys.path.append(os.path.dirname(os.path.realpath(__file__)))
-from Parser.Lexer import test_lexer, lexer
+from Parser.Lexer import test_lexer, lexer, TokenStream
+from Parser.Scanner import Scanner
 from Utils.Gen import Int_Generate_Script
-from Parser.Parse import parser
+from Parser.Parse import clone_parser
+from Parser.Diagnostics import debug_reparse, Script2SyntaxError
+from Parser.Incremental import find_edit_region, splice_region
+from Parser.Symbols import intern_symbol, intern_keys
+from Parser.Hashing import structural_hash, subtree_hashes
+from Parser.Walker import walk, node_children, statement_children
+from Parser.AST import (
+    Node, Script, StatementBlock, IfStatement, IfElseStatement, DoStatement, SetStatement,
+    EveryStatement, MultiplyStatement, DivideStatement, IncrementStatement,
+    DecrementStatement, BinaryExpression, StringLiteral, as_node,
+    OP_SCRIPT, OP_STATEMENTS, OP_IF, OP_IF_ELSE, OP_DO, OP_SET, OP_EVERY,
+    OP_MULTIPLY, OP_DIVIDE, OP_INCREMENT, OP_DECREMENT, OP_BINARY
+)
 from Utils.Constants_Loader import load_constants
+from Utils.AST_Cache import ASTCache, ast_cache
+
+# Public names, including the AST and error types re-exported so callers import
+# everything from this module and share one copy of each class
+__all__ = [
+    'Script2Parser', 'Script2ParserPool', 'parser_pool', 'set_lexer_backend',
+    'LEXER_BACKENDS', 'DEFAULT_LEXER_BACKEND', 'constants', 'test_lexer',
+    'Parse_Script2', 'Parse_Script2_With_Errors', 'Reparse_Script2', 'Generate_Script2',
+    'Script2SyntaxError', 'intern_symbol', 'intern_keys', 'ASTCache', 'ast_cache',
+    'structural_hash', 'subtree_hashes', 'walk', 'node_children', 'statement_children',
+    'Node', 'Script', 'StatementBlock', 'IfStatement', 'IfElseStatement', 'DoStatement',
+    'SetStatement', 'EveryStatement', 'MultiplyStatement', 'DivideStatement',
+    'IncrementStatement', 'DecrementStatement', 'BinaryExpression', 'StringLiteral', 'as_node',
+    'OP_SCRIPT', 'OP_STATEMENTS', 'OP_IF', 'OP_IF_ELSE', 'OP_DO', 'OP_SET', 'OP_EVERY',
+    'OP_MULTIPLY', 'OP_DIVIDE', 'OP_INCREMENT', 'OP_DECREMENT', 'OP_BINARY',
+]
 
 # Load and expose constants for external use
 constants = load_constants()
 
-def Generate_Script2(script_code):  
-    """Parse a script and return its generated output. Raises exceptions on failure."""
-    # Test the lexer separately
-    test_lexer(script_code)
+# Token source backends: the PLY lexer or the hand-written scanner
+LEXER_BACKENDS = ('ply', 'scanner')
+DEFAULT_LEXER_BACKEND = os.environ.get('SCRIPT2_LEXER', 'ply')
+
+def _make_lexer(backend):
+    if backend == 'ply':
+        return lexer.clone()
+    if backend == 'scanner':
+        return Scanner()
+    raise ValueError(f"Unknown lexer backend '{backend}', expected one of {', '.join(LEXER_BACKENDS)}")
+
+class Script2Parser:
+    """
+    A Script2 parser that owns its lexer, token stream and parse state.
+    An instance parses one script at a time; give each thread its own
+    instance or borrow one from a Script2ParserPool.
+    """
+    def __init__(self, lexer_backend=None):
+        self.lexer_backend = lexer_backend or DEFAULT_LEXER_BACKEND
+        self.parser = clone_parser()
+        # The parser pulls tokens from this stream, so each script is lexed in a single pass
+        self.token_stream = TokenStream(_make_lexer(self.lexer_backend), self.parser.trace)
+
+    def _error_context(self):
+        """Describe the last token read and the syntax error (if any) of the last parse"""
+        last_token = self.token_stream.last_token
+        context = f"Last token: {last_token if last_token else 'unknown'}"
+        error_token = self.parser.error_token
+        if error_token is not None:
+            context += f"\nSyntax error at line {self.parser.error_line}: {error_token.type} '{error_token.value}'"
+        context += f"\nRecent parser actions:\n{self.parser.trace.format()}"
+        return context
+
+    def _parser_state(self):
+        """Describe the top of the parser symbol stack of the last parse"""
+        symstack = getattr(self.parser, 'symstack', None)
+        if symstack is None:
+            return ""
+        return f"Parser state: {symstack[-5:] if len(symstack) > 5 else symstack}\n"
+
+    def _reset_error_state(self):
+        """Clear the error context left on the parser by a previous parse"""
+        self.parser.error_token = None
+        self.parser.error_line = None
+        self.parser.errors = []
+        self.parser.trace.clear()
+
+    def _parse_recovering(self, script_code, validate_tokens):
+        """Run the parser over a script. Returns (result, errors), result is None if the parse gave up."""
+        if validate_tokens:
+            test_lexer(script_code, source=self.token_stream.lexer)
+        self._reset_error_state()
+
+        try:
+            # Parse the script without debug tracing
+            result = self.parser.parse(script_code, lexer=self.token_stream)
+        except Exception as e:
+            raise Exception(f"Parsing failed: {str(e)}\n{self._error_context()}\n{self._parser_state()}")
+
+        errors = self.parser.errors
+        last_token = self.token_stream.last_token
+        for error in errors:
+            if error.lineno is None:  # Error at the end of the script
+                error.lineno = last_token.lineno if last_token else 1
+        return result, errors
 
-    try:
-        # Parse the script 
-        result = parser.parse(script_code)
+    def _partial_ast(self):
+        """
+        Build a Script from the top-level statements completed before a parse gave up
+        at the end of the script (e.g. a missing END), or None if the script header was
+        never read. The statement being read when the script ended is not included.
+        """
+        symstack = getattr(self.parser, 'symstack', None)
+        if not symstack or len(symstack) < 4:
+            return None
+        if symstack[1].type != 'COMPUTER_PLAYER' or symstack[2].type != 'operand':
+            return None
+        if symstack[3].type == 'statements':
+            body = symstack[3].value
+        elif symstack[3].type == 'BEGIN' and len(symstack) > 4 and symstack[4].type == 'statement_list':
+            layout = symstack[4].layout
+            body = StatementBlock(symstack[4].value, symstack[3].lineno, layout.lines, layout.firsts)
+        else:
+            return None
+        return Script(symstack[2].value, body, symstack[1].lineno)
+
+    def parse(self, script_code, validate_tokens=False, debug_on_failure=True):
+        """
+        Parse a script and return its AST. Raises Script2SyntaxError listing every
+        syntax error in the script if there are any, other exceptions on other failures.
+        """
+        result, errors = self._parse_recovering(script_code, validate_tokens)
+        if not errors:
+            return result
+
+        details = ''
         if result is None:
-            raise Exception("Parsing failed - no AST generated")
-        return Int_Generate_Script(result)
-    except Exception as e:
-        # Include more details in error message
-        error_details = f"{str(e)}\nLast token: {getattr(lexer, 'last_token', 'unknown')}"
-        raise Exception(f"Parsing failed: {error_details}")
-
-def Parse_Script2(script_code):
-    """Parse a script and return its AST. Raises exceptions on failure."""
-    # Test the lexer separately
-    test_lexer(script_code)
-
-    try:
-        # Parse the script 
-        result = parser.parse(script_code, debug=2)  # Enable debug mode
+            # Capture the context of this parse before any diagnostic re-parse
+            symstack = getattr(self.parser, 'symstack', None)
+            last_pos = symstack[-1] if symstack else 'unknown'
+            details = f"No AST generated. Last position: {last_pos}\n{self._error_context()}\n{self._parser_state()}"
+            result = self._partial_ast()
+            if debug_on_failure:
+                # The errors were printed by the first parse, only the trace is new
+                self._reset_error_state()
+                self.parser.report_errors = False
+                try:
+                    debug_reparse(self.parser, self.token_stream, script_code)
+                finally:
+                    self.parser.report_errors = True
+        raise Script2SyntaxError(errors, result, details)
+
+    def parse_with_errors(self, script_code, validate_tokens=False):
+        """
+        Parse a script, recovering from each syntax error at the next statement.
+        Returns (ast, errors): errors lists a SyntaxErrorInfo for every syntax error in
+        source order (empty if there are none) and ast holds every statement that parsed,
+        or is None when not even the script header could be read.
+        Raises exceptions on failures other than syntax errors.
+        """
+        result, errors = self._parse_recovering(script_code, validate_tokens)
         if result is None:
-            # Get last token position if available
-            last_pos = getattr(parser, 'symstack', ['unknown'])[-1] if hasattr(parser, 'symstack') else 'unknown'
-            raise Exception(f"No AST generated. Last position: {last_pos}")
-        return result
-        
-    except Exception as e:
-        # Include stack trace for debugging
-        error_msg = f"{str(e)}\n"
-        if hasattr(parser, 'symstack'):
-            error_msg += f"Parser state: {parser.symstack[-5:] if len(parser.symstack) > 5 else parser.symstack}\n"
-        
-        raise Exception(f"Parsing failed: {error_msg}")
-    
\ No newline at end of file
+            result = self._partial_ast()
+        return result, errors
+
+    def reparse(self, ast, script_code, start, end, replacement):
+        """
+        Replace script_code[start:end] with replacement and bring the AST of script_code
+        up to date by reparsing only the top-level statements the edit touches. Parses
+        the whole edited script instead when the edit reaches outside those statements
+        or the reparsed region has a syntax error. A partial reparse updates the AST in
+        place, a full one builds a new AST, so always carry on with the returned one.
+        Returns (ast, edited script code). Raises exceptions on failure like parse().
+        """
+        new_code = script_code[:start] + replacement + script_code[end:]
+        region = find_edit_region(ast, script_code, start, end, replacement)
+        if region is not None:
+            first_lineno = region.block.statement_lineno(region.first)
+            fragment_block = self._parse_fragment(region.fragment(new_code), first_lineno)
+            if fragment_block is not None:
+                line_delta = replacement.count('\n') - script_code.count('\n', start, end)
+                splice_region(region, fragment_block, line_delta)
+                return ast, new_code
+        return self.parse(new_code), new_code
+
+    def _parse_fragment(self, fragment, lineno):
+        """Parse a wrapped run of statements without reporting errors. Returns its StatementBlock, or None on any error."""
+        self._reset_error_state()
+        self.parser.report_errors = False
+        self.token_stream.start_lineno = lineno
+        try:
+            result = self.parser.parse(fragment, lexer=self.token_stream)
+        except Exception:
+            result = None
+        finally:
+            self.parser.report_errors = True
+            self.token_stream.start_lineno = 1
+        if result is None or self.parser.errors:
+            return None
+        return result.body
+
+    def generate(self, script_code, validate_tokens=False):
+        """Parse a script and return its generated output. Raises exceptions on failure like parse()."""
+        result = self.parse(script_code, validate_tokens=validate_tokens, debug_on_failure=False)
+        try:
+            return Int_Generate_Script(result)
+        except Exception as e:
+            # Include more details in error message
+            error_details = f"{str(e)}\n{self._error_context()}"
+            raise Exception(f"Generating failed: {error_details}")
+
+class Script2ParserPool:
+    """
+    Thread-safe pool of Script2Parser instances. Each parse borrows an idle
+    instance (or creates one) and returns it afterwards, so any number of
+    threads can parse at once without sharing parser state.
+    """
+    def __init__(self, max_idle=None, lexer_backend=None):
+        self.max_idle = max_idle or os.cpu_count() or 4
+        self.lexer_backend = lexer_backend or DEFAULT_LEXER_BACKEND
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def set_lexer_backend(self, backend):
+        """Use a different lexer backend for parsers handed out from now on"""
+        _make_lexer(backend)  # Validate the name before switching
+        with self._lock:
+            self.lexer_backend = backend
+            self._idle = []
+
+    @contextmanager
+    def borrow(self):
+        """Context manager yielding a Script2Parser for the exclusive use of the caller"""
+        with self._lock:
+            instance = self._idle.pop() if self._idle else None
+            backend = self.lexer_backend
+        if instance is None:
+            instance = Script2Parser(backend)
+        try:
+            yield instance
+        finally:
+            with self._lock:
+                if instance.lexer_backend == self.lexer_backend and len(self._idle) < self.max_idle:
+                    self._idle.append(instance)
+
+    def parse(self, script_code, **kwargs):
+        with self.borrow() as instance:
+            return instance.parse(script_code, **kwargs)
+
+    def parse_with_errors(self, script_code, **kwargs):
+        with self.borrow() as instance:
+            return instance.parse_with_errors(script_code, **kwargs)
+
+    def generate(self, script_code, **kwargs):
+        with self.borrow() as instance:
+            return instance.generate(script_code, **kwargs)
+
+    def reparse(self, ast, script_code, start, end, replacement):
+        with self.borrow() as instance:
+            return instance.reparse(ast, script_code, start, end, replacement)
+
+# Shared pool used by the module level functions
+parser_pool = Script2ParserPool()
+
+def set_lexer_backend(backend):
+    """Select the token source used by the parser ('ply' or 'scanner')"""
+    parser_pool.set_lexer_backend(backend)
+
+def Generate_Script2(script_code, validate_tokens=False):
+    """Parse a script and return its generated output. Raises exceptions on failure.
+
+    validate_tokens runs the lexer over the whole script before parsing (debugging aid).
+    Safe to call from several threads at once.
+    """
+    return parser_pool.generate(script_code, validate_tokens=validate_tokens)
+
+def Parse_Script2(script_code, validate_tokens=False, debug_on_failure=True):
+    """Parse a script and return its AST. Raises exceptions on failure.
+
+    A script with syntax errors raises Script2SyntaxError, whose errors attribute
+    lists every syntax error in the script and whose ast attribute is the partial
+    AST (see Parse_Script2_With_Errors).
+
+    validate_tokens runs the lexer over the whole script before parsing (debugging aid).
+    debug_on_failure parses a script the parser gave up on a second time with full PLY debug
+    tracing written to stderr; successful parses never pay for tracing.
+    Safe to call from several threads at once.
+    """
+    return parser_pool.parse(script_code, validate_tokens=validate_tokens, debug_on_failure=debug_on_failure)
+
+def Parse_Script2_With_Errors(script_code, validate_tokens=False):
+    """Parse a script, collecting every syntax error instead of stopping at the first.
+
+    Returns (ast, errors). errors is a list of SyntaxErrorInfo (line, token type
+    and value of each error), empty for a valid script. ast holds every statement
+    that parsed; a broken statement is dropped and parsing resumes at the next one.
+    ast is None only when not even the script header could be read.
+    Safe to call from several threads at once.
+    """
+    return parser_pool.parse_with_errors(script_code, validate_tokens=validate_tokens)
+
+def Reparse_Script2(ast, script_code, start, end, replacement):
+    """Apply a text edit to a parsed script, reparsing only the top-level statements it touches.
+
+    ast is the AST of script_code, as returned by Parse_Script2 or an earlier
+    Reparse_Script2. The edit replaces script_code[start:end] with replacement.
+    Returns (ast, edited script code); the returned AST may be the one passed
+    in, updated in place. Edits outside the top-level statements, or that leave
+    a syntax error in them, parse the whole edited script like Parse_Script2
+    and raise the same exceptions on failure.
+    Safe to call from several threads at once, for different ASTs.
+    """
+    return parser_pool.reparse(ast, script_code, start, end, replacement)
@@ -0,0 +1,240 @@
+"""
+On-disk cache of parsed Script2 ASTs
+
+Reconverting a corpus after changing only a mapper or the target tribe does not
+change any AST, so the parsed tree of each script is stored in marshal format and
+loaded instead of lexing and parsing the script again. Entries are keyed by a hash
+of the script text, the grammar, the DO command signatures and the AST format, so
+any change that could change a tree misses the cache. The directory is kept under
+a size cap by removing the least recently used entries.
+"""
+import hashlib
+import marshal
+import os
+import sys
+import threading
+from array import array
+
+# Fix import path if needed
+sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from Parser.AST import Node, DoStatement, StringLiteral, NODE_CLASSES, OP_DO
+from Parser.Walker import walk
+from Parser.Grammar import grammar_rules, precedence
+from Parser.Symbols import intern_symbol
+from Utils.Parser_Cache import cache_dir, grammar_hash, _package_dir
+
+# Environment variable with the cache size cap in MiB (0 turns the cache off)
+AST_CACHE_SIZE_ENV = 'SCRIPT2_AST_CACHE_MB'
+DEFAULT_AST_CACHE_MB = 64
+
+# Bump when the encoding below or the node classes change
+AST_FORMAT_VERSION = 1
+
+# Encoded opcode of a string literal (node opcodes start at 1)
+_STRING_LITERAL = 0
+
+def _encoded_children(value):
+    value_type = type(value)
+    if value_type is list:
+        return value
+    if value_type is DoStatement:
+        return value[2:]
+    if isinstance(value, Node):
+        return [getattr(value, name) for name in value.fields]
+    return ()
+
+def _encode(value, results, depth):
+    value_type = type(value)
+    if value_type is str or value_type is int or value is None:
+        return value
+    if value_type is StringLiteral:
+        return (_STRING_LITERAL, str(value))
+    if value_type is list:
+        return results
+    if value_type is DoStatement:
+        return (OP_DO, value[1], *results)
+    if isinstance(value, Node):
+        return (value.op, *results)
+    if value_type is array:
+        return value.tobytes()
+    raise TypeError(f"Cannot encode {value_type.__name__} in an AST")
+
+def encode_ast(value):
+    """
+    Turn an AST into nested tuples, lists, strings, ints and bytes that marshal can
+    write. A node becomes (opcode, *fields), a DO statement (OP_DO, command, *args),
+    a string literal (0, text) and a line array its bytes. The tree is walked on an
+    explicit stack, however deep it goes.
+    """
+    return walk(value, post=_encode, children=_encoded_children)
+
+def _decoded_children(value):
+    value_type = type(value)
+    if value_type is list:
+        return value
+    if value_type is tuple:
+        op = value[0]
+        if op == _STRING_LITERAL:
+            return ()
+        return value[2:] if op == OP_DO else value[1:]
+    return ()
+
+def decode_ast(value, intern=intern_symbol):
+    """Rebuild the AST written by encode_ast, interning its names"""
+    def decode(value, results, depth):
+        value_type = type(value)
+        if value_type is str:
+            return intern(value)
+        if value_type is tuple:
+            op = value[0]
+            if op == _STRING_LITERAL:
+                return StringLiteral(value[1])
+            if op == OP_DO:
+                return DoStatement(intern(value[1]), tuple(results))
+            return NODE_CLASSES[op](*results)
+        if value_type is list:
+            return results
+        if value_type is bytes:
+            lines = array('I')
+            lines.frombytes(value)
+            return lines
+        return value
+    return walk(value, post=decode, children=_decoded_children)
+
+def _read_config(name):
+    try:
+        with open(os.path.join(_package_dir(), 'Config', name), 'rb') as f:
+            return f.read()
+    except OSError:
+        return name.encode('utf-8')
+
+class ASTCache:
+    """
+    Directory of marshalled ASTs, one file per script text, capped at max_bytes.
+    A hit refreshes the file's modification time, and eviction removes the files
+    with the oldest ones first. With no directory or a zero cap nothing is cached.
+    """
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.enabled = directory is not None and max_bytes > 0
+        self._size = None  # Bytes in the directory, counted on the first store
+        self._lock = threading.Lock()
+        # Everything besides the script text that decides the AST
+        digest = hashlib.sha256()
+        digest.update(f"{AST_FORMAT_VERSION}:{sys.version_info[0]}.{sys.version_info[1]}:".encode('utf-8'))
+        digest.update(grammar_hash(grammar_rules, precedence).encode('utf-8'))
+        digest.update(_read_config('constants.json'))
+        self._prefix = digest.digest()
+
+    def key(self, script_code):
+        """Cache key of a script text"""
+        digest = hashlib.sha256(self._prefix)
+        digest.update(script_code.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, script_code):
+        return os.path.join(self.directory, f"{self.key(script_code)}.ast")
+
+    def get(self, script_code):
+        """The cached AST of a script text, or None"""
+        if not self.enabled:
+            return None
+        path = self._path(script_code)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            ast = decode_ast(marshal.loads(data))
+        except Exception:
+            self._remove(path)  # Unreadable entry, parse the script instead
+            return None
+        try:
+            os.utime(path)  # Most recently used
+        except OSError:
+            pass
+        return ast
+
+    def put(self, script_code, ast):
+        """Store the AST of a script text, evicting old entries if the cache grows past its cap"""
+        if not self.enabled:
+            return
+        try:
+            data = marshal.dumps(encode_ast(ast))
+        except (TypeError, ValueError):
+            return  # Not a parser-built AST, or nested deeper than marshal goes; leave it uncached
+        path = self._path(script_code)
+        # Write to a private file first so concurrent readers never see a partial entry
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)  # Made on the first entry stored
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            self._remove(temp_path)
+            return
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        try:
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.name.endswith('.ast'):
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            continue
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except OSError:
+            pass
+        return entries
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is back under its cap"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                total -= size
+        self._size = total
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            for _, _, path in self._entries():
+                self._remove(path)
+            self._size = 0
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+def _default_cache():
+    try:
+        max_mb = float(os.environ.get(AST_CACHE_SIZE_ENV, DEFAULT_AST_CACHE_MB))
+    except ValueError:
+        max_mb = DEFAULT_AST_CACHE_MB
+    # Only located here; put makes the directory when the first entry is stored
+    directory = cache_dir(create=False)
+    if directory is not None:
+        directory = os.path.join(directory, 'ast')
+    return ASTCache(directory, int(max_mb * 1024 * 1024))
+
+# The cache used by the converter
+ast_cache = _default_cache()
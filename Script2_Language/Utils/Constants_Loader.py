@@ -17,12 +17,17 @@ def load_constants():
         # Return empty defaults as fallback
         return {
             "state_tokens": [],
-            "do_commands": [],
+            "state_signatures": [],
+            "default_do_signature": [],
+            "do_signatures": {},
             "operators": {}
         }
 
 # Make constants available as module-level variables
 constants = load_constants()
 STATE_TOKENS = constants.get('state_tokens', [])
-DO_COMMANDS = constants.get('do_commands', [])
+# Argument shapes of DO commands, checked after parsing (see Parser/Signatures.py)
+STATE_SIGNATURES = constants.get('state_signatures', [])
+DEFAULT_DO_SIGNATURE = constants.get('default_do_signature', [])
+DO_SIGNATURES = constants.get('do_signatures', {})
 OPERATORS = constants.get('operators', {})
\ No newline at end of file
@@ -7,107 +7,100 @@ import os
 # Fix import path if needed
 sys.path.append(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
 from Utils.Constants_Loader import OPERATORS
+from Parser.AST import (
+    Node, OP_SCRIPT, OP_STATEMENTS, OP_IF, OP_IF_ELSE, OP_DO, OP_SET, OP_EVERY,
+    OP_MULTIPLY, OP_INCREMENT, OP_DECREMENT, OP_BINARY, StringLiteral, as_node
+)
+from Parser.Walker import walk, node_children
 
-def generate_script(ast, indent_level=0):
-    """Convert the AST back to script format with proper indentation"""
-    if not ast:
-        return ""
-    
-    indent = "    " * indent_level  # 4 spaces per indent level
-    
-    # Handle integer values properly
+def _generate_value(ast):
+    """Script text of a value: a name, number or string literal"""
+    # Handle integer values properly (before the emptiness check, 0 is a value)
     if isinstance(ast, int):
         return str(ast)
-    
-    # Handle string values
-    if isinstance(ast, str):
-        return ast
-    
-    node_type = ast[0] if isinstance(ast, tuple) else None
-    
-    if node_type == 'script':
-        # ('script', player_id, statements)
-        player_id = ast[1]
-        statements = ast[2]
-        # The top-level script doesn't get indented
-        return f"COMPUTER_PLAYER {player_id}\n\n{generate_script(statements, indent_level)}"
-    
-    elif node_type == 'statements':
-        # ('statements', statement_list)
-        statement_list = ast[1]
-        statements = "\n".join([generate_script(stmt, indent_level + 1) for stmt in statement_list])
-        return f"{indent}BEGIN\n{statements}\n{indent}END"
-    
-    elif node_type == 'if':
-        # ('if', condition, body)
-        condition = generate_script(ast[1], 0)  # Don't indent the condition
-        # Indent the body statements
-        body = "\n".join([generate_script(stmt, indent_level + 1) for stmt in ast[2]])
-        return f"{indent}IF ({condition})\n{indent}BEGIN\n{body}\n{indent}ENDIF"
-    
-    elif node_type == 'if-else':
-        # ('if-else', condition, if_body, else_body)
-        condition = generate_script(ast[1], 0)  # Don't indent the condition
-        # Indent both if and else body statements
-        if_body = "\n".join([generate_script(stmt, indent_level + 1) for stmt in ast[2]])
-        else_body = "\n".join([generate_script(stmt, indent_level + 1) for stmt in ast[3]])
-        return f"{indent}IF ({condition})\n{indent}BEGIN\n{if_body}\n{indent}END\n{indent}ELSE\n{indent}BEGIN\n{else_body}\n{indent}ENDIF"
-    
-    elif node_type == 'do':
-        # ('do', command, [args...])
-        command = ast[1]
-        args = ast[2:]
-        args_str = " ".join([str(generate_script(arg, 0)) for arg in args])  # Don't indent arguments
-        cmd_str = f"DO {command} {args_str}"
-        return f"{indent}{cmd_str.strip()}"
-    
-    elif node_type == 'set':
-        # ('set', variable, value)
-        variable = ast[1]
-        value = generate_script(ast[2], 0)  # Don't indent the value
-        return f"{indent}SET {variable} {value}"
-    
-    elif node_type == 'every':
-        # ('every', interval, offset, body)
-        interval = ast[1]
-        offset = ast[2]
-        body_list = ast[3]
-        # Indent the body statements
-        body = "\n".join([generate_script(stmt, indent_level + 1) for stmt in body_list])
-        return f"{indent}EVERY {interval} {offset}\n{indent}BEGIN\n{body}\n{indent}END"
-    
-    elif node_type == 'multiply':
-        # ('multiply', target, source, amount)
-        target = ast[1]
-        source = ast[2]
-        amount = ast[3]
-        return f"{indent}MULTIPLY {target} {source} {amount}"
-    
-    elif node_type == 'increment':
-        # ('increment', target, amount)
-        target = ast[1]
-        amount = ast[2]
-        return f"{indent}INCREMENT {target} {amount}"
-    
-    elif node_type == 'decrement':
-        # ('decrement', target, amount)
-        target = ast[1]
-        amount = ast[2]
-        return f"{indent}decrement {target} {amount}"
+    if not ast:
+        return ""
+    # Handle string values, quoting string literals again
+    if isinstance(ast, StringLiteral):
+        return ast.source()
+    return str(ast)
 
-    elif isinstance(ast, tuple) and len(ast) == 3:
-        # This could be an expression like (op, left, right)
-        op, left, right = ast
-        left_str = generate_script(left, 0)  # Don't indent expressions
-        right_str = generate_script(right, 0)
+def _generation_children(ast):
+    # Accept the legacy tuple form as well
+    if isinstance(ast, tuple):
+        ast = as_node(ast)
+    return node_children(ast)
+
+def generate_script(ast, indent_level=0):
+    """Convert the AST back to script format with proper indentation"""
+    # levels[depth]: indent level of the node walked at that depth, and of its children
+    levels = []
+
+    def pre(ast, depth):
+        if isinstance(ast, tuple):
+            ast = as_node(ast)
+        if not isinstance(ast, Node):
+            return _generate_value(ast)  # Values have nothing to walk
+        level = levels[depth - 1][1] if depth else indent_level
+        del levels[depth:]
+        # The top-level script doesn't get indented, everything in a block does
+        node_type = ast.op
+        levels.append((level, level if node_type == OP_SCRIPT else level + 1))
+
+    def post(ast, parts, depth):
+        if isinstance(ast, tuple):
+            ast = as_node(ast)
+        indent = "    " * levels[depth][0]  # 4 spaces per indent level
+        node_type = ast.op
         
-        # Convert operator tokens to symbols using OPERATORS dictionary
-        op_symbol = OPERATORS.get(op, op)  # Use the original op if not in OPERATORS
-            
-        return f"{left_str} {op_symbol} {right_str}"
-    
-    # For literals (strings, integers, identifiers)
-    return str(ast)
+        if node_type == OP_SCRIPT:
+            return f"COMPUTER_PLAYER {ast.player}\n\n{parts[0]}"
+        
+        elif node_type == OP_STATEMENTS:
+            statements = "\n".join(parts)
+            return f"{indent}BEGIN\n{statements}\n{indent}END"
+        
+        elif node_type == OP_IF:
+            # parts: the condition, then the body statements
+            body = "\n".join(parts[1:])
+            return f"{indent}IF ({parts[0]})\n{indent}BEGIN\n{body}\n{indent}ENDIF"
+        
+        elif node_type == OP_IF_ELSE:
+            split = 1 + len(ast.body)
+            if_body = "\n".join(parts[1:split])
+            else_body = "\n".join(parts[split:])
+            return f"{indent}IF ({parts[0]})\n{indent}BEGIN\n{if_body}\n{indent}END\n{indent}ELSE\n{indent}BEGIN\n{else_body}\n{indent}ENDIF"
+        
+        elif node_type == OP_DO:
+            args_str = " ".join([_generate_value(arg) for arg in ast.args])
+            cmd_str = f"DO {ast.command} {args_str}"
+            return f"{indent}{cmd_str.strip()}"
+        
+        elif node_type == OP_SET:
+            return f"{indent}SET {ast.target} {parts[0]}"
+        
+        elif node_type == OP_EVERY:
+            body = "\n".join(parts)
+            return f"{indent}EVERY {ast.period} {ast.offset}\n{indent}BEGIN\n{body}\n{indent}END"
+        
+        elif node_type == OP_MULTIPLY:
+            return f"{indent}MULTIPLY {ast.target} {ast.left} {ast.right}"
+        
+        elif node_type == OP_INCREMENT:
+            return f"{indent}INCREMENT {ast.target} {ast.amount}"
+        
+        elif node_type == OP_DECREMENT:
+            return f"{indent}decrement {ast.target} {ast.amount}"
+
+        elif node_type == OP_BINARY:
+            # Convert operator tokens to symbols using OPERATORS dictionary
+            op_symbol = OPERATORS.get(ast.operator, ast.operator)  # Use the original op if not in OPERATORS
+            return f"{parts[0]} {op_symbol} {parts[1]}"
+        
+        return str(ast)
+
+    # Expressions and nested blocks are walked on an explicit stack, however deep they go
+    return walk(ast, pre, post, _generation_children)
 
 def Int_Generate_Script(ast):
     """Parse a script and return the generated script text. Raises exceptions on failure."""
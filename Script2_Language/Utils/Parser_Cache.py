@@ -0,0 +1,71 @@
+"""
+Utility to locate and key files cached by the Script2 parser
+"""
+import hashlib
+import json
+import os
+import ply.yacc as yacc
+
+# Environment variable that overrides the cache location
+CACHE_DIR_ENV = 'SCRIPT2_CACHE_DIR'
+
+def _package_dir():
+    return os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+def _is_writable_dir(path, create=True):
+    if not create:
+        # A directory that can be made later: the nearest existing one above it is writable
+        while not os.path.isdir(path):
+            parent = os.path.dirname(path)
+            if parent == path:
+                return False
+            path = parent
+        return os.access(path, os.W_OK)
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError:
+        return False
+    return os.access(path, os.W_OK)
+
+def cache_dir(create=True):
+    """
+    Return the directory used for cached parser files, or None if no writable location exists.
+    Uses $SCRIPT2_CACHE_DIR, then the user cache directory, then the package directory.
+    With create False the directory is only located, and may not exist yet.
+    """
+    candidates = []
+    if os.environ.get(CACHE_DIR_ENV):
+        candidates.append(os.environ[CACHE_DIR_ENV])
+    user_cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    candidates.append(os.path.join(user_cache, 'script2_parser'))
+    candidates.append(os.path.join(_package_dir(), '.cache'))
+
+    for path in candidates:
+        if _is_writable_dir(path, create):
+            return path
+    return None
+
+def grammar_hash(grammar_rules, precedence):
+    """
+    Hash everything the LALR tables are generated from: the production rules,
+    operator precedence, the token configuration and the PLY table version. The DO
+    command signatures in constants.json are checked after parsing, so they are left out
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(grammar_rules, sort_keys=True).encode('utf-8'))
+    digest.update(repr(precedence).encode('utf-8'))
+    config_path = os.path.join(_package_dir(), 'Config', 'tokens.json')
+    try:
+        with open(config_path, 'rb') as f:
+            digest.update(f.read())
+    except OSError:
+        digest.update(b'tokens.json')
+    digest.update(yacc.__tabversion__.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+def parse_table_file(grammar_rules, precedence):
+    """Path of the pickled parse tables for this grammar, or None if nothing can be cached"""
+    directory = cache_dir()
+    if directory is None:
+        return None
+    return os.path.join(directory, f"parsetab_{grammar_hash(grammar_rules, precedence)}.pickle")
@@ -32,6 +32,32 @@ SCRIPT_LOOP_END = "if EveryPow2Seconds(1024) then script_continuing = false end\
 SINGLE_RETURN = "ONE_OFF_RETURN\n"
 FUNCTION_PREFIX = "function "
 FUNCTION_SUFFIX = "end\n"
+TURN_LOCAL = "_turn"  # Turn of the MY_TRIBE schedule, read once per OnTurn
+EVERY_FLAG_PREFIX = "_every_"
+MAX_EVERY_FLAGS = 150  # Locals of OnTurn holding EVERY tests; Lua allows 200 per function
+PLAYER_LOCAL_PREFIX = "_player_"  # Snapshot locals of player tables
+SNAPSHOT_LOCAL_PREFIX = "_cached_"  # Snapshot locals of game state values
+MAX_SNAPSHOT_LOCALS = 40  # Value locals of the snapshot, on top of the EVERY flags and player tables
+# DO commands that change neither mana nor people counts within a turn, after which
+# the snapshot locals of those are not read again
+SNAPSHOT_NEUTRAL_COMMANDS = frozenset((
+    "AUTO_MESSAGES", "CLEAR_ALL_MSG", "DISABLE_USER_INPUTS", "ENABLE_USER_INPUTS", "FLASH_BUTTON",
+    "REMOVE_TIMER", "SET_ATTACK_VARIABLE", "SET_AUTO_BUILD", "SET_AUTO_HOUSE", "SET_BASE_MARKER",
+    "SET_BASE_RADIUS", "SET_BUCKET_COUNT_FOR_SPELL", "SET_BUCKET_USAGE", "SET_DEFENCE_RADIUS",
+    "SET_DRUM_TOWER_POS", "SET_MARKER_ENTRY", "SET_NO_BLUE_REINC", "SET_REINCARNATION", "SET_SPELL_ENTRY",
+    "SET_TIMER_GOING", "SET_WOOD_COLLECTION_RADII", "TURN_PANEL_ON", "ZOOM_TO",
+))
+SNAPSHOT_NEUTRAL_PREFIXES = ("CREATE_MSG_", "SET_MSG_", "FLYBY_", "STATE_")
+MAX_API_LOCALS = 150  # Chunk locals binding the API functions and constants OnTurn reads
+CHUNK_GLOBALS = frozenset(("MY_TRIBE", "ON", "OFF", "_gsi", "_gnsi", "bit32", "math"))  # Globals the script header defines, and the Lua libraries, bound like the API
+USER_VAR_MODES = ("global", "local", "table")  # Where the user variables of a script live
+USER_VAR_TABLE = "SC2_USR"  # Chunk local holding the user variables in table mode
+MAX_USER_LOCALS = 100  # Chunk locals for user variables in local mode, beyond which a table holds them
+MAX_CHUNK_LOCALS = 190  # Chunk locals altogether, each an upvalue of OnTurn; Lua allows 200 locals and 255 upvalues
+LUA_KEYWORDS = frozenset((
+    "and", "break", "do", "else", "elseif", "end", "false", "for", "function", "goto", "if",
+    "in", "local", "nil", "not", "or", "repeat", "return", "then", "true", "until", "while",
+))
 
 # Statement type constants
 COMMAND_STMT = "COMMAND"
@@ -301,59 +327,3 @@ CONVERSION_SETTINGS = {
     "debug_mode": False,        # Enable additional debug logging in scripts
     "default_tribe": TRIBE_BLUE # Default tribe to use if not specified
 }
-
-AUTO_SAVE = '''function OnSave(state)
-    -- Save all user variables to the state object
-    for varName, value in pairs(_G) do
-        -- Check if this is a user variable
-        if type(varName) == "string" and #tostring(varName) > 8 and varName:sub(1, 8) == "SC2_USR_" then
-            if type(value) == "number" then
-                state:push_int(value)
-                log("Saving number: " .. varName .. " = " .. tostring(value))
-            elseif type(value) == "boolean" then
-                state:push_bool(value)
-                log("Saving boolean: " .. varName .. " = " .. tostring(value))
-            elseif type(value) == "string" then
-                state:push_string(value)
-                log("Saving string: " .. varName .. " = " .. tostring(value))
-            end
-            -- Record the variable name so we know the order for loading
-            state:push_string(varName)
-        end
-    end
-    
-    -- Store the count of variables saved
-    local varCount = 0
-    for k, _ in pairs(_G) do
-        if type(k) == "string" and k:sub(1, 8) == "SC2_USR_" then
-            varCount = varCount + 1
-        end
-    end
-    state:push_int(varCount)
-    log("OnSave: Saved " .. varCount .. " variables")
-end
-
-
-function OnLoad(state)
-    -- Get the number of variables to restore
-    local varCount = state:pop_int()
-    log("OnLoad: Restoring " .. varCount .. " variables")
-    
-    -- Restore variables in reverse order of saving
-    for i = 1, varCount do
-        local varName = state:pop_string()
-        
-        -- Check the type of the next value and load appropriately
-        -- This requires knowing the type in advance or having a type marker
-        if type(_G[varName]) == "number" then
-            _G[varName] = state:pop_int()
-            log("Loading number: " .. varName .. " = " .. tostring(_G[varName]))
-        elseif type(_G[varName]) == "boolean" then
-            _G[varName] = state:pop_bool()
-            log("Loading boolean: " .. varName .. " = " .. tostring(_G[varName]))
-        elseif type(_G[varName]) == "string" then
-            _G[varName] = state:pop_string()
-            log("Loading string: " .. varName .. " = " .. tostring(_G[varName]))
-        end
-    end
-end'''
\ No newline at end of file
@@ -0,0 +1,140 @@
+from collections import Counter
+from Script4_Language.Config import *
+
+"""
+Script4_Language/Converters/Analysis.py
+Single-pass analysis of a parsed Script2 script, shared by the conversion stages
+"""
+
+from Script2_Language.Script2_Parser import (
+    walk, as_node, Node, OP_SCRIPT, OP_STATEMENTS, OP_IF, OP_IF_ELSE, OP_DO,
+    OP_SET, OP_EVERY, OP_MULTIPLY, OP_DIVIDE, OP_INCREMENT, OP_DECREMENT, OP_BINARY
+)
+
+class ScriptInfo:
+    """
+    What a script uses, collected in one walk over its AST:
+        user_variables: USER_ variables assigned with SET (declared in the Lua header)
+        user_variables_written: USER_ variables any statement writes: SET, MULTIPLY,
+            DIVIDE, INCREMENT or DECREMENT
+        variables_read: USER_ variables read anywhere
+        int_constants: INT_ constants referenced, attributes excluded
+        commands: DO commands used, with how often
+        attributes_read: INT_ATTR_ attributes read
+        attributes_written: INT_ATTR_ attributes written
+        every_periods: EVERY periods, with how often
+        every_timings: EVERY (period, offset) pairs, with how often; offset is None when not given
+        name_reads: INT_ constants and attributes, with how many places read them
+    """
+    __slots__ = ('user_variables', 'user_variables_written', 'variables_read', 'int_constants', 'commands',
+                 'attributes_read', 'attributes_written', 'every_periods', 'every_timings',
+                 'name_reads')
+
+    def __init__(self):
+        self.user_variables = set()
+        self.user_variables_written = set()
+        self.variables_read = set()
+        self.int_constants = set()
+        self.commands = Counter()
+        self.attributes_read = set()
+        self.attributes_written = set()
+        self.every_periods = Counter()
+        self.every_timings = Counter()
+        self.name_reads = Counter()
+
+    def unsupported_commands(self, command_map):
+        """DO commands of the script that command_map has no conversion for, sorted"""
+        return sorted(command for command in self.commands if command not in command_map and command != CMD_COMMENT)
+
+    def all_user_variables(self):
+        """Every USER_ variable the script writes or reads, sorted"""
+        return sorted(self.user_variables_written | self.variables_read)
+
+    def _read(self, value):
+        # Only identifiers name variables; string literals and numbers are plain values
+        if type(value) is not str:
+            return
+        if value.startswith(USER_PREFIX):
+            self.variables_read.add(value)
+        elif value in STATE_ATTR_MAP:
+            self.attributes_read.add(value)
+            self.name_reads[value] += 1
+        elif value.startswith(STR_INT_PREFIX):
+            self.int_constants.add(value)
+            self.name_reads[value] += 1
+
+    def _write(self, target, assigned=False):
+        if type(target) is not str:
+            return
+        if target in STATE_ATTR_MAP:
+            self.attributes_written.add(target)
+        elif target.startswith(USER_PREFIX):
+            self.user_variables_written.add(target)
+            if assigned:
+                self.user_variables.add(target)
+
+def _analysis_children(node):
+    # Everything that can hold a statement or a value, the legacy tuple form included
+    if isinstance(node, tuple):
+        node = as_node(node)
+    if type(node) is list:
+        return node
+    if not isinstance(node, Node):
+        return ()
+    op = node.op
+    if op == OP_STATEMENTS:
+        return node.statements
+    if op == OP_SCRIPT:
+        return (node.body,)
+    if op == OP_IF:
+        return [node.condition, *node.body]
+    if op == OP_IF_ELSE:
+        return [node.condition, *node.body, *node.else_body]
+    if op == OP_EVERY:
+        return [node.period, node.offset, *node.body]
+    if op == OP_SET:
+        return (node.value,)
+    if op == OP_DO:
+        return node.args
+    if op == OP_MULTIPLY or op == OP_DIVIDE:
+        return (node.left, node.right)
+    if op == OP_INCREMENT or op == OP_DECREMENT:
+        return (node.target, node.amount)  # The target is read as well as written
+    if op == OP_BINARY:
+        return (node.left, node.right)
+    return ()
+
+def analyze_script(parsed_script):
+    """
+    Collect the ScriptInfo of a script in a single walk
+
+    Args:
+        parsed_script: The parsed script, a statement block or a statement list
+
+    Returns:
+        ScriptInfo of the script
+    """
+    info = ScriptInfo()
+
+    def visit(node, depth):
+        if isinstance(node, tuple):
+            node = as_node(node)
+        if not isinstance(node, Node):
+            if type(node) is list:
+                return None
+            info._read(node)
+            return True  # Values have nothing under them
+        op = node.op
+        if op == OP_DO:
+            info.commands[node.command] += 1
+        elif op == OP_SET:
+            info._write(node.target, assigned=True)
+        elif op == OP_EVERY:
+            info.every_periods[node.period] += 1
+            info.every_timings[(node.period, node.offset)] += 1
+        elif op in (OP_MULTIPLY, OP_DIVIDE, OP_INCREMENT, OP_DECREMENT):
+            info._write(node.target)
+        return None
+
+    walk(parsed_script, visit, children=_analysis_children)
+    return info
@@ -1,10 +1,21 @@
+import io
 import os
 import logging
 import json
 import re
+from collections import Counter
 from pathlib import Path
-from Script2_Language.Script2_Parser import Parse_Script2
-from Script4_Language.Converters.Statements import convert_statements
+from Script2_Language.Script2_Parser import (
+    Parse_Script2, ast_cache, walk, Node
+)
+from Script4_Language.Converters.Statements import write_statements, build_turn_schedule, conversion_memo
+from Script4_Language.Converters.Writer import LuaWriter
+from Script4_Language.Converters.Analysis import analyze_script
+from Script4_Language.Converters.Expressions import convert_user_var_name
+from Script4_Language.Converters.Snapshot import StateSnapshot
+from Script4_Language.Converters.Structure import (
+    generate_save_functions, generate_user_variables, user_variable_field
+)
 from Script4_Language.Config import *
 
 """
@@ -12,7 +23,8 @@ Script4_Language/Converters/Core.py
 Core conversion logic and utilities for Script2 to Script4 conversion
 """
 
-def convert_script_file(input_file, output_file, tribe, command_map, variable_map):
+def convert_script_file(input_file, output_file, tribe, command_map, variable_map, snapshot=False, user_vars="global",
+                        api_names=None):
     """
     Converts a single Script2 file to Script4 format
     
@@ -22,6 +34,9 @@ def convert_script_file(input_file, output_file, tribe, command_map, variable_ma
         tribe: The target tribe for the script
         command_map: Command mapping dictionary
         variable_map: Variable mapping dictionary
+        snapshot: Cache the game state OnTurn reads in locals (see StateSnapshot)
+        user_vars: Where the user variables live, one of USER_VAR_MODES
+        api_names: Names of the engine API to bind to chunk locals (see load_api_names)
         
     Returns:
         SUCCESS or FAILURE
@@ -33,29 +48,45 @@ def convert_script_file(input_file, output_file, tribe, command_map, variable_ma
     
     # Parse and convert the script
     
-    parsed_script = Parse_Script2(script_content)
-    if not parsed_script:
-        logging.error(f"Failed to parse {input_file}")
-        return FAILURE
-    
-    # Extract user variables
-    user_variables = extract_user_variables(parsed_script)
-    
-    # Generate Lua output
-    lua_output = convert_script(
-        parsed_script,  
-        input_file,
-        output_file, 
-        tribe, 
-        command_map, 
-        variable_map
-    )
-    
-    # Write output to file
+    # Unchanged scripts reuse the AST of an earlier run
+    parsed_script = ast_cache.get(script_content)
+    if parsed_script is None:
+        parsed_script = Parse_Script2(script_content)
+        if not parsed_script:
+            logging.error(f"Failed to parse {input_file}")
+            return FAILURE
+        ast_cache.put(script_content, parsed_script)
+    
+    # Analyze the script once, every later stage reads the result
+    info = analyze_script(parsed_script)
+    unsupported = info.unsupported_commands(command_map)
+    if unsupported:
+        logging.warning(f"{os.path.basename(input_file)}: no conversion for DO {', '.join(unsupported)}")
+    
+    # Stream the Lua output to the file, under a temporary name until it is
+    # complete so a failed conversion leaves no partial script behind
     os.makedirs(os.path.dirname(output_file), exist_ok=True)
-    with open(output_file, 'w') as f:
-        f.write('\n'.join(lua_output))
-    
+    temp_file = f"{output_file}.{os.getpid()}.tmp"
+    try:
+        with open(temp_file, 'w') as f:
+            convert_script(
+                parsed_script,
+                input_file,
+                output_file,
+                tribe,
+                command_map,
+                variable_map,
+                info,
+                LuaWriter(f),
+                snapshot,
+                user_vars,
+                api_names
+            )
+        os.replace(temp_file, output_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
     logging.info(f"Successfully converted {input_file} to {output_file}")
     return SUCCESS
         
@@ -66,30 +97,8 @@ def convert_script_file(input_file, output_file, tribe, command_map, variable_ma
 
 def extract_user_variables(parsed_script):
     """Extract user variables from the parsed script"""
-    user_vars = set()
-    
-    # Function to recursively scan for variables in the AST
-    def scan_for_variables(node):
-        if isinstance(node, tuple):
-            if len(node) >= 2:
-                # Check if this is a SET operation for a user variable
-                if node[0] == 'set' and isinstance(node[1], str) and node[1].startswith('USER_'):
-                    user_vars.add(node[1])
-                # Check each element in the tuple
-                for item in node:
-                    scan_for_variables(item)
-        elif isinstance(node, list):
-            for item in node:
-                scan_for_variables(item)
-    
-    # Start scanning from the script node
-    if isinstance(parsed_script, tuple) and parsed_script[0] == 'script':
-        # The script structure is ('script', id, statements)
-        statements = parsed_script[2]
-        scan_for_variables(statements)
-    
     # Return a dictionary with the user variables as keys and default values
-    return {var: 0 for var in user_vars}
+    return {var: 0 for var in analyze_script(parsed_script).user_variables}
 
 
 def extract_variables_from_condition(condition):
@@ -104,194 +113,269 @@ def extract_variables_from_condition(condition):
     """
     user_vars = {}
     
-    if isinstance(condition, str) and condition.startswith("USER_"):
-        user_vars[condition] = 0
-    elif isinstance(condition, (list, tuple)) and len(condition) > 1:
-        # Process each part of the condition
-        for part in condition:
-            if isinstance(part, str) and part.startswith("USER_"):
-                user_vars[part] = 0
-            elif isinstance(part, (list, tuple)):
-                # Recursive call for nested conditions
-                user_vars.update(extract_variables_from_condition(part))
+    def add_variable(part, depth):
+        if isinstance(part, str) and part.startswith("USER_"):
+            user_vars[part] = 0
+    
+    def parts(part):
+        # Process each part of the condition, nested conditions included
+        if isinstance(part, (list, tuple, Node)) and len(part) > 1:
+            return part
+        return ()
     
+    walk(condition, add_variable, children=parts)
     return user_vars
 
 
-def convert_script(parsed_script, input_file, output_file, tribe, command_map, variable_map):
+def convert_script(parsed_script, input_file, output_file, tribe, command_map, variable_map, info=None, writer=None,
+                   snapshot=False, user_vars="global", api_names=None):
     """
     Converts a Script2 format file to Script4 (Lua) format
-    
+
     Args:
         parsed_script: Path to the input Script2 file
         output_file: Path to save the output Lua file
         tribe: The target tribe for the script
         command_map: Command mapping dictionary
         variable_map: Variable mapping dictionary
+        info: ScriptInfo of the script (see analyze_script), analyzed here when not given
+        writer: LuaWriter to stream the Lua code to
+        snapshot: Cache the game state OnTurn reads in locals at its top, instead of
+            reading it wherever it is used (see StateSnapshot)
+        user_vars: Where the user variables live: "global" variables, chunk locals
+            ("local") or the fields of one chunk-local table ("table"), which OnTurn
+            and the save functions read as upvalues
+        api_names: Names of the engine API (see load_api_names), which OnTurn reads
+            from chunk locals bound ahead of it; without them it reads globals
+
+    Returns:
+        Lines of the Lua code, or None when they are written to writer
     """
-    # Generate Lua output
-    lua_output = []
-    
+    # Without a writer, collect the Lua code in memory
+    if writer is None:
+        buffer = io.StringIO()
+        convert_script(parsed_script, input_file, output_file, tribe, command_map, variable_map, info, LuaWriter(buffer),
+                       snapshot, user_vars, api_names)
+        return buffer.getvalue().split('\n')
+
     # Add standard header
-    lua_output.append('-- ' + output_file)
-    lua_output.append('-- Generated from ' + input_file + ' by script2_to_script4 converter')
-    lua_output.append('import(Module_DataTypes)')
-    lua_output.append('import(Module_PopScript)')
-    lua_output.append('import(Module_Globals)')
-    lua_output.append('import(Module_Helpers)')
-    lua_output.append('import(Module_Players)')
-    lua_output.append('import(Module_Defines)')
-    lua_output.append('import(Module_Objects)')
-    lua_output.append('import(Module_System)')
-    lua_output.append('import(Module_String)')
-    lua_output.append('import(Module_Bit32)')
-    lua_output.append('import(Module_Game)')
-    lua_output.append('import(Module_Math)')
-    lua_output.append('import(Module_Map)')
-    lua_output.append('')
+    writer.line('-- ' + output_file)
+    writer.line('-- Generated from ' + input_file + ' by script2_to_script4 converter')
+    writer.line('import(Module_DataTypes)')
+    writer.line('import(Module_PopScript)')
+    writer.line('import(Module_Globals)')
+    writer.line('import(Module_Helpers)')
+    writer.line('import(Module_Players)')
+    writer.line('import(Module_Defines)')
+    writer.line('import(Module_Objects)')
+    writer.line('import(Module_System)')
+    writer.line('import(Module_String)')
+    writer.line('import(Module_Bit32)')
+    writer.line('import(Module_Game)')
+    writer.line('import(Module_Math)')
+    writer.line('import(Module_Map)')
+    writer.line('')
     
     # Add script description
-    lua_output.append('-- ' + os.path.basename(input_file) + ' converted to Script4')
-    lua_output.append('-- This script was automatically converted from Script2 format to Script4 format')
-    lua_output.append('')
+    writer.line('-- ' + os.path.basename(input_file) + ' converted to Script4')
+    writer.line('-- This script was automatically converted from Script2 format to Script4 format')
+    writer.line('')
 
     # Define global constants
-    lua_output.append('-- SCRIPT CONFIG')
-    lua_output.append(f'MY_TRIBE = {tribe}')
-    lua_output.append('')
+    writer.line('-- SCRIPT CONFIG')
+    writer.line(f'MY_TRIBE = {tribe}')
+    writer.line('')
     
     # Define global constants
-    lua_output.append('-- GLOBAL CONSTANTS')
-    lua_output.append('OFF = 0')
-    lua_output.append('ON = 1')
-    lua_output.append('')
-    
-    # Extract user variables from parsed script and define them
+    writer.line('-- GLOBAL CONSTANTS')
+    writer.line('OFF = 0')
+    writer.line('ON = 1')
+    writer.line('')
+    
+    # Define the user variables of the script
+    table = None
+    chunk_locals = 0
     try:
-        user_vars = extract_user_variables(parsed_script)
-        if user_vars:
-            lua_output.append('-- USER VARIABLES')
-            if isinstance(user_vars, dict):
-                for var_name in sorted(user_vars.keys()):
-                    # Replace USER_ with SC2_USR_ in variable definitions
-                    new_var_name = var_name.replace('USER_', 'SC2_USR_')
-                    lua_output.append(f'{new_var_name} = 0')
-            lua_output.append('')
+        if info is None:
+            info = analyze_script(parsed_script)
+        if user_vars == "global":
+            if info.user_variables:
+                writer.line('-- USER VARIABLES')
+                for var_name in sorted(info.user_variables):
+                    writer.line(f'{convert_user_var_name(var_name)} = 0')
+                writer.line('')
+        else:
+            # Every variable the script writes or reads is declared, a local left undeclared would be a global
+            variables = info.all_user_variables()
+            if user_vars == "table" or len(variables) > MAX_USER_LOCALS:
+                table = USER_VAR_TABLE
+                chunk_locals = 1
+            else:
+                chunk_locals = len(variables)
+            writer.line('-- USER VARIABLES')
+            writer.lines(generate_user_variables(variables, table))
+            writer.line('')
     except Exception as e:
         logging.error(f"Error processing user variables: {e}")
-        lua_output.append('-- Error processing user variables')
-        lua_output.append('')
+        writer.line('-- Error processing user variables')
+        writer.line('')
     
     # Add GSI reference
-    lua_output.append('-- Capture the global save items into a local variable')
-    lua_output.append('_gsi = gsi()')
-    lua_output.append('_gnsi = gnsi()')
-    lua_output.append('')
+    writer.line('-- Capture the global save items into a local variable')
+    writer.line('_gsi = gsi()')
+    writer.line('_gnsi = gnsi()')
+    writer.line('')
     
     # Add after GSI reference in convert_script function
-    lua_output.append('-- Initialize Computer Player')
-    lua_output.append(f'computer_init_player(getPlayer(MY_TRIBE))')
-    lua_output.append('')
+    writer.line('-- Initialize Computer Player')
+    writer.line(f'computer_init_player(getPlayer(MY_TRIBE))')
+    writer.line('')
     
     # Extract spells and buildings to enable
     # spells, buildings = extract_spells_and_buildings(parsed_script)
     
     #if spells:
-    #    lua_output.append('-- AI spells')
-    #    lua_output.append('_bot_spells = { ' + ', '.join(spells) + ' }')
+    #    writer.line('-- AI spells')
+    #    writer.line('_bot_spells = { ' + ', '.join(spells) + ' }')
     
     #if buildings:
-    #    lua_output.append('-- AI buildings')
-    #    lua_output.append('_bot_buildings = { ' + ', '.join(buildings) + ' }')
+    #    writer.line('-- AI buildings')
+    #    writer.line('_bot_buildings = { ' + ', '.join(buildings) + ' }')
     
-    lua_output.append('')
+    writer.line('')
     
-    # Add OnTurn function
-    lua_output.append('function OnTurn()')
+    # Convert the body of OnTurn first, so the engine API it uses can be bound to
+    # locals ahead of it
+    body = io.StringIO()
+    body_writer = LuaWriter(body, writer.indent_unit)
+    body_writer.indent('    ')
+    
+    # Read the game state the script uses more than once into locals
+    state = None
+    if snapshot:
+        state = StateSnapshot(parsed_script, variable_map)
+        variable_map = state.variable_map
+        body_writer.lines(state.prologue())
+    
+    # Read the turn once and test each EVERY timing once, before the blocks checking them
+    schedule = build_turn_schedule(info.every_timings) if info is not None else None
+    if schedule is not None:
+        body_writer.lines(schedule.prologue())
     
     # Process the entire script structure and convert it
-    converted_code = convert_statements(parsed_script, tribe, command_map, variable_map)
-    lua_output.extend(['    ' + line for line in converted_code])
+    write_statements(body_writer, parsed_script, tribe, command_map, variable_map, schedule=schedule, snapshot=state)
+    if state is not None:
+        conversion_memo.release(state.overlays)
+    
+    # Bind the API functions and constants OnTurn reads to chunk locals, so each
+    # use reads an upvalue instead of looking up the global table
+    api_locals = []
+    if api_names is not None:
+        api_locals = collect_api_names(body.getvalue(), api_names, min(MAX_API_LOCALS, MAX_CHUNK_LOCALS - chunk_locals))
+    if api_locals:
+        writer.line('-- API LOCALS')
+        writer.lines([f'local {name} = {name}' for name in api_locals])
+        writer.line('')
+    
+    # Add OnTurn function
+    writer.line('function OnTurn()')
+    if body_writer.lines_written:
+        code = body.getvalue()
+        if table is not None:
+            code = user_variable_fields(code, table)
+        writer.lines(code.split('\n'))
     
     # Close the OnTurn function
-    lua_output.append('end')
+    writer.line('end')
 
-    lua_output.append(
-    '''
-function OnSave(state)
-    -- Save all user variables to the state object
-    for varName, value in pairs(_G) do
-        -- Check if this is a user variable
-        if type(varName) == "string" and #tostring(varName) > 8 and varName:sub(1, 8) == "SC2_USR_" then
-            if type(value) == "number" then
-                state:push_int(value)
-                log("Saving number: " .. varName .. " = " .. tostring(value))
-            elseif type(value) == "boolean" then
-                state:push_bool(value)
-                log("Saving boolean: " .. varName .. " = " .. tostring(value))
-            elseif type(value) == "string" then
-                state:push_string(value)
-                log("Saving string: " .. varName .. " = " .. tostring(value))
-            end
-            -- Record the variable name so we know the order for loading
-            state:push_string(varName)
-        end
-    end
-    
-    -- Store the count of variables saved
-    local varCount = 0
-    for k, _ in pairs(_G) do
-        if type(k) == "string" and k:sub(1, 8) == "SC2_USR_" then
-            varCount = varCount + 1
-        end
-    end
-    state:push_int(varCount)
-    log("OnSave: Saved " .. varCount .. " variables")
-end
+    # Save and restore the user variables in a fixed order, without scanning _G
+    if CONVERSION_SETTINGS["include_save_logic"]:
+        variables = info.all_user_variables() if info is not None else []
+        declared = info.user_variables if info is not None else ()
+        if user_vars != "global":
+            declared = variables
+        writer.line('')
+        writer.lines(generate_save_functions(variables, declared, CONVERSION_SETTINGS["debug_mode"], table))
+    writer.line('')
 
 
-function OnLoad(state)
-    -- Get the number of variables to restore
-    local varCount = state:pop_int()
-    log("OnLoad: Restoring " .. varCount .. " variables")
-    
-    -- Restore variables in reverse order of saving
-    for i = 1, varCount do
-        local varName = state:pop_string()
-        
-        -- Check the type of the next value and load appropriately
-        -- This requires knowing the type in advance or having a type marker
-        if type(_G[varName]) == "number" then
-            _G[varName] = state:pop_int()
-            log("Loading number: " .. varName .. " = " .. tostring(_G[varName]))
-        elseif type(_G[varName]) == "boolean" then
-            _G[varName] = state:pop_bool()
-            log("Loading boolean: " .. varName .. " = " .. tostring(_G[varName]))
-        elseif type(_G[varName]) == "string" then
-            _G[varName] = state:pop_string()
-            log("Loading string: " .. varName .. " = " .. tostring(_G[varName]))
-        end
-    end
-end
-    ''')
+# Lua text naming no variable: comments and string literals
+_LUA_NON_CODE = re.compile(r'--[^\n]*|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'')
+# Names read as variables, not as fields or methods of a value
+_LUA_NAME = re.compile(r'(?<![\w.:])[A-Za-z_]\w*')
+# Names the code binds anywhere: assignment targets, multiple ones included,
+# loop variables, locals and function parameters
+_LUA_NAME_LIST = r'[A-Za-z_]\w*(?:[ \t]*,[ \t]*[A-Za-z_]\w*)*'
+_LUA_BOUND = re.compile(
+    rf'(?<![\w.:])({_LUA_NAME_LIST})[ \t]*=(?!=)'
+    rf'|\b(?:for|local)[ \t]+({_LUA_NAME_LIST})'
+    r'|\bfunction\b[^(\n]*\(([^)]*)\)'
+)
 
-    return lua_output
+def load_api_names(system_spec):
+    """
+    The names of the engine functions and enum constants of a system specification
 
+    Args:
+        system_spec: The system specification, see load_system_spec
 
-def convert_user_var_name(var_name):
+    Returns:
+        frozenset of the names
     """
-    Convert USER_ variable names to SC2_USR_ format
+    names = set()
+    for module in system_spec.get('modules', []):
+        names.update(function.get('name') for function in module.get('functions', []))
+        names.update(enum.get('name') for enum in module.get('enums', []))
+    names.discard(None)
+    return frozenset(names)
+
+def collect_api_names(lua_code, api_names, limit=MAX_API_LOCALS):
+    """
+    Collect the API names a piece of Lua code reads and never binds: the engine
+    functions and constants it uses, and the globals of the script header
+    (CHUNK_GLOBALS). Any other name, a user variable or one the mappings passed
+    through unresolved, is left a global.
     
     Args:
-        var_name: The variable name to convert
+        lua_code: The Lua code
+        api_names: Names of the engine API, see load_api_names
+        limit: The most names to return, the most used ones first
         
     Returns:
-        The converted variable name with SC2_USR_ prefix instead of USER_
+        Sorted list of the names
     """
-    
-    if isinstance(var_name, str) and var_name.startswith(USER_PREFIX):
-        return var_name.replace(USER_PREFIX, SC2_USR_PREFIX, 1)
-    return var_name
+    code = _LUA_NON_CODE.sub(' ', lua_code)
+    bound = set()
+    for groups in _LUA_BOUND.findall(code):
+        for names in groups:
+            bound.update(name.strip() for name in names.split(','))
+    uses = Counter(
+        name for name in _LUA_NAME.findall(code)
+        if (name in api_names or name in CHUNK_GLOBALS) and name not in bound
+    )
+    return sorted(name for name, count in uses.most_common(limit))
+
+
+# A user variable read as a variable, after any comments and string literals,
+# which are matched only to be kept as they are
+_LUA_USER_VARIABLE = re.compile(rf'{_LUA_NON_CODE.pattern}|(?<![\w.:]){SC2_USR_PREFIX}\w+')
+
+def user_variable_fields(lua_code, table):
+    """
+    Rewrite the user variables a piece of Lua code names into the fields of the
+    table holding them
+
+    Args:
+        lua_code: The Lua code
+        table: Name of the table
+
+    Returns:
+        The rewritten Lua code
+    """
+    def field(match):
+        text = match.group(0)
+        return user_variable_field(text, table) if text.startswith(SC2_USR_PREFIX) else text
+    return _LUA_USER_VARIABLE.sub(field, lua_code)
 
 
 def load_system_spec(filepath):
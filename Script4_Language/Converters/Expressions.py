@@ -1,5 +1,8 @@
-import sys
+import functools
 import logging
+import re
+import sys
+import time
 
 """
 Script4_Language/Converters/Expressions.py
@@ -7,6 +10,7 @@ Handling of conditions, expressions and value conversions
 """
 
 from Script4_Language.Config import *
+from Script2_Language.Script2_Parser import BinaryExpression, StringLiteral, walk
 
 def convert_condition(condition, variable_map):
     """
@@ -19,6 +23,10 @@ def convert_condition(condition, variable_map):
     Returns:
         String containing the Script4 equivalent condition
     """
+    if isinstance(condition, int):
+        # Integer literal (0 is a valid condition, so this comes before the emptiness check)
+        return convert_value(condition, variable_map)
+
     if not condition:
         return "true"
     
@@ -27,6 +35,8 @@ def convert_condition(condition, variable_map):
         return convert_value(condition, variable_map)
     
     # For complex conditions with operators
+    if isinstance(condition, BinaryExpression):
+        condition = condition.legacy()
     if not isinstance(condition, (list, tuple)) or len(condition) == 0:
         logging.warning(f"Invalid condition format: {condition}")
         return str(condition)
@@ -72,6 +82,77 @@ def convert_condition(condition, variable_map):
     logging.warning(f"Unhandled condition format: {condition}")
     return str(condition)
 
+def convert_operand(value, variable_map):
+    """
+    Convert a value read by an arithmetic statement or expression: INT_ATTR_
+    attributes are read with READ_CP_ATTRIB, or from their snapshot local if
+    variable_map has one, anything else goes through convert_value
+    
+    Args:
+        value: The value to convert
+        variable_map: Resolution table of Script2 names to Script4 text
+        
+    Returns:
+        String containing the Script4 expression reading the value
+    """
+    if isinstance(value, str) and value in STATE_ATTR_MAP:
+        text = variable_map.get(value)
+        if text is not None and text.startswith(SNAPSHOT_LOCAL_PREFIX):
+            return text
+        return f"READ_CP_ATTRIB(MY_TRIBE, {STATE_ATTR_MAP[value]})"
+    return convert_value(value, variable_map)
+
+def _expression_operands(value):
+    if isinstance(value, BinaryExpression):
+        return (value.left, value.right)
+    return ()
+
+# Lua precedence of the operators an expression can convert to, loosest first
+_LUA_PRECEDENCE = {
+    "or": 1, "and": 2,
+    "<": 3, ">": 3, "<=": 3, ">=": 3, "~=": 3, "==": 3,
+    "+": 4, "-": 4,
+    "*": 5, "/": 5, "%": 5,
+}
+_OPERAND_PRECEDENCE = 9
+
+def convert_expression(expression, variable_map):
+    """
+    Convert a Script2 value or arithmetic expression, such as the value of a SET, to
+    a Lua expression. Operands are converted with convert_operand, and nested
+    operations are parenthesized where Lua precedence needs it, so a long chain
+    stays flat. The expression is walked on an explicit stack, so a long chain of
+    operations cannot exhaust the recursion limit either.
+    
+    Args:
+        expression: The value or BinaryExpression to convert
+        variable_map: Resolution table of Script2 names to Script4 text
+        
+    Returns:
+        String containing the Script4 expression
+    """
+    if not isinstance(expression, BinaryExpression):
+        return convert_operand(expression, variable_map)
+
+    # Each part converts to its text and the precedence of its outermost operator
+    def operand(value, depth):
+        if isinstance(value, BinaryExpression):
+            return None
+        return (convert_operand(value, variable_map), _OPERAND_PRECEDENCE)
+
+    def operation(expression, operands, depth):
+        (left, left_precedence), (right, right_precedence) = operands
+        operator = OPERATOR_MAP.get(expression.operator, expression.operator)
+        precedence = _LUA_PRECEDENCE.get(operator, 0)  # Unknown operators keep every operation in parentheses
+        # Operators are left associative: an equal operator on the right needs parentheses
+        if left_precedence < precedence or (not precedence and left_precedence != _OPERAND_PRECEDENCE):
+            left = f"({left})"
+        if right_precedence <= precedence or (not precedence and right_precedence != _OPERAND_PRECEDENCE):
+            right = f"({right})"
+        return (f"{left} {operator} {right}", precedence)
+
+    return walk(expression, operand, operation, _expression_operands)[0]
+
 def convert_variable(var, variable_map, tribe=MY_TRIBE):
     """
     Convert a Script2 variable to its Script4 equivalent
@@ -92,7 +173,7 @@ def convert_variable(var, variable_map, tribe=MY_TRIBE):
         # Handle INT_ constants
         if var.startswith(STR_INT_PREFIX):
             if var in variable_map:
-                return variable_map[var]()
+                return variable_map[var]
             return convert_int_constant(var)
             
     # For non-string values, convert directly
@@ -104,11 +185,23 @@ def convert_value(value, variable_map):
     
     Args:
         value: The value to convert
-        variable_map: Dictionary of variable mappings
+        variable_map: Resolution table of Script2 names to Script4 text
         
     Returns:
         String containing the Script4 equivalent value
     """
+    # Literals are typed by the lexer, so they need no probing
+    value_type = type(value)
+    if value_type is str:
+        # Names in the resolution table are resolved already
+        text = variable_map.get(value)
+        if text is not None:
+            return text
+    elif value_type is int:
+        return str(value)
+    elif value_type is StringLiteral:
+        return value.source()
+
     # Handle different types of values
     if value is None:
         return "nil"
@@ -128,19 +221,12 @@ def convert_value(value, variable_map):
         if value == "CONVERT" or value == "INT_CONVERT" or value == "M_SPELL_CONVERT":
             return "M_SPELL_CONVERT_WILD"
         
-        # Check if this value has a direct mapping first
-        if value in variable_map:
-            return variable_map[value]()
-        
         # Check if it's a variable or constant
         if value.startswith(USER_PREFIX):
             return convert_user_var_name(value)
             
         if value.startswith(STR_INT_PREFIX):
-            # Check if we have a direct mapping
-            if value in variable_map:
-                return variable_map[value]()
-            # Otherwise convert using standard rules
+            # Convert using standard rules
             return convert_int_constant(value)
             
         # Handle operator strings
@@ -151,17 +237,39 @@ def convert_value(value, variable_map):
         if value in (BLUE, RED, GREEN, YELLOW):
             return TRIBE_PREFIX + value
             
-        # If it's a regular string literal that's not a keyword or known constant
-        if not (value in ["true", "false", "nil"] or 
-                value.startswith(SC2_USR_PREFIX) or
-                value.isdigit() or
-                value in list(variable_map.keys())):
-            # Quote the string literal
-            return f'{value}'
-            
     # Fallback - return as is
     return value
 
+# Lookups for convert_int_constant, compiled once from the Config name lists
+
+# Names with a fixed conversion that is checked before any pattern
+_FIXED_INT_CONSTANTS = {
+    "INT_MY_MANA": f"MANA({MY_TRIBE})",
+    "INT_BLUE_MANA": f"MANA({TRIBE_BLUE})",
+    "INT_RED_MANA": f"MANA({TRIBE_RED})",
+    "INT_YELLOW_MANA": f"MANA({TRIBE_YELLOW})",
+    "INT_GREEN_MANA": f"MANA({TRIBE_GREEN})",
+    **{name: f"READ_CP_ATTRIB(MY_TRIBE, {attr_name})" for name, attr_name in STATE_ATTR_MAP.items()},
+}
+
+# Names with a fixed conversion that is checked after the spell cost pattern
+_NAMED_INT_CONSTANTS = {
+    **PEOPLE_MAPPINGS,
+    **{name: TRIBE_PREFIX + name for name in (BLUE, RED, GREEN, YELLOW)},
+    **SPECIAL_MAPPINGS,
+}
+
+def _name_search(names):
+    """Search function for any of names in a string, longest names first"""
+    return re.compile("|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))).search
+
+_SPELL_SEARCH = _name_search(SPELL_NAMES)
+_BUILDING_SEARCH = _name_search(BUILDING_TYPES)
+_INT_PERSON_TYPES = frozenset(f"{STR_INT_PREFIX}{person}" for person in PERSON_TYPES)
+
+# Player-specific prefixes, by the letter after INT_
+_PREFIX_TRIBES = {"M": MY_TRIBE, "B": TRIBE_BLUE, "R": TRIBE_RED, "Y": TRIBE_YELLOW, "G": TRIBE_GREEN}
+
 def convert_int_constant(int_value):
     """
     Central function to convert INT_ constants to their Script4 equivalents
@@ -172,115 +280,81 @@ def convert_int_constant(int_value):
     Returns:
         String containing the Script4 equivalent constant
     """
-    # Handle mana variables
-    if int_value == "INT_MY_MANA":
-        return f"MANA({MY_TRIBE})"
-    
-    # Handle tribe-specific mana
-    mana_map = {
-        "INT_BLUE_MANA": f"MANA({TRIBE_BLUE})",
-        "INT_RED_MANA": f"MANA({TRIBE_RED})",
-        "INT_YELLOW_MANA": f"MANA({TRIBE_YELLOW})",
-        "INT_GREEN_MANA": f"MANA({TRIBE_GREEN})"
-    }
-    
-    if int_value in mana_map:
-        return mana_map[int_value]
-
-    # Handle INT_ATTR_ variables (add this section)
-    if int_value in STATE_ATTR_MAP:
-        attr_name = STATE_ATTR_MAP[int_value]
-        return f"READ_CP_ATTRIB(MY_TRIBE, {attr_name})"
-
-    # Handle spell cost patterns (INT_X_SPELL_Y_COST)
-    if int_value.startswith(STR_INT_PREFIX) and "_SPELL_" in int_value and int_value.endswith("_COST"):
-        parts = int_value.split("_")
-        if len(parts) >= 5 and parts[1] in TRIBE_MAP:
-            tribe = TRIBE_MAP.get(parts[1], MY_TRIBE)
-            spell_name = "_".join(parts[2:-1])  # Join everything between tribe code and "_COST"
-            return f"PLAYERS_SPELL_COST({tribe}, M_{spell_name})"
-    
     # Handle non-string values or empty values
     if not isinstance(int_value, str) or not int_value:
         return int_value
-        
-    # Prevent USER_ conversion - preserve user variables
+    # Identifiers repeat across and within scripts; string subclasses such as
+    # StringLiteral are returned as they are by some rules, so they are not cached
+    if type(int_value) is str:
+        return _convert_int_name(int_value)
+    return _classify_int_constant(int_value)
+
+@functools.lru_cache(maxsize=4096)
+def _convert_int_name(int_value):
+    return _classify_int_constant(int_value)
+
+def _classify_int_constant(int_value):
+    """The rules of convert_int_constant, in order, on a non-empty string"""
+    text = _FIXED_INT_CONSTANTS.get(int_value)
+    if text is not None:
+        return text
+
     if int_value.startswith(USER_PREFIX):
+        # Prevent USER_ conversion - preserve user variables
         return int_value
-    
-    # Handle special mappings that don't follow standard patterns
-    if int_value in SPECIAL_MAPPINGS:
-        return SPECIAL_MAPPINGS[int_value]
-    
-    if int_value in STATE_ATTR_MAP:
-        return STATE_ATTR_MAP[int_value]
-    
-    # Add tribe name handling
-    if int_value in (BLUE, RED, GREEN, YELLOW):
-        return TRIBE_PREFIX + int_value
-    
-    # People access - convert to GSI paths when needed
-    if int_value in PEOPLE_MAPPINGS:
-        return PEOPLE_MAPPINGS[int_value]
-    
-    # Tribe-specific person counts
-    if int_value.startswith(STR_INT_PREFIX) and ("_PERSON_" in int_value):
-        # Handle person type constants like INT_B_PERSON_WARRIOR
+    if int_value.startswith(STR_INT_PREFIX):
+        # Split once; the patterns below read the tribe code and the type from the parts
         parts = int_value.split("_")
-        if len(parts) >= 4 and parts[1] in TRIBE_MAP:
-            tribe = TRIBE_MAP.get(parts[1], MY_TRIBE)
+        tribe = TRIBE_MAP.get(parts[1])
+
+        # Spell cost patterns (INT_X_SPELL_Y_COST)
+        if tribe is not None and len(parts) >= 5 and "_SPELL_" in int_value and int_value.endswith("_COST"):
+            spell_name = "_".join(parts[2:-1])  # Join everything between tribe code and "_COST"
+            return f"PLAYERS_SPELL_COST({tribe}, M_{spell_name})"
+
+        text = _NAMED_INT_CONSTANTS.get(int_value)
+        if text is not None:
+            return text
+
+        # Tribe-specific person counts like INT_B_PERSON_WARRIOR
+        if tribe is not None and len(parts) >= 4 and "_PERSON_" in int_value:
             person_type = "_".join(parts[2:])  # Get PERSON_X part
             return f"_gsi.Players[{tribe}].NumPeopleOfType[M_{person_type}]"
-            
-    # Standard spell mappings
-    if int_value.startswith(STR_INT_PREFIX) and any(spell in int_value for spell in SPELL_NAMES):
-        # Replace INT_ with M_SPELL_ for spell constants
-        spell_name = int_value[len(STR_INT_PREFIX):]  # Remove the "INT_" part
-        return f"M_SPELL_{spell_name}"
-    
-    # Building type mappings
-    if int_value.startswith(STR_INT_PREFIX) and any(building in int_value for building in BUILDING_TYPES):
-        # Transform INT_X_BUILDING_Y to PLAYERS_BUILDING_OF_TYPE(TRIBE_X, M_BUILDING_Y)
-        parts = int_value.split("_")
-        if len(parts) >= 4 and parts[1] in TRIBE_MAP:  # Tribe prefixed buildings
-            tribe = TRIBE_MAP.get(parts[1], MY_TRIBE)
-            building_type = "_".join(parts[3:])  # Get the BUILDING_X part
-            return f"PLAYERS_BUILDING_OF_TYPE({tribe}, M_BUILDING_{building_type})"
-        else:  # Generic building types
-            building_type = "_".join(parts[1:])  # Get the part after INT_
-            return f"M_BUILDING_{building_type}"
-        
-    # Person type mappings without tribe prefix (INT_WARRIOR etc.)
-    if int_value in [f"{STR_INT_PREFIX}{t}" for t in PERSON_TYPES]:
-        person_type = int_value[len(STR_INT_PREFIX):]  # Remove the "INT_" part
-        return f"M_PERSON_{person_type}"
-    
-    # Player-specific prefixes
-    prefix_tribe_map = [
-        (f"{STR_INT_PREFIX}M_", MY_TRIBE), 
-        (f"{STR_INT_PREFIX}B_", TRIBE_BLUE), 
-        (f"{STR_INT_PREFIX}R_", TRIBE_RED), 
-        (f"{STR_INT_PREFIX}Y_", TRIBE_YELLOW), 
-        (f"{STR_INT_PREFIX}G_", TRIBE_GREEN)
-    ]
-    
-    for prefix, tribe in prefix_tribe_map:
-        if int_value.startswith(prefix):
-            # Transform INT_X_Y to _gsi.Players[TRIBE_X].Y
-            remaining = int_value[len(prefix):]
-            # Special handling for common patterns
-            if remaining.startswith("BUILDING_"):
-                building_type = remaining[9:]  # part after BUILDING_
+
+        # Standard spell mappings: replace INT_ with M_SPELL_
+        if _SPELL_SEARCH(int_value):
+            return f"M_SPELL_{int_value[len(STR_INT_PREFIX):]}"
+
+        # Building type mappings
+        if _BUILDING_SEARCH(int_value):
+            if tribe is not None and len(parts) >= 4:
+                # Tribe prefixed buildings: INT_X_BUILDING_Y to PLAYERS_BUILDING_OF_TYPE(TRIBE_X, M_BUILDING_Y)
+                building_type = "_".join(parts[3:])
                 return f"PLAYERS_BUILDING_OF_TYPE({tribe}, M_BUILDING_{building_type})"
-            elif remaining.startswith("PERSON_"):
-                person_type = remaining  # Keep PERSON_X part
-                return f"_gsi.Players[{tribe}].NumPeopleOfType[M_{person_type}]"
-    
-    # Default - if it starts with INT_, just remove that prefix
-    if int_value.startswith(STR_INT_PREFIX):
-        return int_value[len(STR_INT_PREFIX):]  # Remove the "INT_" part
-    
-    
+            building_type = "_".join(parts[1:])  # Generic building types, the part after INT_
+            return f"M_BUILDING_{building_type}"
+
+        # Person type mappings without tribe prefix (INT_WARRIOR etc.)
+        if int_value in _INT_PERSON_TYPES:
+            return f"M_PERSON_{int_value[len(STR_INT_PREFIX):]}"
+
+        # Player-specific prefixes: INT_X_BUILDING_Y and INT_X_PERSON_Y
+        if len(parts) >= 3:
+            prefix_tribe = _PREFIX_TRIBES.get(parts[1])
+            if prefix_tribe is not None:
+                remaining = int_value[len(STR_INT_PREFIX) + 2:]
+                if remaining.startswith("BUILDING_"):
+                    building_type = remaining[9:]  # part after BUILDING_
+                    return f"PLAYERS_BUILDING_OF_TYPE({prefix_tribe}, M_BUILDING_{building_type})"
+                if remaining.startswith("PERSON_"):
+                    return f"_gsi.Players[{prefix_tribe}].NumPeopleOfType[M_{remaining}]"
+
+        # Default - if it starts with INT_, just remove that prefix
+        return int_value[len(STR_INT_PREFIX):]
+
+    text = _NAMED_INT_CONSTANTS.get(int_value)
+    if text is not None:
+        return text
     return int_value
 
 def convert_user_var_name(var_name):
@@ -295,4 +369,44 @@ def convert_user_var_name(var_name):
     """
     if isinstance(var_name, str) and var_name.startswith(USER_PREFIX):
         return f"{SC2_USR_PREFIX}{var_name[len(USER_PREFIX):]}"  # Replace USER_ with SC2_USR_
-    return var_name
\ No newline at end of file
+    return var_name
+
+def _sample_int_constants():
+    """INT_ names of every pattern convert_int_constant knows, from the Config lists"""
+    names = [*_FIXED_INT_CONSTANTS, *_NAMED_INT_CONSTANTS, *_INT_PERSON_TYPES]
+    for code in TRIBE_MAP:
+        names += [f"{STR_INT_PREFIX}{code}_SPELL_{spell}_COST" for spell in SPELL_NAMES]
+        names += [f"{STR_INT_PREFIX}{code}_BUILDING_{building}" for building in BUILDING_TYPES]
+        names += [f"{STR_INT_PREFIX}{code}_PERSON_{person}" for person in PERSON_TYPES]
+    names += [f"{STR_INT_PREFIX}{spell}" for spell in SPELL_NAMES]
+    names += [f"{STR_INT_PREFIX}{building}" for building in BUILDING_TYPES]
+    names += [f"{STR_INT_PREFIX}UNKNOWN_{i}" for i in range(20)]
+    return names
+
+def benchmark_int_constants(names=None, repeat=20):
+    """
+    Compare names/sec of convert_int_constant with and without its results cache
+
+    Args:
+        names: INT_ names to convert (default: every pattern of the Config lists)
+        repeat: Number of passes over the names
+
+    Returns:
+        Dictionary mapping 'classify' and 'cached' to names per second
+    """
+    names = list(names) if names is not None else _sample_int_constants()
+    results = {}
+    _convert_int_name.cache_clear()
+    for label, convert in (('classify', _classify_int_constant), ('cached', convert_int_constant)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for name in names:
+                convert(name)
+        elapsed = time.perf_counter() - start
+        results[label] = len(names) * repeat / elapsed if elapsed > 0 else float('inf')
+        print(f"{label:8} {len(names)} names/pass, {results[label]:,.0f} names/sec")
+    return results
+
+if __name__ == '__main__':
+    # Usage: python -m Script4_Language.Converters.Expressions [repeat]
+    benchmark_int_constants(repeat=int(sys.argv[1]) if len(sys.argv) > 1 else 20)
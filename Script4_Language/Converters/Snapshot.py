@@ -0,0 +1,247 @@
+import re
+from collections.abc import Mapping
+from Script4_Language.Config import *
+
+"""
+Script4_Language/Converters/Snapshot.py
+Snapshot of the game state a script reads, cached in locals of OnTurn and of the
+blocks in it
+"""
+
+from Script4_Language.Converters.Expressions import convert_operand
+from Script4_Language.Converters.Analysis import analyze_script
+from Script2_Language.Script2_Parser import (
+    as_node, Node, OP_SCRIPT, OP_STATEMENTS, OP_IF, OP_IF_ELSE, OP_EVERY
+)
+
+# Game state reads the snapshot caches: a path under a player table, a tribe's
+# mana, or a computer player attribute
+_PLAYER_READ = re.compile(rf"{re.escape(PLAYERS_PATH)}\[(\w+)\](\S+)$")
+_GETTER_READ = re.compile(r"(?:MANA|READ_CP_ATTRIB)\([\w, ]*\)$")
+_ATTRIBUTE_READ = "READ_CP_ATTRIB("
+
+class SnapshotMap(Mapping):
+    """
+    A resolution table with some names resolved to snapshot locals instead. Lookups
+    check the few snapshot entries first, so the table itself is never copied.
+    refresh holds the locals a DO command may make stale, with the reads filling them.
+    """
+    __slots__ = ('entries', 'table', 'refresh')
+
+    def __init__(self, entries, table, refresh=None):
+        self.entries = entries
+        self.table = table
+        self.refresh = refresh or {}
+    def __getitem__(self, name):
+        text = self.entries.get(name)
+        if text is None:
+            return self.table[name]
+        return text
+
+    def get(self, name, default=None):
+        text = self.entries.get(name)
+        if text is None:
+            return self.table.get(name, default)
+        return text
+
+    def __contains__(self, name):
+        return name in self.entries or name in self.table
+
+    def __iter__(self):
+        yield from self.entries
+        yield from (name for name in self.table if name not in self.entries)
+
+    def __len__(self):
+        return len(self.entries.keys() | self.table.keys())
+
+def _player_local(tribe):
+    if tribe.startswith(TRIBE_PREFIX):
+        tribe = tribe[len(TRIBE_PREFIX):]
+    return f"{PLAYER_LOCAL_PREFIX}{tribe.lower()}"
+
+def _value_local(name):
+    if name.startswith(STR_INT_PREFIX):
+        name = name[len(STR_INT_PREFIX):]
+    return f"{SNAPSHOT_LOCAL_PREFIX}{name.lower()}"
+
+def refresh_after_command(command, variable_map):
+    """
+    Assignments reading again the snapshot locals a DO command may change: the mana
+    and player table values in scope, unless the command is known to change neither
+    (SNAPSHOT_NEUTRAL_COMMANDS). Attributes only change by WRITE_CP_ATTRIB.
+    """
+    if not isinstance(variable_map, SnapshotMap) or not variable_map.refresh:
+        return []
+    if command in SNAPSHOT_NEUTRAL_COMMANDS or command.startswith(SNAPSHOT_NEUTRAL_PREFIXES):
+        return []
+    return [f"{local} = {text}" for local, text in variable_map.refresh.items()]
+
+def _statement_reads(node):
+    """INT_ names and attributes read by a statement itself, not by the statements in its bodies"""
+    op = node.op
+    if op == OP_IF or op == OP_IF_ELSE:
+        return analyze_script(node.condition).name_reads
+    if op == OP_EVERY:
+        return analyze_script([node.period, node.offset]).name_reads
+    return analyze_script(node).name_reads
+
+class StateSnapshot:
+    """
+    The game state a script reads, cached in locals: every value read in more than
+    one place (a player table path, MANA or READ_CP_ATTRIB), up to
+    MAX_SNAPSHOT_LOCALS of the most read ones, and every player table still reached
+    from more than one place. Each local is declared at the top of the innermost
+    body holding all its reads, OnTurn or the body of an IF, ELSE or EVERY block,
+    so state read only in a block is read only on the turns the block runs.
+
+    Within a turn only the script changes what it reads: an assignment to a cached
+    attribute reads it again into its local (see Statements._assignment), a DO
+    command does the same for the mana and player values (refresh_after_command),
+    and everything else is snapshotted afresh on the next turn.
+    """
+    def __init__(self, parsed_script, variable_map):
+        """
+        Args:
+            parsed_script: The parsed script
+            variable_map: Resolution table of Script2 names to Script4 text
+        """
+        # Number the bodies of the script, OnTurn first, and find which one each read is in
+        self._parents = [None]
+        self._depths = [0]
+        self._bodies = {}  # (id of a block statement, ELSE body) -> its body
+        sites = {}  # Name -> the body of each place reading it
+        stack = [([parsed_script], 0)]
+        while stack:
+            statements, body = stack.pop()
+            for stmt in statements:
+                node = as_node(stmt)
+                if not isinstance(node, Node):
+                    continue
+                op = node.op
+                if op == OP_SCRIPT:
+                    stack.append(([node.body], body))
+                    continue
+                if op == OP_STATEMENTS:
+                    stack.append((node.statements, body))
+                    continue
+                for name, count in _statement_reads(node).items():
+                    sites.setdefault(name, []).extend([body] * count)
+                if op == OP_IF or op == OP_EVERY:
+                    stack.append((node.body, self._add_body(node, False, body)))
+                elif op == OP_IF_ELSE:
+                    stack.append((node.body, self._add_body(node, False, body)))
+                    stack.append((node.else_body, self._add_body(node, True, body)))
+
+        # Group the names by the state they read, with the bodies of the places reading it
+        reads = {}
+        names = {}
+        for name in sorted(sites):
+            text = convert_operand(name, variable_map)
+            if isinstance(text, str) and (_PLAYER_READ.match(text) or _GETTER_READ.match(text)):
+                reads.setdefault(text, []).extend(sites[name])
+                names.setdefault(text, []).append(name)
+
+        ranked = sorted(reads, key=lambda text: -len(reads[text]))[:MAX_SNAPSHOT_LOCALS]
+        cached = {text: self._common_body(reads[text]) for text in ranked if len(reads[text]) > 1}
+
+        # A player table is worth a local when more than one place still reaches it
+        player_sites = {}
+        for text, bodies in reads.items():
+            match = _PLAYER_READ.match(text)
+            if match:
+                player_sites.setdefault(match.group(1), []).extend([cached[text]] if text in cached else bodies)
+        self.players = {}  # Player table local -> (tribe, body declaring it)
+        players = {}
+        for tribe in sorted(player_sites):
+            if len(player_sites[tribe]) > 1:
+                local = _player_local(tribe)
+                players[tribe] = local
+                self.players[local] = (tribe, self._common_body(player_sites[tribe]))
+
+        self.values = {}  # Value local -> (the state it holds, body declaring it)
+        entries = {}  # Body -> the names it resolves to snapshot locals
+        refresh = {}  # Body -> the locals declared in it that DO commands make stale
+        for text in sorted(reads, key=lambda text: names[text][0]):
+            match = _PLAYER_READ.match(text)
+            if match and match.group(1) in players:
+                text_read = f"{players[match.group(1)]}{match.group(2)}"
+                body = self.players[players[match.group(1)]][1]
+            else:
+                text_read = text
+                body = None
+            if text in cached:
+                local = _value_local(names[text][0])
+                body = cached[text]
+                self.values[local] = (text_read, body)
+                if not text.startswith(_ATTRIBUTE_READ):
+                    refresh.setdefault(body, {})[local] = text_read
+                text_read = local
+            if text_read != text:
+                entries.setdefault(body, {}).update((name, text_read) for name in names[text])
+
+        # The resolution table of each body: its own entries over those of the body
+        # around it, which comes before it. OnTurn always gets a table of its own, so
+        # nothing converted through these tables is memoized for other scripts.
+        self._maps = []
+        self.overlays = []
+        for body, outer in enumerate(self._parents):
+            outer_map = variable_map if outer is None else self._maps[outer]
+            if outer is None or body in entries or body in refresh:
+                outer_entries = outer_map.entries if isinstance(outer_map, SnapshotMap) else {}
+                outer_refresh = outer_map.refresh if isinstance(outer_map, SnapshotMap) else {}
+                outer_map = SnapshotMap({**outer_entries, **entries.get(body, {})}, variable_map,
+                                        {**outer_refresh, **refresh.get(body, {})})
+                self.overlays.append(outer_map)
+            self._maps.append(outer_map)
+
+        self.variable_map = self._maps[0]
+
+    def _add_body(self, node, else_body, outer):
+        body = len(self._parents)
+        self._parents.append(outer)
+        self._depths.append(self._depths[outer] + 1)
+        self._bodies[(id(node), else_body)] = body
+        return body
+
+    def _common_body(self, bodies):
+        """The innermost body holding all of bodies"""
+        common = bodies[0]
+        for body in bodies[1:]:
+            while self._depths[body] > self._depths[common]:
+                body = self._parents[body]
+            while self._depths[common] > self._depths[body]:
+                common = self._parents[common]
+            while body != common:
+                body = self._parents[body]
+                common = self._parents[common]
+        return common
+
+    def _declarations(self, body):
+        lines = [f"local {local} = {PLAYERS_PATH}[{tribe}]"
+                 for local, (tribe, declared) in self.players.items() if declared == body]
+        lines.extend(f"local {local} = {text}" for local, (text, declared) in self.values.items() if declared == body)
+        return lines
+
+    def prologue(self):
+        """Lines opening OnTurn: the locals of the state read all over it, player tables first"""
+        return self._declarations(0)
+
+    def body(self, node, else_body=False):
+        """
+        The locals opening the body of a block statement
+
+        Args:
+            node: The IF, IF-ELSE or EVERY statement
+            else_body: The ELSE body of an IF-ELSE instead of its body
+
+        Returns:
+            (lines declaring the locals, resolution table of the body), or None when
+            the body declares no locals
+        """
+        body = self._bodies.get((id(node), else_body))
+        if body is None:
+            return None
+        lines = self._declarations(body)
+        if not lines:
+            return None
+        return lines, self._maps[body]
@@ -8,11 +8,90 @@ Functions for converting specific Script2 statements to Script4 format
 """
 
 from Script4_Language.Converters.Expressions import (
-    convert_condition, convert_variable, convert_value, 
+    convert_condition, convert_variable, convert_value, convert_operand, convert_expression,
     convert_int_constant, convert_user_var_name
 )
+from Script4_Language.Converters.Snapshot import refresh_after_command
+from Script2_Language.Script2_Parser import (
+    Node, as_node, subtree_hashes, walk, OP_SCRIPT, OP_STATEMENTS, OP_IF, OP_IF_ELSE,
+    OP_DO, OP_SET, OP_EVERY, OP_MULTIPLY, OP_DIVIDE, OP_INCREMENT, OP_DECREMENT
+)
+
+# Statement tags of the older converter front end and the parser tags they stand for
+LEGACY_STATEMENT_TAGS = {
+    COMMAND_STMT: 'do',
+    EVERY_STMT: 'every',
+    IF_STMT: 'if',
+    IF_ELSE_STMT: 'if-else',
+}
+
+# Statements holding nested statements
+BLOCK_STATEMENT_OPS = frozenset((OP_IF, OP_IF_ELSE, OP_EVERY))
 
-def convert_statement(stmt, tribe, command_map, variable_map, indent=0):
+class ConversionMemo:
+    """
+    Converted statements of a run, keyed by the structural hash of the statement,
+    the tribe and the mapping tables, so statements and blocks repeated within a
+    script or across scripts are converted once. Conversions of repeats are
+    returned from the memo, and do not log their warnings again. Tables only one
+    script uses, like its snapshot overlays, are released after it.
+    """
+    def __init__(self):
+        self.enabled = True
+        self._results = {}
+        self._tables = {}  # Version -> (command_map, variable_map) pair
+        self._versions = {}  # Ids of a pair of tables -> its version
+        self._next_version = 0
+
+    def _tables_version(self, command_map, variable_map):
+        ids = (id(command_map), id(variable_map))
+        version = self._versions.get(ids)
+        if version is None:
+            # Keeping the tables referenced means their ids can never be reused by other ones
+            version = self._versions[ids] = self._next_version
+            self._tables[version] = (command_map, variable_map)
+            self._next_version += 1
+        return version
+
+    def key(self, stmt, tribe, command_map, variable_map, hashes, scheduled=False):
+        """
+        Memo key of a statement, or None if it has no hash (legacy tuples) or the memo
+        is off. Conversions testing the flags of a TurnSchedule are kept apart.
+        """
+        digest = hashes.get(id(stmt)) if self.enabled else None
+        if digest is None:
+            return None
+        return (digest, tribe, self._tables_version(command_map, variable_map), scheduled)
+
+    def get(self, key):
+        return self._results.get(key)
+
+    def put(self, key, converted):
+        self._results[key] = converted
+
+    def release(self, variable_maps):
+        """Forget variable tables no later conversion uses, with every conversion made with them"""
+        ids = {id(variable_map) for variable_map in variable_maps}
+        released = {version for (_, table_id), version in self._versions.items() if table_id in ids}
+        if not released:
+            return
+        for version in released:
+            command_map, variable_map = self._tables.pop(version)
+            del self._versions[(id(command_map), id(variable_map))]
+        self._results = {key: converted for key, converted in self._results.items() if key[2] not in released}
+
+    def clear(self):
+        self._results.clear()
+        self._tables.clear()
+        self._versions.clear()
+
+    def __len__(self):
+        return len(self._results)
+
+# The memo used by convert_statements
+conversion_memo = ConversionMemo()
+
+def convert_statement(stmt, tribe, command_map, variable_map, indent=0, hashes=None, schedule=None):
     """
     Convert a single Script2 statement to Script4 format
     
@@ -22,309 +101,492 @@ def convert_statement(stmt, tribe, command_map, variable_map, indent=0):
         command_map: Command mapping dictionary
         variable_map: Variable mapping dictionary
         indent: The current indentation level
+        hashes: Structural hashes of the AST (see subtree_hashes), computed here when not given
+        schedule: TurnSchedule of the script, whose flags EVERY blocks test; without
+            one they read and test the turn themselves
         
     Returns:
         String or List containing the converted Script4 statement(s)
     """
-    indent_str = INDENT_CHAR * (indent * INDENT_SIZE)
+    node = as_node(stmt, LEGACY_STATEMENT_TAGS)
+    if isinstance(node, Node) and node.op in BLOCK_STATEMENT_OPS:
+        # Nested blocks are converted on an explicit stack, however deep they go
+        if hashes is None:
+            hashes = subtree_hashes(node)
+        converter = StatementConverter(tribe, command_map, variable_map, hashes, indent, schedule)
+        return walk(stmt, converter.pre, converter.post, converter.children)
+    return convert_simple_statement(node, tribe, command_map, variable_map, INDENT_CHAR * (indent * INDENT_SIZE))
+
+# Converters of the statements without nested statements, by statement type: an
+# opcode, or the tag of a legacy tuple with no node class
+STATEMENT_HANDLERS = {}
+
+def register_statement_handler(stmt_type, handler=None):
+    """
+    Register the converter of a statement type, replacing any earlier one. Can be
+    used as a decorator. The handler is called as handler(stmt, tribe, command_map,
+    variable_map, indent_str) and returns a line or a list of lines, like
+    convert_simple_statement. Statement types of IF, IF-ELSE and EVERY blocks are
+    converted by the walkers and cannot be registered.
     
+    Args:
+        stmt_type: Opcode of the statement's node class, or tag of its tuple
+        handler: The converter, or None to return a decorator registering one
+        
+    Returns:
+        The handler
+    """
+    if stmt_type in BLOCK_STATEMENT_OPS:
+        raise ValueError(f"Block statements cannot have a handler: {stmt_type}")
+    if handler is None:
+        return lambda handler: register_statement_handler(stmt_type, handler)
+    STATEMENT_HANDLERS[stmt_type] = handler
+    return handler
+
+def convert_simple_statement(stmt, tribe, command_map, variable_map, indent_str):
+    """
+    Convert a statement without nested statements (anything but IF, IF-ELSE and EVERY)
+    
+    Args:
+        stmt: The Script2 statement, as an AST node
+        tribe: The target tribe for the script
+        command_map: Command mapping dictionary
+        variable_map: Variable mapping dictionary
+        indent_str: Current indentation string
+        
+    Returns:
+        String or List containing the converted Script4 statement(s)
+    """
     # Handle different statement types
     if not stmt:
         return f"{indent_str}-- Empty statement"
     
-    stmt_type = stmt[0]
+    stmt_type = stmt.op if isinstance(stmt, Node) else stmt[0]
+    try:
+        handler = STATEMENT_HANDLERS.get(stmt_type)
+    except TypeError:
+        handler = None  # An unhashable tag, no statement has it
+    if handler is not None:
+        return handler(stmt, tribe, command_map, variable_map, indent_str)
     
-    # Handle command statements (both COMMAND_STMT and 'do')
-    if stmt_type == COMMAND_STMT or stmt_type == "do":
-        command = stmt[1]
-        
-        # Skip comments in commands
-        if command == CMD_COMMENT:
-            comment_text = stmt[2]
-            return f"{indent_str}{COMMENT_PREFIX} {comment_text}"
+    # Handle unrecognized statements
+    # Add more detailed debugging info
+    type_name = stmt.tag if isinstance(stmt, Node) else stmt_type
+    return f"{indent_str}-- UNKNOWN STATEMENT TYPE: {type_name} - Structure: {str(stmt)[:100]}..."
+
+def _assignment(target, value, indent_str, variable_map):
+    """Line storing value in target: WRITE_CP_ATTRIB for an INT_ATTR_ attribute, else an assignment"""
+    if isinstance(target, str) and target in STATE_ATTR_MAP:
+        read = f"READ_CP_ATTRIB(MY_TRIBE, {STATE_ATTR_MAP[target]})"
+        write = f"{indent_str}WRITE_CP_ATTRIB(MY_TRIBE, {STATE_ATTR_MAP[target]}, {value})"
+        cached = _current_value(target, variable_map)
+        if cached != read:
+            # Reads of the attribute come from a snapshot local, which the write makes stale
+            return [write, f"{indent_str}{cached} = {read}"]
+        return write
+    return f"{indent_str}{convert_user_var_name(target)} = {value}"
+
+def _current_value(target, variable_map):
+    """Expression reading the value of a target before it is assigned"""
+    if isinstance(target, str) and target in STATE_ATTR_MAP:
+        return convert_operand(target, variable_map)
+    return convert_user_var_name(target)
+
+@register_statement_handler(OP_DO)
+def convert_do_statement(stmt, tribe, command_map, variable_map, indent_str):
+    """Convert a DO command through its mapper in command_map"""
+    command = stmt.command
+    
+    # Skip comments in commands
+    if command == CMD_COMMENT:
+        comment_text = stmt.args[0]
+        return f"{indent_str}{COMMENT_PREFIX} {comment_text}"
+    
+    if command in command_map:
+        try:
+            my_func = command_map[command]
+            converted = f"{indent_str}{my_func(stmt, variable_map)}"
+            refresh = refresh_after_command(command, variable_map)
+            if refresh:
+                # The command may spend mana or change people counts the snapshot holds
+                return [converted, *(f"{indent_str}{line}" for line in refresh)]
+            return converted
+        except Exception as e:
+            logging.error(f"Error converting command {command}: {e}")
+            return f"{indent_str}-- ERROR: Failed to convert {command}: {e}"
+    else:
+        return f"{indent_str}-- UNSUPPORTED: {command} {', '.join(str(arg) for arg in stmt.args)}"
+
+@register_statement_handler(OP_SET)
+def convert_set_statement(stmt, tribe, command_map, variable_map, indent_str):
+    """Convert SET target value, where value may be an arithmetic expression"""
+    return _assignment(stmt.target, convert_expression(stmt.value, variable_map), indent_str, variable_map)
+
+@register_statement_handler(OP_INCREMENT)
+def convert_increment_statement(stmt, tribe, command_map, variable_map, indent_str):
+    """Convert INCREMENT target amount"""
+    amount = convert_operand(stmt.amount, variable_map)
+    return _assignment(stmt.target, f"{_current_value(stmt.target, variable_map)} + {amount}", indent_str, variable_map)
+
+@register_statement_handler(OP_DECREMENT)
+def convert_decrement_statement(stmt, tribe, command_map, variable_map, indent_str):
+    """Convert DECREMENT target amount"""
+    amount = convert_operand(stmt.amount, variable_map)
+    return _assignment(stmt.target, f"{_current_value(stmt.target, variable_map)} - {amount}", indent_str, variable_map)
+
+@register_statement_handler(OP_MULTIPLY)
+def convert_multiply_statement(stmt, tribe, command_map, variable_map, indent_str):
+    """Convert MULTIPLY target factor1 factor2"""
+    factor1 = convert_operand(stmt.left, variable_map)
+    factor2 = convert_operand(stmt.right, variable_map)
+    return _assignment(stmt.target, f"{factor1} * {factor2}", indent_str, variable_map)
+
+@register_statement_handler(OP_DIVIDE)
+def convert_divide_statement(stmt, tribe, command_map, variable_map, indent_str):
+    """Convert DIVIDE target dividend divisor, rounding down"""
+    dividend = convert_operand(stmt.left, variable_map)
+    divisor = convert_operand(stmt.right, variable_map)
+    return _assignment(stmt.target, f"math.floor({dividend} / {divisor})", indent_str, variable_map)
+
+@register_statement_handler(BEGIN_ACTIVE_STMT)
+@register_statement_handler(END_ACTIVE_STMT)
+def convert_active_marker(stmt, tribe, command_map, variable_map, indent_str):
+    """BEGIN_ACTIVE and END_ACTIVE have no direct equivalent in Script4, but we can comment for documentation"""
+    return f"{indent_str}-- {stmt[0]} (not needed in Script4)"
+
+@register_statement_handler(COMMENT_STMT)
+def convert_comment(stmt, tribe, command_map, variable_map, indent_str):
+    """Convert a single-line comment"""
+    return f"{indent_str}{COMMENT_PREFIX} {stmt[1]}"
+
+@register_statement_handler(COMMENT_BLOCK_STMT)
+def convert_comment_block_statement(stmt, tribe, command_map, variable_map, indent_str):
+    """Convert a multi-line comment"""
+    return convert_comment_block(stmt, indent_str)
+
+@register_statement_handler(SET_TIMER_STMT)
+def convert_set_timer(stmt, tribe, command_map, variable_map, indent_str):
+    """Convert SET_TIMER"""
+    timer_id = convert_value(stmt[1], variable_map)
+    timer_value = convert_value(stmt[2], variable_map)
+    return f"{indent_str}SET_TIMER({timer_id}, {timer_value})"
+
+@register_statement_handler(SET_TIMER_GOING_STMT)
+def convert_set_timer_going(stmt, tribe, command_map, variable_map, indent_str):
+    """Convert SET_TIMER_GOING"""
+    timer_id = convert_value(stmt[1], variable_map)
+    going_state = convert_value(stmt[2], variable_map)
+    return f"{indent_str}SET_TIMER_GOING({timer_id}, {going_state})"
+
+@register_statement_handler(SET_LEVEL_COMPLETE_STMT)
+def convert_set_level_complete(stmt, tribe, command_map, variable_map, indent_str):
+    """Convert SET_LEVEL_COMPLETE"""
+    return f"{indent_str}SET_LEVEL_COMPLETE({convert_value(stmt[1], variable_map)})"
+
+def convert_block_statement(stmt, inner_statements, else_statements, variable_map, indent_str, schedule=None):
+    """
+    Convert an IF, IF-ELSE or EVERY statement whose nested statements are converted already
+    
+    Args:
+        stmt: The Script2 statement, as an AST node
+        inner_statements: Converted lines of its body
+        else_statements: Converted lines of its ELSE body (IF-ELSE only)
+        variable_map: Variable mapping dictionary
+        indent_str: Current indentation string
+        schedule: TurnSchedule whose flags EVERY tests, or None
         
-        if command in command_map:
-            try:
-                my_func = command_map[command]
-                return f"{indent_str}{my_func(stmt, variable_map)}"
-            except Exception as e:
-                logging.error(f"Error converting command {command}: {e}")
-                return f"{indent_str}-- ERROR: Failed to convert {command}: {e}"
-        else:
-            return f"{indent_str}-- UNSUPPORTED: {command} {', '.join(str(arg) for arg in stmt[2:])}"
-    
-    # Handle variable assignment statements (set)
-    elif stmt_type == "set":
-        if len(stmt) >= 3:
-            # Check for INT_ATTR_ variables using STATE_ATTR_MAP
-            if isinstance(stmt[1], str) and stmt[1] in STATE_ATTR_MAP:
-                attr_name = STATE_ATTR_MAP[stmt[1]]
-                
-                # Special handling for operations where the attribute appears on both sides
-                if isinstance(stmt[2], (list, tuple)) and len(stmt[2]) == 3:
-                    op = stmt[2][0]
-                    left = stmt[2][1]
-                    right = stmt[2][2]
-                    
-                    # Check if we're operating on the same attribute
-                    if left == stmt[1] and op in ['+', '-', '*', '/', '%']:
-                        right_val = convert_value(right, variable_map)
-                        return f"{indent_str}WRITE_CP_ATTRIB(MY_TRIBE, {attr_name}, READ_CP_ATTRIB(MY_TRIBE, {attr_name}) {op} {right_val})"
-                
-                # If right side references another attribute, read it
-                if isinstance(stmt[2], str) and stmt[2] in STATE_ATTR_MAP:
-                    right_attr_name = STATE_ATTR_MAP[stmt[2]]
-                    return f"{indent_str}WRITE_CP_ATTRIB(MY_TRIBE, {attr_name}, READ_CP_ATTRIB(MY_TRIBE, {right_attr_name}))"
-                    
-                # Standard case - just assigning a value
-                value = convert_value(stmt[2], variable_map)
-                return f"{indent_str}WRITE_CP_ATTRIB(MY_TRIBE, {attr_name}, {value})"
-            else:
-                # Handle regular variable assignments
-                var_name = convert_user_var_name(stmt[1])
-                
-                # Check if right side is an attribute that needs to be read
-                if isinstance(stmt[2], str) and stmt[2] in STATE_ATTR_MAP:
-                    right_attr_name = STATE_ATTR_MAP[stmt[2]]
-                    return f"{indent_str}{var_name} = READ_CP_ATTRIB(MY_TRIBE, {right_attr_name})"
-                
-                value = convert_value(stmt[2], variable_map)
-                return f"{indent_str}{var_name} = {value}"
-        else:
-            return f"{indent_str}-- ERROR: Invalid set statement format: {stmt}"
+    Returns:
+        List of converted Script4 statements
+    """
+    inner_indent = f"{indent_str}{INDENT_CHAR * INDENT_SIZE}"
+    output = [f"{indent_str}{convert_block_header(stmt, variable_map, schedule)}"]
+    output.extend(f"{inner_indent}{inner}" for inner in inner_statements)
+    if stmt.op == OP_IF_ELSE:
+        output.append(f"{indent_str}else")
+        output.extend(f"{inner_indent}{inner}" for inner in else_statements)
+    output.append(f"{indent_str}end")
+    return output
+
+def convert_block_header(stmt, variable_map, schedule=None):
+    """
+    Convert the opening line of an IF, IF-ELSE or EVERY statement, unindented
     
+    Args:
+        stmt: The Script2 statement, as an AST node
+        variable_map: Variable mapping dictionary
+        schedule: TurnSchedule whose flags EVERY tests, or None to test the turn inline
+        
+    Returns:
+        The Script4 line opening the block
+    """
     # Handle EVERY statement - check condition periodically
-    elif stmt_type == EVERY_STMT or stmt_type == "every":
+    if stmt.op == OP_EVERY:
+        if schedule is not None:
+            return f"if {schedule.test(stmt.period, stmt.offset, variable_map)} then"
         # Extract seconds and condition
-        period  = convert_value(stmt[1], variable_map) if len(stmt) > 1 else 1
-        offset  = convert_value(stmt[2], variable_map)
+        period  = convert_value(stmt.period, variable_map)
+        offset  = convert_value(stmt.offset, variable_map)
         if offset  == 'nil':
             offset  = 0
-
-        condition = "true"
-        
-        # Some every statements have a random offset (position 2)
-        # The actual statements are in position 3
-        statements_pos = 3 if len(stmt) > 3 else 2
-        
-        # Check if we have at least the required parts
-        if len(stmt) <= statements_pos:
-            return f"{indent_str}-- ERROR: Invalid every statement format: {stmt}"
-            
-        # Convert the inner statements
-        inner_statements = convert_statements(stmt[statements_pos], tribe, command_map, variable_map)
-        
-        output = [f"{indent_str}if ((getTurn() + MY_TRIBE + {offset}) % {period} == 0) then"]
-        
-        for inner in inner_statements:
-            output.append(f"{indent_str}{INDENT_CHAR * INDENT_SIZE}{inner}")
-        
-        output.append(f"{indent_str}end")
-        return output
-    
-    # Handle basic IF statement
-    elif stmt_type == IF_STMT or stmt_type == "if":
-        condition = convert_condition(stmt[1], variable_map)
-        inner_statements = convert_statements(stmt[2], tribe, command_map, variable_map)
-        
-        output = [f"{indent_str}if {condition} then"]
-        
-        for inner in inner_statements:
-            output.append(f"{indent_str}{INDENT_CHAR * INDENT_SIZE}{inner}")
-        
-        output.append(f"{indent_str}end")
-        
-        return output
+        return f"if ((getTurn() + MY_TRIBE + {offset}) % {period} == 0) then"
     
-    # Handle IF-ELSE statement - handle both 'IF_ELSE' (constant) and 'if-else' (string from parser)
-    elif stmt_type == IF_ELSE_STMT or stmt_type == "if-else":
-        condition = convert_condition(stmt[1], variable_map)
-        if_statements = convert_statements(stmt[2], tribe, command_map, variable_map)
-        else_statements = convert_statements(stmt[3], tribe, command_map, variable_map)
-        
-        output = [f"{indent_str}if {condition} then"]
-        
-        for inner in if_statements:
-            output.append(f"{indent_str}{INDENT_CHAR * INDENT_SIZE}{inner}")
-        
-        output.append(f"{indent_str}else")
-        
-        for inner in else_statements:
-            output.append(f"{indent_str}{INDENT_CHAR * INDENT_SIZE}{inner}")
-        
-        output.append(f"{indent_str}end")
-        
-        return output
-
-    # Handle BEGIN_ACTIVE and END_ACTIVE
-    elif stmt_type in [BEGIN_ACTIVE_STMT, END_ACTIVE_STMT]:
-        # No direct equivalent in Script4, but we can comment for documentation
-        return f"{indent_str}-- {stmt_type} (not needed in Script4)"
-    
-    # Handle single-line comments
-    elif stmt_type == COMMENT_STMT:
-        return f"{indent_str}{COMMENT_PREFIX} {stmt[1]}"
-    
-    # Handle multi-line comments
-    elif stmt_type == COMMENT_BLOCK_STMT:
-        return convert_comment_block(stmt, indent_str)
-    
-    # Handle SET_TIMER and SET_TIMER_GOING
-    elif stmt_type == SET_TIMER_STMT:
-        timer_id = convert_value(stmt[1], variable_map)
-        timer_value = convert_value(stmt[2], variable_map)
-        return f"{indent_str}SET_TIMER({timer_id}, {timer_value})"
-    
-    elif stmt_type == SET_TIMER_GOING_STMT:
-        timer_id = convert_value(stmt[1], variable_map)
-        going_state = convert_value(stmt[2], variable_map)
-        return f"{indent_str}SET_TIMER_GOING({timer_id}, {going_state})"
-    
-    # Handle SET_CELL_SCRIPT_LEVEL
-    elif stmt_type == SET_LEVEL_COMPLETE_STMT:
-        return f"{indent_str}SET_LEVEL_COMPLETE({convert_value(stmt[1], variable_map)})"
-    
-    elif stmt_type == "divide":
-        if len(stmt) >= 4:
-            if isinstance(stmt[1], str) and stmt[1] in STATE_ATTR_MAP:
-                attr_name = STATE_ATTR_MAP[stmt[1]]
-                
-                # Check if dividend is an attribute that needs to be read
-                if isinstance(stmt[2], str) and stmt[2] in STATE_ATTR_MAP:
-                    dividend_attr = STATE_ATTR_MAP[stmt[2]]
-                    dividend = f"READ_CP_ATTRIB(MY_TRIBE, {dividend_attr})"
-                else:
-                    dividend = convert_value(stmt[2], variable_map)
-                    
-                # Check if divisor is an attribute that needs to be read
-                if isinstance(stmt[3], str) and stmt[3] in STATE_ATTR_MAP:
-                    divisor_attr = STATE_ATTR_MAP[stmt[3]]
-                    divisor = f"READ_CP_ATTRIB(MY_TRIBE, {divisor_attr})"
-                else:
-                    divisor = convert_value(stmt[3], variable_map)
-                    
-                return f"{indent_str}WRITE_CP_ATTRIB(MY_TRIBE, {attr_name}, math.floor({dividend} / {divisor}))"
-            else:
-                var_name = convert_user_var_name(stmt[1])
-                
-                # Check if dividend is an attribute that needs to be read
-                if isinstance(stmt[2], str) and stmt[2] in STATE_ATTR_MAP:
-                    dividend_attr = STATE_ATTR_MAP[stmt[2]]
-                    dividend = f"READ_CP_ATTRIB(MY_TRIBE, {dividend_attr})"
-                else:
-                    dividend = convert_value(stmt[2], variable_map)
-                    
-                # Check if divisor is an attribute that needs to be read
-                if isinstance(stmt[3], str) and stmt[3] in STATE_ATTR_MAP:
-                    divisor_attr = STATE_ATTR_MAP[stmt[3]]
-                    divisor = f"READ_CP_ATTRIB(MY_TRIBE, {divisor_attr})"
-                else:
-                    divisor = convert_value(stmt[3], variable_map)
-                    
-                return f"{indent_str}{var_name} = math.floor({dividend} / {divisor})"
-        else:
-            return f"{indent_str}-- ERROR: Invalid divide statement format: {stmt}"
-            
-    elif stmt_type == "multiply":
-        if len(stmt) >= 4:
-            if isinstance(stmt[1], str) and stmt[1] in STATE_ATTR_MAP:
-                attr_name = STATE_ATTR_MAP[stmt[1]]
-                
-                # Check if factors are attributes that need to be read
-                if isinstance(stmt[2], str) and stmt[2] in STATE_ATTR_MAP:
-                    factor1_attr = STATE_ATTR_MAP[stmt[2]]
-                    factor1 = f"READ_CP_ATTRIB(MY_TRIBE, {factor1_attr})"
-                else:
-                    factor1 = convert_value(stmt[2], variable_map)
-                    
-                if isinstance(stmt[3], str) and stmt[3] in STATE_ATTR_MAP:
-                    factor2_attr = STATE_ATTR_MAP[stmt[3]]
-                    factor2 = f"READ_CP_ATTRIB(MY_TRIBE, {factor2_attr})"
-                else:
-                    factor2 = convert_value(stmt[3], variable_map)
-                    
-                return f"{indent_str}WRITE_CP_ATTRIB(MY_TRIBE, {attr_name}, {factor1} * {factor2})"
-            else:
-                var_name = convert_user_var_name(stmt[1])
-                
-                # Check if factors are attributes that need to be read
-                if isinstance(stmt[2], str) and stmt[2] in STATE_ATTR_MAP:
-                    factor1_attr = STATE_ATTR_MAP[stmt[2]]
-                    factor1 = f"READ_CP_ATTRIB(MY_TRIBE, {factor1_attr})"
-                else:
-                    factor1 = convert_value(stmt[2], variable_map)
-                    
-                if isinstance(stmt[3], str) and stmt[3] in STATE_ATTR_MAP:
-                    factor2_attr = STATE_ATTR_MAP[stmt[3]]
-                    factor2 = f"READ_CP_ATTRIB(MY_TRIBE, {factor2_attr})"
-                else:
-                    factor2 = convert_value(stmt[3], variable_map)
-                    
-                return f"{indent_str}{var_name} = {factor1} * {factor2}"
-        else:
-            return f"{indent_str}-- ERROR: Invalid multiply statement format: {stmt}"
-    
-    
-    elif stmt_type == "increment":
-        if len(stmt) >= 3:
-            # Check if we're incrementing an INT_ATTR_ variable
-            if isinstance(stmt[1], str) and stmt[1] in STATE_ATTR_MAP:
-                attr_name = STATE_ATTR_MAP[stmt[1]]
-                
-                # Check if increment value is an attribute
-                if isinstance(stmt[2], str) and stmt[2] in STATE_ATTR_MAP:
-                    increment_attr = STATE_ATTR_MAP[stmt[2]]
-                    increment_value = f"READ_CP_ATTRIB(MY_TRIBE, {increment_attr})"
-                else:
-                    increment_value = convert_value(stmt[2], variable_map)
-                    
-                return f"{indent_str}WRITE_CP_ATTRIB(MY_TRIBE, {attr_name}, READ_CP_ATTRIB(MY_TRIBE, {attr_name}) + {increment_value})"
-            else:
-                # Regular variable increment
-                var_name = convert_user_var_name(stmt[1])
-                
-                # Check if increment value is an attribute
-                if isinstance(stmt[2], str) and stmt[2] in STATE_ATTR_MAP:
-                    increment_attr = STATE_ATTR_MAP[stmt[2]]
-                    increment_value = f"READ_CP_ATTRIB(MY_TRIBE, {increment_attr})"
-                else:
-                    increment_value = convert_value(stmt[2], variable_map)
-                    
-                return f"{indent_str}{var_name} = {var_name} + {increment_value}"
-        else:
-            return f"{indent_str}-- ERROR: Invalid increment statement format: {stmt}"
-        
-    elif stmt_type == "decrement":
-        if len(stmt) >= 3:
-            if isinstance(stmt[1], str) and stmt[1] in STATE_ATTR_MAP:
-                attr_name = STATE_ATTR_MAP[stmt[1]]
-                
-                # Check if decrement value is an attribute
-                if isinstance(stmt[2], str) and stmt[2] in STATE_ATTR_MAP:
-                    decrement_attr = STATE_ATTR_MAP[stmt[2]]
-                    decrement_value = f"READ_CP_ATTRIB(MY_TRIBE, {decrement_attr})"
-                else:
-                    decrement_value = convert_value(stmt[2], variable_map)
-                    
-                return f"{indent_str}WRITE_CP_ATTRIB(MY_TRIBE, {attr_name}, READ_CP_ATTRIB(MY_TRIBE, {attr_name}) - {decrement_value})"
-            else:
-                var_name = convert_user_var_name(stmt[1])
-                
-                # Check if decrement value is an attribute
-                if isinstance(stmt[2], str) and stmt[2] in STATE_ATTR_MAP:
-                    decrement_attr = STATE_ATTR_MAP[stmt[2]]
-                    decrement_value = f"READ_CP_ATTRIB(MY_TRIBE, {decrement_attr})"
-                else:
-                    decrement_value = convert_value(stmt[2], variable_map)
-                    
-                return f"{indent_str}{var_name} = {var_name} - {decrement_value}"
-        else:
-            return f"{indent_str}-- ERROR: Invalid decrement statement format: {stmt}"
-        
-    # Handle unrecognized statements
+    # Handle IF and IF-ELSE statements
+    condition = convert_condition(stmt.condition, variable_map)
+    return f"if {condition} then"
+
+def _constant_timing(period, offset):
+    """(period, offset) of an EVERY whose period and offset are numbers, else None"""
+    if offset is None:
+        offset = 0
+    if type(period) is int and type(offset) is int:
+        return (period, offset)
+    return None
+
+def _turn_test(period, offset):
+    """Lua test of TURN_LOCAL against a period and offset, each a number or Lua text"""
+    if offset == 0:
+        turn = TURN_LOCAL
+    elif type(offset) is int and offset < 0:
+        turn = f"{TURN_LOCAL} - {-offset}"
     else:
-        # Add more detailed debugging info
-        return f"{indent_str}-- UNKNOWN STATEMENT TYPE: {stmt_type} - Structure: {str(stmt)[:100]}..."
+        turn = f"{TURN_LOCAL} + {offset}"
+    # A power of two divides 2^32, so masking the low bits is the modulo even
+    # where bit32 wraps a negative turn around
+    if type(period) is int and period > 0 and period & (period - 1) == 0:
+        return f"bit32.band({turn}, {period - 1}) == 0"
+    if turn != TURN_LOCAL:
+        turn = f"({turn})"
+    return f"{turn} % {period} == 0"
+
+class TurnSchedule:
+    """
+    The EVERY tests of a script, run once per turn at the top of OnTurn: the turn
+    is read into a local once, and each distinct (period, offset) pair of numbers
+    is tested once into a flag local that every EVERY block with that timing
+    checks. Timings naming variables or constants are tested inline, against the
+    turn local.
+    """
+    def __init__(self, timings):
+        """timings: (period, offset) pairs of the EVERY blocks, see ScriptInfo.every_timings"""
+        self.timings = list(timings)
+        self.flags = {}
+        for timing in sorted({_constant_timing(*timing) for timing in self.timings} - {None}):
+            period, offset = timing
+            name = f"{EVERY_FLAG_PREFIX}{period}" if offset == 0 else f"{EVERY_FLAG_PREFIX}{period}_{offset}"
+            self.flags[timing] = name.replace('-', 'm')
+
+    def prologue(self):
+        """Lines opening OnTurn: the turn local and the flag of each timing"""
+        if not self.timings:
+            return []
+        lines = [f"local {TURN_LOCAL} = getTurn() + MY_TRIBE"]
+        lines.extend(f"local {name} = {_turn_test(*timing)}" for timing, name in self.flags.items())
+        return lines
+
+    def test(self, period, offset, variable_map):
+        """Lua condition of an EVERY block: its flag, or an inline test of the turn local"""
+        timing = _constant_timing(period, offset)
+        if timing is not None:
+            name = self.flags.get(timing)
+            return name if name is not None else _turn_test(*timing)
+        offset = 0 if offset is None else convert_value(offset, variable_map)
+        return _turn_test(convert_value(period, variable_map), offset)
+
+def build_turn_schedule(timings):
+    """
+    TurnSchedule of the EVERY timings of a script, or None when it has more distinct
+    timings than OnTurn can hold flag locals for (MAX_EVERY_FLAGS)
+    """
+    schedule = TurnSchedule(timings)
+    if len(schedule.flags) > MAX_EVERY_FLAGS:
+        return None
+    return schedule
+
+def _flatten(converted_statements):
+    """Lines of a list of converted statements, each a line or a list of lines"""
+    result = []
+    for converted in converted_statements:
+        if converted:
+            if isinstance(converted, list):
+                result.extend(converted)
+            else:
+                result.append(converted)
+    return result
+
+class StatementConverter:
+    """
+    Walker hooks converting statements (see Script2 Parser.Walker): simple statements
+    are converted on entry, IF, IF-ELSE and EVERY on exit from their converted
+    bodies, and a statement found in the conversion memo is not walked at all.
+    A statement list walked as the root converts to the lines of its statements.
+    """
+    def __init__(self, tribe, command_map, variable_map, hashes, indent=0, schedule=None):
+        self.tribe = tribe
+        self.command_map = command_map
+        self.variable_map = variable_map
+        self.hashes = hashes
+        self.schedule = schedule
+        self.memo = conversion_memo
+        self.root_indent_str = INDENT_CHAR * (indent * INDENT_SIZE)
+
+    def _key(self, stmt, indent_str):
+        # Memoized conversions are unindented
+        if indent_str:
+            return None
+        return self.memo.key(stmt, self.tribe, self.command_map, self.variable_map, self.hashes,
+                             self.schedule is not None)
+
+    def children(self, stmt):
+        if type(stmt) is list:
+            return stmt
+        stmt = as_node(stmt, LEGACY_STATEMENT_TAGS)
+        if isinstance(stmt, Node):
+            stmt_type = stmt.op
+            if stmt_type == OP_IF_ELSE:
+                return [*stmt.body, *stmt.else_body]
+            if stmt_type == OP_IF or stmt_type == OP_EVERY:
+                return stmt.body
+        return ()
+
+    def pre(self, stmt, depth):
+        if type(stmt) is list:
+            return None
+        indent_str = self.root_indent_str if depth == 0 else ''
+        key = self._key(stmt, indent_str)
+        if key is not None:
+            converted = self.memo.get(key)
+            if converted is not None:
+                return converted
+        node = as_node(stmt, LEGACY_STATEMENT_TAGS)
+        if isinstance(node, Node) and node.op in BLOCK_STATEMENT_OPS:
+            return None  # Converted in post, once its body is
+        converted = convert_simple_statement(node, self.tribe, self.command_map, self.variable_map, indent_str)
+        if key is not None:
+            self.memo.put(key, converted)
+        return converted
+
+    def post(self, stmt, results, depth):
+        if type(stmt) is list:
+            return _flatten(results)
+        indent_str = self.root_indent_str if depth == 0 else ''
+        node = as_node(stmt, LEGACY_STATEMENT_TAGS)
+        split = len(node.body)
+        converted = convert_block_statement(node, _flatten(results[:split]), _flatten(results[split:]),
+                                            self.variable_map, indent_str, self.schedule)
+        key = self._key(stmt, indent_str)
+        if key is not None:
+            self.memo.put(key, converted)
+        return converted
+
+# Marks where the ELSE body of an IF-ELSE starts among the statements StatementWriter walks
+_ELSE = object()
+
+class StatementWriter:
+    """
+    Walker hooks writing converted statements to a LuaWriter as they are reached:
+    a block writes its opening line on entry, indents its body, and writes its
+    closing line on exit. Statements found in the conversion memo are written from
+    it; an outermost block missing from it is captured while written and stored.
+    A body declaring snapshot locals writes them first, and its statements resolve
+    names through the body's own table.
+    """
+    def __init__(self, writer, tribe, command_map, variable_map, hashes, schedule=None, snapshot=None):
+        self.writer = writer
+        self.tribe = tribe
+        self.command_map = command_map
+        self.variable_map = variable_map
+        self.hashes = hashes
+        self.schedule = schedule
+        self.snapshot = snapshot
+        self.memo = conversion_memo
+        self._block_keys = []  # Memo key of each open block that is being captured, else None
+        self._blocks = []  # Each open block, with the table of the body around it
+
+    def _enter_body(self, node, else_body):
+        if self.snapshot is None:
+            return
+        body = self.snapshot.body(node, else_body)
+        if body is not None:
+            lines, self.variable_map = body
+            self.writer.lines(lines)
+
+    def children(self, stmt):
+        if type(stmt) is list:
+            return stmt
+        stmt = as_node(stmt, LEGACY_STATEMENT_TAGS)
+        if isinstance(stmt, Node):
+            stmt_type = stmt.op
+            if stmt_type == OP_IF_ELSE:
+                return [*stmt.body, _ELSE, *stmt.else_body]
+            if stmt_type == OP_IF or stmt_type == OP_EVERY:
+                return stmt.body
+        return ()
+
+    def pre(self, stmt, depth):
+        if type(stmt) is list:
+            return None
+        writer = self.writer
+        if stmt is _ELSE:
+            writer.dedent()
+            writer.line("else")
+            writer.indent()
+            node, self.variable_map = self._blocks[-1]
+            self._enter_body(node, True)
+            return True
+        key = self.memo.key(stmt, self.tribe, self.command_map, self.variable_map, self.hashes,
+                            self.schedule is not None)
+        if key is not None:
+            converted = self.memo.get(key)
+            if converted is not None:
+                writer.converted(converted)
+                return True
+        node = as_node(stmt, LEGACY_STATEMENT_TAGS)
+        if isinstance(node, Node) and node.op in BLOCK_STATEMENT_OPS:
+            self._block_keys.append(key if key is not None and writer.begin_capture() else None)
+            writer.line(convert_block_header(node, self.variable_map, self.schedule))
+            writer.indent()
+            self._blocks.append((node, self.variable_map))
+            self._enter_body(node, False)
+            return None
+        converted = convert_simple_statement(node, self.tribe, self.command_map, self.variable_map, '')
+        if key is not None:
+            self.memo.put(key, converted)
+        writer.converted(converted)
+        return True
+
+    def post(self, stmt, results, depth):
+        if type(stmt) is not list:
+            _, self.variable_map = self._blocks.pop()
+            self.writer.dedent()
+            self.writer.line("end")
+            key = self._block_keys.pop()
+            if key is not None:
+                self.memo.put(key, self.writer.end_capture())
+        return True
+
+def write_statements(writer, statements, tribe, command_map, variable_map, hashes=None, schedule=None, snapshot=None):
+    """
+    Convert a list of Script2 statements to Script4 format, writing the lines to a
+    LuaWriter at its current indentation instead of returning them
+    
+    Args:
+        writer: The LuaWriter to write to
+        statements: The Script2 statement structure
+        tribe: The target tribe for the script
+        command_map: Command mapping dictionary
+        variable_map: Variable mapping dictionary
+        hashes: Structural hashes of the AST, computed here when not given
+        schedule: TurnSchedule of the statements, whose flags EVERY blocks test
+        snapshot: StateSnapshot of the statements, whose locals the bodies declaring
+            them open with; variable_map is then its table of OnTurn
+    """
+    statements = _statement_list(statements)
+    if hashes is None:
+        hashes = subtree_hashes(statements)
+    if not isinstance(statements, list):
+        statements = [statements]
+    hooks = StatementWriter(writer, tribe, command_map, variable_map, hashes, schedule, snapshot)
+    walk(statements, hooks.pre, hooks.post, hooks.children)
 
 def convert_every_statement(stmt, tribe, command_map, variable_map, indent_str):
     """
@@ -430,7 +692,7 @@ def convert_comment_block(stmt, indent_str):
     output.append(f"{indent_str}{COMMENT_PREFIX} END COMMENT BLOCK")
     return output
 
-def convert_statements(statements, tribe, command_map, variable_map):
+def convert_statements(statements, tribe, command_map, variable_map, hashes=None, schedule=None):
     """
     Convert a list of Script2 statements to Script4 format
     
@@ -439,37 +701,34 @@ def convert_statements(statements, tribe, command_map, variable_map):
         tribe: The target tribe for the script
         command_map: Command mapping dictionary
         variable_map: Variable mapping dictionary
+        hashes: Structural hashes of the AST, computed here when not given
+        schedule: TurnSchedule of the statements, whose flags EVERY blocks test
         
     Returns:
         List of strings containing the converted Script4 statements
     """
-    result = []
+    statements = _statement_list(statements)
     
-    # If statements is a tuple with 'script' as first element, extract the actual statements
-    if isinstance(statements, tuple) and statements[0] == 'script':
-        # Structure is ('script', id, statements)
-        statements = statements[2]
-    
-    # Handle the 'statements' wrapper structure
-    if isinstance(statements, tuple) and statements[0] == 'statements':
-        statements = statements[1]  # Extract the actual list of statements
+    # Hash the whole tree once, nested blocks reuse the hashes
+    if hashes is None:
+        hashes = subtree_hashes(statements)
     
     # Process each statement
     if isinstance(statements, list):
-        for stmt in statements:
-            converted = convert_statement(stmt, tribe, command_map, variable_map)
-            if converted:
-                if isinstance(converted, list):
-                    result.extend(converted)
-                else:
-                    result.append(converted)
-    else:
-        # If it's not a list, try to convert it directly
-        converted = convert_statement(statements, tribe, command_map, variable_map)
-        if converted:
-            if isinstance(converted, list):
-                result.extend(converted)
-            else:
-                result.append(converted)
+        converter = StatementConverter(tribe, command_map, variable_map, hashes, schedule=schedule)
+        return walk(statements, converter.pre, converter.post, converter.children)
+    
+    # If it's not a list, try to convert it directly
+    return _flatten([convert_statement(statements, tribe, command_map, variable_map, hashes=hashes, schedule=schedule)])
+
+def _statement_list(statements):
+    """The statement list of a script or statement block, or statements itself"""
+    # If statements is the whole script, extract the actual statements
+    statements = as_node(statements)
+    if isinstance(statements, Node) and statements.op == OP_SCRIPT:
+        statements = as_node(statements.body)
     
-    return result
\ No newline at end of file
+    # Handle the 'statements' wrapper structure
+    if isinstance(statements, Node) and statements.op == OP_STATEMENTS:
+        statements = statements.statements  # Extract the actual list of statements
+    return statements
@@ -0,0 +1,94 @@
+from Script4_Language.Config import *
+
+"""
+Script4_Language/Converters/Structure.py
+Generation of the script functions around OnTurn
+"""
+
+from Script4_Language.Converters.Expressions import convert_user_var_name
+
+def _user_variable_key(name):
+    """Key of a user variable in a table constructor: its name without SC2_USR_, in brackets unless a Lua name"""
+    key = name[len(SC2_USR_PREFIX):] if name.startswith(SC2_USR_PREFIX) else name
+    if key.isidentifier() and key not in LUA_KEYWORDS:
+        return key
+    return f'["{key}"]'
+
+def user_variable_field(name, table):
+    """
+    The field of table holding a user variable
+
+    Args:
+        name: Lua name of the variable, SC2_USR_ prefixed
+        table: Name of the table
+
+    Returns:
+        Lua text of the field
+    """
+    key = _user_variable_key(name)
+    return f'{table}{key}' if key.startswith('[') else f'{table}.{key}'
+
+def generate_user_variables(variables, table=None):
+    """
+    Declare the user variables of a script as chunk locals, or as the fields of
+    one local table, all starting at 0. OnTurn and the save functions after the
+    declarations read them as upvalues instead of from the global table.
+
+    Args:
+        variables: USER_ variables of the script
+        table: Name of the table holding them, or None for one local each
+
+    Returns:
+        List of Lua lines
+    """
+    names = [convert_user_var_name(var) for var in variables]
+    if table is None:
+        return [f'local {name} = 0' for name in names]
+    if not names:
+        return [f'local {table} = {{}}']
+    indent = INDENT_CHAR * INDENT_SIZE
+    return [f'local {table} = {{', *(f'{indent}{_user_variable_key(name)} = 0,' for name in names), '}']
+
+def generate_save_functions(variables, declared=(), debug=False, table=None):
+    """
+    Generate OnSave and OnLoad for the user variables of a script: straight-line
+    code pushing each variable onto the save state in a fixed order, then their
+    count, and OnLoad popping them back in reverse. A save whose count does not
+    match, from another version of the script, is not loaded.
+
+    Args:
+        variables: USER_ variables to save, in the order to save them
+        declared: The ones the script header declares; the others may still be nil
+        debug: Log every variable saved and loaded
+        table: Name of the table holding the variables, or None when they are named directly
+
+    Returns:
+        List of Lua lines
+    """
+    indent = INDENT_CHAR * INDENT_SIZE
+    labels = [convert_user_var_name(var) for var in variables]
+    names = [user_variable_field(name, table) for name in labels] if table is not None else labels
+    count = len(names)
+
+    lines = ['function OnSave(state)']
+    for var, label, name in zip(variables, labels, names):
+        value = name if var in declared else f'{name} or 0'
+        lines.append(f'{indent}state:push_int({value})')
+        if debug:
+            lines.append(f'{indent}log("OnSave: {label} = " .. tostring({name}))')
+    lines.append(f'{indent}state:push_int({count})')
+    lines.append('end')
+    lines.append('')
+
+    lines.append('function OnLoad(state)')
+    lines.append(f'{indent}if state:pop_int() ~= {count} then')
+    if debug:
+        lines.append(f'{indent * 2}log("OnLoad: the save does not hold the {count} variables of this script")')
+    lines.append(f'{indent * 2}return')
+    lines.append(f'{indent}end')
+    for label, name in reversed(list(zip(labels, names))):
+        lines.append(f'{indent}{name} = state:pop_int()')
+        if debug:
+            lines.append(f'{indent}log("OnLoad: {label} = " .. tostring({name}))')
+    lines.append('end')
+    return lines
@@ -0,0 +1,91 @@
+from Script4_Language.Config import *
+
+"""
+Script4_Language/Converters/Writer.py
+Indentation-aware writer streaming Lua lines to a file or buffer
+"""
+
+class LuaWriter:
+    """
+    Writes Lua lines to a text stream as they are produced, prefixed with the
+    current indentation. Nested blocks call indent() and dedent() around their
+    bodies instead of re-indenting lists of converted lines, so every line is
+    written once, whatever its depth.
+
+    Lines are separated by newlines, with none after the last one, so the stream
+    ends up holding '\\n'.join() of every line written.
+    """
+    def __init__(self, stream, indent_unit=INDENT_CHAR * INDENT_SIZE):
+        self.stream = stream
+        self.indent_unit = indent_unit
+        self.lines_written = 0
+        self._prefixes = ['']  # Indentation of each open level, outermost first
+        self._capture = None  # Lines recorded since begin_capture()
+        self._capture_base = 0
+
+    @property
+    def depth(self):
+        """Number of open indentation levels"""
+        return len(self._prefixes) - 1
+
+    def indent(self, unit=None):
+        """Open an indentation level, of indent_unit unless another unit is given"""
+        self._prefixes.append(self._prefixes[-1] + (self.indent_unit if unit is None else unit))
+
+    def dedent(self):
+        """Close the innermost indentation level"""
+        if len(self._prefixes) == 1:
+            raise ValueError("dedent() without a matching indent()")
+        self._prefixes.pop()
+
+    def line(self, text=''):
+        """Write one line at the current indentation"""
+        prefix = self._prefixes[-1]
+        if self.lines_written:
+            self.stream.write(f"\n{prefix}{text}")
+        else:
+            self.stream.write(f"{prefix}{text}")
+        self.lines_written += 1
+        if self._capture is not None:
+            self._capture.append(f"{prefix[self._capture_base:]}{text}")
+
+    def lines(self, texts):
+        """Write each of texts as a line at the current indentation"""
+        if not isinstance(texts, (list, tuple)):
+            texts = list(texts)
+        if not texts:
+            return
+        prefix = self._prefixes[-1]
+        separator = f"\n{prefix}"
+        # One write for the whole list, so a memoized block costs about as much as a line
+        self.stream.write(separator if self.lines_written else prefix)
+        self.stream.write(separator.join(texts))
+        self.lines_written += len(texts)
+        if self._capture is not None:
+            relative = prefix[self._capture_base:]
+            self._capture.extend(f"{relative}{text}" for text in texts)
+
+    def converted(self, converted):
+        """Write a converted statement: a line, a list of lines, or nothing if empty"""
+        if converted:
+            if isinstance(converted, list):
+                self.lines(converted)
+            else:
+                self.line(converted)
+
+    def begin_capture(self):
+        """
+        Also record the lines written from now on, indented relative to the current
+        level, until end_capture(). Only one capture is open at a time, so a line is
+        recorded once at most; returns False if one is open already.
+        """
+        if self._capture is not None:
+            return False
+        self._capture = []
+        self._capture_base = len(self._prefixes[-1])
+        return True
+
+    def end_capture(self):
+        """Stop recording and return the lines recorded since begin_capture()"""
+        captured, self._capture = self._capture, None
+        return captured
@@ -9,6 +9,7 @@ Contains mapping functions to convert Script2 commands to Script4 format
 from Script4_Language.Converters.Expressions import (
     convert_value, convert_int_constant, convert_user_var_name
 )
+from Script2_Language.Script2_Parser import intern_keys
 
 def build_command_map(variable_map):
     """
@@ -163,7 +164,8 @@ def build_command_map(variable_map):
         "SET_BASE_MARKER": map_set_base_marker,
         "SET_BASE_RADIUS": map_set_base_radius,
     }
-    return command_map
+    # Key the table by the identifier objects the lexer produces
+    return intern_keys(command_map)
 
 def map_auto_messages(p, variable_map):
     """
@@ -868,7 +870,10 @@ def map_get_num_one_off_spells(p, variable_map):
         String containing the Script4 equivalent command
     """
     var = convert_user_var_name(p[PARAM_INDEX_FOURTH_ARG])
-    spell = convert_value(p[PARAM_INDEX_THIRD_ARG].replace('INT_', 'M_SPELL_'), variable_map)
+    spell = p[PARAM_INDEX_THIRD_ARG]
+    if type(spell) is str:  # Integer and string literals are passed through
+        spell = spell.replace('INT_', 'M_SPELL_')
+    spell = convert_value(spell, variable_map)
     return f"{var} = GET_NUM_ONE_OFF_SPELLS({TRIBE_BLUE}, {spell})"
 
 def map_nav_check(p, variable_map):
@@ -1264,7 +1269,10 @@ def map_train_people_now(p, variable_map):
         String containing the Script4 equivalent command
     """
     param1 = convert_value(p[PARAM_INDEX_SECOND_ARG], variable_map)
-    param2 = convert_value(p[PARAM_INDEX_THIRD_ARG].replace('INT_', 'M_PERSON_'), variable_map)
+    param2 = p[PARAM_INDEX_THIRD_ARG]
+    if type(param2) is str:  # Integer and string literals are passed through
+        param2 = param2.replace('INT_', 'M_PERSON_')
+    param2 = convert_value(param2, variable_map)
     return f"TRAIN_PEOPLE_NOW({MY_TRIBE}, {param1}, {param2})"
 
 def map_turn_push(p, variable_map):
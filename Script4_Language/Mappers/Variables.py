@@ -2,35 +2,73 @@ from Script4_Language.Config import *
 
 # filepath: c:\Users\Tyler\Documents\Repos\PopTB\CpScript\script-converter\Script4_Language\Mappers\Variables.py
 
-from Script4_Language.Converters.Expressions import (
-    convert_value, convert_int_constant, convert_user_var_name
-)
+from types import MappingProxyType
+
+from Script4_Language.Converters.Expressions import convert_value
+from Script2_Language.Script2_Parser import intern_keys
 
 """
 Script4_Language/Mappers/Variables.py
 Contains mapping functions to convert Script2 variables to Script4 format
 """
 
+# Names convert_value resolves by fixed rules, ahead of any mapping (the spell loop maps INT_CONVERT too)
+_SPECIAL_NAMES = ("INT_NO_SPECIFIC_BUILDING", "CONVERT", "INT_CONVERT", "M_SPELL_CONVERT")
+
+_resolution_table = None
+
 def build_variable_map():
     """
-    Build a dictionary of variable mapping functions based on the tribe
-    
+    Build the resolution table: every Script2 name with a fixed Script4 equivalent,
+    mapped to its final Script4 text
+
+    The table merges the variable mappings below with SPECIAL_MAPPINGS,
+    PEOPLE_MAPPINGS, STATE_ATTR_MAP and OPERATOR_MAP, so convert_value resolves a
+    known name with one lookup. It does not depend on the target tribe (MY_TRIBE is
+    resolved by the game), so it is built once and shared; it is read-only.
+
+    Returns:
+        Read-only mapping of Script2 names to Script4 text
+    """
+    global _resolution_table
+    if _resolution_table is None:
+        _resolution_table = compile_resolution_table(build_base_variable_map())
+    return _resolution_table
+
+def compile_resolution_table(base_map):
+    """
+    Resolve every name of base_map and of the Config mapping tables once
+
     Args:
-        tribe: The target tribe for the script
-        
+        base_map: Dictionary of Script2 names to Script4 text
+
     Returns:
-        Dictionary mapping Script2 variables to their Script4 conversion functions
+        Read-only mapping of Script2 names to the text convert_value gives them
+    """
+    names = [*base_map, *SPECIAL_MAPPINGS, *PEOPLE_MAPPINGS, *STATE_ATTR_MAP, *OPERATOR_MAP]
+    table = {name: convert_value(name, base_map) for name in names}
+    table.update((name, convert_value(name, {})) for name in _SPECIAL_NAMES)
+    # Keyed by the identifier objects the lexer produces, most keys being built at run time
+    return MappingProxyType(intern_keys(table))
+
+def build_base_variable_map():
+    """
+    Build the dictionary of Script2 variables with a Script4 equivalent that does not
+    follow the INT_ naming rules
+
+    Returns:
+        Dictionary mapping Script2 variables to their Script4 text
     """
     variable_map = {
         # People count variables
-        "INT_MY_NUM_PEOPLE": lambda: f"{PLAYERS_PATH}[{MY_TRIBE}].{NUM_PEOPLE_ATTR}",
-        "INT_BLUE_PEOPLE": lambda: f"{PLAYERS_PATH}[{TRIBE_BLUE}].{NUM_PEOPLE_ATTR}",
-        "INT_RED_PEOPLE": lambda: f"{PLAYERS_PATH}[{TRIBE_RED}].{NUM_PEOPLE_ATTR}",
-        "INT_YELLOW_PEOPLE": lambda: f"{PLAYERS_PATH}[{TRIBE_YELLOW}].{NUM_PEOPLE_ATTR}",
-        "INT_GREEN_PEOPLE": lambda: f"{PLAYERS_PATH}[{TRIBE_GREEN}].{NUM_PEOPLE_ATTR}",
-        "INT_WILD_PEOPLE": lambda: WILD_PEOPLE_PATH,
-        "INT_CP_FREE_ENTRIES": lambda: FREE_ENTRIES_FMT.format(MY_TRIBE),
-        "INT_MY_NUM_KILLED_BY_BLUE": lambda: f"{PLAYERS_PATH}[{TRIBE_BLUE}].PeopleKilled[{MY_TRIBE}]",
+        "INT_MY_NUM_PEOPLE": f"{PLAYERS_PATH}[{MY_TRIBE}].{NUM_PEOPLE_ATTR}",
+        "INT_BLUE_PEOPLE": f"{PLAYERS_PATH}[{TRIBE_BLUE}].{NUM_PEOPLE_ATTR}",
+        "INT_RED_PEOPLE": f"{PLAYERS_PATH}[{TRIBE_RED}].{NUM_PEOPLE_ATTR}",
+        "INT_YELLOW_PEOPLE": f"{PLAYERS_PATH}[{TRIBE_YELLOW}].{NUM_PEOPLE_ATTR}",
+        "INT_GREEN_PEOPLE": f"{PLAYERS_PATH}[{TRIBE_GREEN}].{NUM_PEOPLE_ATTR}",
+        "INT_WILD_PEOPLE": WILD_PEOPLE_PATH,
+        "INT_CP_FREE_ENTRIES": FREE_ENTRIES_FMT.format(MY_TRIBE),
+        "INT_MY_NUM_KILLED_BY_BLUE": f"{PLAYERS_PATH}[{TRIBE_BLUE}].PeopleKilled[{MY_TRIBE}]",
 
         # Person type counts for all tribes
         **build_tribe_person_counts(TRIBE_BLUE, "B"),
@@ -40,49 +78,48 @@ def build_variable_map():
         **build_tribe_person_counts(MY_TRIBE, "M"),
 
         # Special constants
-        "INT_NO_SPECIFIC_SPELL": lambda: "M_SPELL_NONE",
-        "NO_SPECIFIC_BUILDING": lambda: "INT_NO_SPECIFIC_BUILDING",
-        "BUILDING": lambda: "ATTACK_BUILDING",
-        "MARKER": lambda: "ATTACK_MARKER",
-        "INT_WRATH_OF_GOD": lambda: "M_SPELL_ARMAGEDDON",
-        "INT_CONVERT": lambda: "M_SPELL_CONVERT_WILD",
-        "CONVERT": lambda: "M_SPELL_CONVERT_WILD",
-        "INT_TARGET_MEDICINE_MAN": lambda: "ATTACK_TARGET_MEDICINE_MAN",
-        "INT_MY_MANA": lambda: f"MANA({MY_TRIBE})",
-        "INT_BLUE_MANA": lambda: f"MANA({TRIBE_BLUE})",
-        "INT_RED_MANA": lambda: f"MANA({TRIBE_RED})",
-        "INT_GREEN_MANA": lambda: f"MANA({TRIBE_GREEN})",
-        "INT_YELLOW_MANA": lambda: f"MANA({TRIBE_YELLOW})",
+        "INT_NO_SPECIFIC_SPELL": "M_SPELL_NONE",
+        "NO_SPECIFIC_BUILDING": "INT_NO_SPECIFIC_BUILDING",
+        "BUILDING": "ATTACK_BUILDING",
+        "MARKER": "ATTACK_MARKER",
+        "INT_WRATH_OF_GOD": "M_SPELL_ARMAGEDDON",
+        "INT_CONVERT": "M_SPELL_CONVERT_WILD",
+        "CONVERT": "M_SPELL_CONVERT_WILD",
+        "INT_TARGET_MEDICINE_MAN": "ATTACK_TARGET_MEDICINE_MAN",
+        "INT_MY_MANA": f"MANA({MY_TRIBE})",
+        "INT_BLUE_MANA": f"MANA({TRIBE_BLUE})",
+        "INT_RED_MANA": f"MANA({TRIBE_RED})",
+        "INT_GREEN_MANA": f"MANA({TRIBE_GREEN})",
+        "INT_YELLOW_MANA": f"MANA({TRIBE_YELLOW})",
         
 
         # Tribe constants
-        "BLUE": lambda: TRIBE_BLUE,
-        "RED": lambda: TRIBE_RED,
-        "GREEN": lambda: TRIBE_GREEN,
-        "YELLOW": lambda: TRIBE_YELLOW,
-        "INT_GAME_TURN": lambda: "getTurn()"
+        "BLUE": TRIBE_BLUE,
+        "RED": TRIBE_RED,
+        "GREEN": TRIBE_GREEN,
+        "YELLOW": TRIBE_YELLOW,
+        "INT_GAME_TURN": "getTurn()"
     }
 
     # Add spell mappings
     for spell in SPELL_NAMES:
-        variable_map[f"INT_{spell}"] = lambda spell=spell: f"{SPELL_PREFIX}{spell}"
+        variable_map[f"INT_{spell}"] = f"{SPELL_PREFIX}{spell}"
 
     # Add building mappings
     for building in BUILDING_TYPES:
-        variable_map[f"INT_{building}"] = lambda building=building: f"{BUILDING_PREFIX}{building}"
+        variable_map[f"INT_{building}"] = f"{BUILDING_PREFIX}{building}"
 
     # Add person type mappings
     for person in PERSON_TYPES:
-        variable_map[f"INT_{person}"] = lambda person=person: f"{PERSON_PREFIX}{person}"
+        variable_map[f"INT_{person}"] = f"{PERSON_PREFIX}{person}"
 
     # Add spell mappings
     for spell in SPELL_NAMES:
-        variable_map[f"INT_{spell}"] = lambda spell=spell: f"{SPELL_PREFIX}{spell}"
+        variable_map[f"INT_{spell}"] = f"{SPELL_PREFIX}{spell}"
         # Add spell cost mappings
         for tribe_code, tribe in TRIBE_MAP.items():
-            variable_map[f"INT_{tribe_code}_SPELL_{spell}_COST"] = lambda tribe=tribe, spell=spell: f"PLAYERS_SPELL_COST({tribe}, {SPELL_PREFIX}{spell})"
+            variable_map[f"INT_{tribe_code}_SPELL_{spell}_COST"] = f"PLAYERS_SPELL_COST({tribe}, {SPELL_PREFIX}{spell})"
     
-
     return variable_map
 
 def build_tribe_person_counts(tribe, tribe_short):
@@ -94,13 +131,13 @@ def build_tribe_person_counts(tribe, tribe_short):
         tribe_short: Single letter abbreviation (B, R, Y, G, M)
         
     Returns:
-        Dictionary of variable mappings for this tribe
+        Dictionary of variable mappings for this tribe, to Script4 text
     """
     person_counts = {}
     
     for person in PERSON_TYPES:
         var_name = f"INT_{tribe_short}_PERSON_{person}"
-        person_counts[var_name] = lambda tribe=tribe, person=person: f"{PLAYERS_PATH}[{tribe}].{NUM_PEOPLE_TYPE_PATH}[{PERSON_PREFIX}{person}]"
+        person_counts[var_name] = f"{PLAYERS_PATH}[{tribe}].{NUM_PEOPLE_TYPE_PATH}[{PERSON_PREFIX}{person}]"
     
     return person_counts
 
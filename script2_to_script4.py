@@ -7,7 +7,10 @@ from pathlib import Path
 
 from Script4_Language.Mappers.Commands import build_command_map
 from Script4_Language.Mappers.Variables import build_variable_map
-from Script4_Language.Converters.Core import convert_script_file, load_system_spec, validate_command_map, extract_user_variables
+from Script4_Language.Converters.Core import (
+    convert_script_file, load_system_spec, load_api_names, validate_command_map, extract_user_variables
+)
+from Script2_Language.Script2_Parser import set_lexer_backend, LEXER_BACKENDS, Script2SyntaxError
 from Script4_Language.Config import *
 
 # Configure logging
@@ -29,9 +32,16 @@ def parse_arguments():
     par.add_argument('--tribe', default='TRIBE_BLUE', 
                      choices=['TRIBE_BLUE', 'TRIBE_RED', 'TRIBE_YELLOW', 'TRIBE_GREEN'],
                      help='Default tribe for commands (default: TRIBE_BLUE)')
+    par.add_argument('--lexer', default=None, choices=LEXER_BACKENDS,
+                     help='Lexer backend used by the parser (default: ply, or $SCRIPT2_LEXER)')
+    par.add_argument('--snapshot', action='store_true',
+                     help='Read the game state each OnTurn uses more than once into locals at its top')
+    par.add_argument('--user-vars', default='global', choices=USER_VAR_MODES,
+                     help='Keep the USER_ variables in globals, chunk locals or one chunk-local table (default: global)')
     return par.parse_args()
 
-def process_directory(input_dir, output_dir, tribe, command_map, variable_map):
+def process_directory(input_dir, output_dir, tribe, command_map, variable_map, snapshot=False, user_vars="global",
+                      api_names=None):
     """
     Process all SCR files in a directory
     
@@ -42,6 +52,9 @@ def process_directory(input_dir, output_dir, tribe, command_map, variable_map):
         tribe: The target tribe for the script
         command_map: Command mapping dictionary
         variable_map: Variable mapping dictionary
+        snapshot: Cache the game state read by each OnTurn in locals
+        user_vars: Where the user variables live, one of USER_VAR_MODES
+        api_names: Names of the engine API each OnTurn binds to chunk locals
         
     Returns:
         Tuple containing (success_count, failure_count, failed_files)
@@ -60,6 +73,7 @@ def process_directory(input_dir, output_dir, tribe, command_map, variable_map):
     success_count = 0
     failure_count = 0
     failed_files = []
+    syntax_errors = {}  # File name -> every syntax error found in it
     
     for i, scr_file in enumerate(sorted(scr_files), 1):
         input_path = os.path.join(input_dir, scr_file)
@@ -73,7 +87,8 @@ def process_directory(input_dir, output_dir, tribe, command_map, variable_map):
         print(f"[{i}/{total_files} - {progress:.1f}%] Processing {scr_file}...", end="", flush=True)
         
         try:
-            result = convert_script_file(input_path, output_path, tribe, command_map, variable_map)
+            result = convert_script_file(input_path, output_path, tribe, command_map, variable_map, snapshot,
+                                         user_vars, api_names)
             if result == SUCCESS:
                 success_count += 1
                 print(" ✓")
@@ -82,6 +97,12 @@ def process_directory(input_dir, output_dir, tribe, command_map, variable_map):
                 error_msg = f"Conversion failed with status {result}"
                 failed_files.append((scr_file, error_msg))
                 print(f" ✗ - Error: {error_msg}")
+        except Script2SyntaxError as e:
+            syntax_errors[scr_file] = e.errors
+            error_msg = f"{len(e.errors)} syntax error{'s' if len(e.errors) != 1 else ''}"
+            failed_files.append((scr_file, error_msg))
+            print(f" ✗ - Error: {error_msg}")
+            failure_count += 1
         except Exception as e:
             error_msg = str(e)
             failed_files.append((scr_file, error_msg))
@@ -89,12 +110,13 @@ def process_directory(input_dir, output_dir, tribe, command_map, variable_map):
             failure_count += 1
     
     # Print summary report
-    _write_summary_report(total_files, success_count, failure_count, failed_files, output_dir)
+    _write_summary_report(total_files, success_count, failure_count, failed_files, output_dir, syntax_errors)
     
     return success_count, failure_count, failed_files
 
-def _write_summary_report(total_files, success_count, failure_count, failed_files, output_dir):
-    """Write a summary report of the conversion process"""
+def _write_summary_report(total_files, success_count, failure_count, failed_files, output_dir, syntax_errors=None):
+    """Write a summary report of the conversion process, listing every syntax error of each failed file"""
+    syntax_errors = syntax_errors or {}
     # Calculate completion percentage
     completion_percentage = (success_count / total_files) * 100 if total_files > 0 else 0
     
@@ -111,6 +133,8 @@ def _write_summary_report(total_files, success_count, failure_count, failed_file
         print("\nFailed files:")
         for file, error in failed_files:
             print(f"  • {file}: {error[:100]}{'...' if len(error) > 100 else ''}")
+            for syntax_error in syntax_errors.get(file, ()):
+                print(f"      {syntax_error}")
         
         # Generate a detailed report file
         report_path = os.path.join(output_dir, "conversion_report.txt")
@@ -127,6 +151,8 @@ def _write_summary_report(total_files, success_count, failure_count, failed_file
             for file, error in failed_files:
                 report_file.write(f"File: {file}\n")
                 report_file.write(f"Error: {error}\n")
+                for syntax_error in syntax_errors.get(file, ()):
+                    report_file.write(f"  {syntax_error}\n")
                 report_file.write("-"*50 + "\n")
         
         print(f"\nDetailed conversion report written to: {report_path}")
@@ -159,11 +185,16 @@ def main():
     """Main function with command line argument support"""
     args = parse_arguments()
 
+    # Select the lexer backend
+    if args.lexer:
+        set_lexer_backend(args.lexer)
+
     # Load system specification
     system_spec = load_system_spec(args.system_spec)
     if not system_spec:
         logging.error("Failed to load system specification")
         return 1
+    api_names = load_api_names(system_spec)
 
     # Build variable and command maps
     variable_map = build_variable_map()
@@ -184,12 +215,13 @@ def main():
     # Perform conversion based on mode
     if args.file:
         # Single file conversion
-        result = convert_script_file(args.input, args.output, args.tribe, valid_commands, variable_map)
+        result = convert_script_file(args.input, args.output, args.tribe, valid_commands, variable_map, args.snapshot,
+                                     args.user_vars, api_names)
         return 0 if result == SUCCESS else 1
     elif args.batch:
         # Batch conversion - process all SCR files in a directory
         success, failures, _ = process_directory(
-            args.input, args.output, args.tribe, command_map, variable_map
+            args.input, args.output, args.tribe, command_map, variable_map, args.snapshot, args.user_vars, api_names
         )
         return 0 if failures == 0 else 1
     
@@ -0,0 +1,51 @@
+"""
+API locals: the globals OnTurn reads are bound to chunk locals ahead of it
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Parse_Script2
+from Script4_Language.Mappers.Variables import build_variable_map
+from Script4_Language.Converters.Core import convert_script, collect_api_names, load_api_names, load_system_spec
+
+SPEC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                    'Script4_Language', 'System', 'script4_system_spec.json')
+API_NAMES = load_api_names(load_system_spec(SPEC))
+
+LUA = '''    local _turn = getTurn() + MY_TRIBE
+    if _gsi.Players[MY_TRIBE].NumPeople > 30 and state:pop_int() ~= OFF then
+        ATTK_RST = ATTACK(MY_TRIBE, TRIBE_BLUE, 10) -- ATTACK_NORMAL
+        SC2_USR_A = math.floor(SC2_USR_A / 2)
+        log("READ_CP_ATTRIB")
+        SC2_USR_B = FOO_BAR
+    end
+    for i = 1, TRIBE_RED do MAX_NUM_MODLES = i end
+    for TRIBE_GREEN, v in pairs(_gnsi) do end
+    if ON then ATTR_EXPANSION, TRIBE_YELLOW = 1, 2 end'''
+
+class ApiLocalsTest(unittest.TestCase):
+    def test_collected_names(self):
+        # Names assigned or bound by a loop anywhere stay globals, and so do names outside the API
+        self.assertEqual(collect_api_names(LUA, API_NAMES),
+                         ['ATTACK', 'MY_TRIBE', 'OFF', 'ON', 'TRIBE_BLUE', 'TRIBE_RED', '_gnsi', '_gsi', 'getTurn',
+                          'log', 'math'])
+        self.assertEqual(collect_api_names(LUA, API_NAMES, limit=1), ['MY_TRIBE'])
+
+    def test_locals_are_declared_before_on_turn(self):
+        script = 'COMPUTER_PLAYER 1 BEGIN SET USER_A INT_ATTR_EXPANSION DO SET_AUTO_BUILD ON END SCRIPT_END'
+        lines = convert_script(Parse_Script2(script), 'a.scr', 'a.lua', 1, {}, build_variable_map(),
+                               api_names=API_NAMES)
+        start = lines.index('-- API LOCALS')
+        self.assertEqual(lines[start + 1:lines.index('function OnTurn()')], [
+            'local ATTR_EXPANSION = ATTR_EXPANSION',
+            'local MY_TRIBE = MY_TRIBE',
+            'local READ_CP_ATTRIB = READ_CP_ATTRIB',
+            '',
+        ])
+        self.assertGreater(start, lines.index('ON = 1'))
+        self.assertNotIn('-- API LOCALS', convert_script(Parse_Script2(script), 'a.scr', 'a.lua', 1, {}, build_variable_map()))
+
+if __name__ == '__main__':
+    unittest.main()
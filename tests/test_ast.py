@@ -0,0 +1,109 @@
+"""
+AST nodes built by the parser: layout, tuple compatibility and statement lines
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import (
+    Parse_Script2, Script2Parser, LEXER_BACKENDS, DoStatement, MultiplyStatement, DivideStatement,
+    IncrementStatement, DecrementStatement, BinaryExpression, SetStatement, Node, StringLiteral,
+    intern_symbol, as_node
+)
+
+SCRIPT = '''COMPUTER_PLAYER 1
+BEGIN
+    DO DESELECT_ALL_BLUE_PEOPLE 12 ON
+    IF ( USER_A > 1 )
+    BEGIN
+        MULTIPLY USER_B USER_A 2
+    END
+    ELSE
+    BEGIN
+        INCREMENT USER_C 1
+        EVERY 4
+        BEGIN
+            DECREMENT USER_C 1
+        END
+    ENDIF
+    SET USER_D ( USER_A + 1 )
+END
+SCRIPT_END
+'''
+
+class ASTTest(unittest.TestCase):
+    def setUp(self):
+        self.ast = Parse_Script2(SCRIPT)
+
+    def test_generic_do_arguments_are_flat(self):
+        do = self.ast.body.statements[0]
+        self.assertIsInstance(do, DoStatement)
+        self.assertEqual(do.command, 'DESELECT_ALL_BLUE_PEOPLE')
+        self.assertEqual(do.args, (12, 'ON'))
+        self.assertEqual(do, ('do', 'DESELECT_ALL_BLUE_PEOPLE', 12, 'ON'))
+        self.assertEqual((do[2], do[3], len(do)), (12, 'ON', 4))
+
+    def test_literals_are_typed(self):
+        source = 'COMPUTER_PLAYER 2 BEGIN SET USER_A -3 DO CREATE_MSG_NARRATIVE "Hi there" EVERY 0 BEGIN END END'
+        for backend in LEXER_BACKENDS:
+            with self.subTest(backend=backend):
+                ast = Script2Parser(backend).parse(source)
+                set_statement, do, every = ast.body.statements
+                self.assertEqual((ast.player, set_statement.value, every.period), (2, -3, 0))
+                self.assertIs(type(set_statement.value), int)
+                self.assertIs(type(do.args[0]), StringLiteral)
+                self.assertEqual((do.args[0], do.args[0].source()), ('Hi there', '"Hi there"'))
+                self.assertEqual(set_statement.target, 'USER_A')
+
+    def test_identifiers_are_interned(self):
+        source = 'COMPUTER_PLAYER 1 BEGIN SET USER_A INT_ATTR_EXPANSION DO ATTACK_SOMETHING ON END'
+        for backend in LEXER_BACKENDS:
+            with self.subTest(backend=backend):
+                first, second = (Script2Parser(backend).parse(source).body.statements for _ in range(2))
+                self.assertIs(first[0].target, second[0].target)
+                self.assertIs(first[0].value, intern_symbol('INT_ATTR_EXPANSION'))
+                self.assertIs(first[1].command, second[1].command)
+
+    def test_sibling_statement_types_are_distinct(self):
+        self.assertNotIsInstance(DivideStatement('X', 'Y', '2'), MultiplyStatement)
+        self.assertNotIsInstance(MultiplyStatement('X', 'Y', '2'), DivideStatement)
+        self.assertNotIsInstance(DecrementStatement('X', '1'), IncrementStatement)
+        self.assertNotIsInstance(IncrementStatement('X', '1'), DecrementStatement)
+
+    def test_statement_lines_in_source_order(self):
+        lines = [(statement.tag, line) for statement, line in self.ast.body.statement_lines()]
+        self.assertEqual(lines, [('do', 3), ('if-else', 4), ('multiply', 6), ('increment', 10),
+                                 ('every', 11), ('decrement', 13), ('set', 16)])
+        self.assertEqual([self.ast.body.statement_lineno(i) for i in range(3)], [3, 4, 16])
+
+    def test_every_node_class_has_a_legacy_form(self):
+        classes = [Node]
+        while classes:
+            cls = classes.pop()
+            classes.extend(cls.__subclasses__())
+            if cls.op is not None:
+                with self.subTest(node=cls.__name__):
+                    self.assertIn('legacy', {name for klass in cls.__mro__[:cls.__mro__.index(Node)] for name in vars(klass)})
+
+    def test_deep_legacy_expression_without_recursion(self):
+        depth = 300
+        expression = 'USER_A'
+        for _ in range(depth):
+            expression = ('+', expression, 1)
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(100)
+        try:
+            node = as_node(('set', 'USER_B', expression))
+        finally:
+            sys.setrecursionlimit(limit)
+        self.assertIsInstance(node, SetStatement)
+        value = node.value
+        for _ in range(depth):
+            self.assertIsInstance(value, BinaryExpression)
+            self.assertEqual(value.right, 1)
+            value = value.left
+        self.assertEqual(value, 'USER_A')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+On-disk AST cache: a stored AST loads back unchanged, and the cache stays under its cap
+"""
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Parse_Script2, ASTCache, StringLiteral, intern_symbol
+from Script2_Language.Utils.AST_Cache import encode_ast, decode_ast
+
+SCRIPT = '''COMPUTER_PLAYER 1
+BEGIN
+    DO CREATE_MSG_NARRATIVE "Hello"
+    IF ( USER_A > 1 )
+    BEGIN
+        MULTIPLY USER_B USER_A 2
+    END
+    ELSE
+    BEGIN
+        EVERY 4 1
+        BEGIN
+            DECREMENT USER_C 0
+        END
+    ENDIF
+    SET USER_D ( USER_A + 1 )
+END
+SCRIPT_END
+'''
+
+class ASTCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+    def test_round_trip(self):
+        cache = ASTCache(self.temp_dir.name, 1 << 20)
+        ast = Parse_Script2(SCRIPT)
+        self.assertIsNone(cache.get(SCRIPT))
+        cache.put(SCRIPT, ast)
+        cached = cache.get(SCRIPT)
+        self.assertIsNot(cached, ast)
+        self.assertEqual(repr(cached), repr(ast))
+        self.assertEqual(list(cached.body.statement_lines()), list(ast.body.statement_lines()))
+        self.assertEqual(list(cached.body.starts), list(ast.body.starts))
+        do = cached.body.statements[0]
+        self.assertIs(type(do.args[0]), StringLiteral)
+        self.assertIs(do.command, intern_symbol('CREATE_MSG_NARRATIVE'))
+        self.assertIsNone(cache.get(SCRIPT + '\n'))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        scripts = [SCRIPT.replace('USER_D', f'USER_{name}') for name in 'EFG']
+        cache = ASTCache(self.temp_dir.name, 1 << 20)
+        now = time.time()
+        for age, script in zip((30, 20, 10), scripts):
+            cache.put(script, Parse_Script2(script))
+            path = os.path.join(self.temp_dir.name, cache.key(script) + '.ast')
+            os.utime(path, (now - age, now - age))
+        self.assertIsNotNone(cache.get(scripts[0]))  # Now the most recently used
+        # Room for two entries: storing the third again evicts the second script
+        cache.max_bytes = 2 * os.path.getsize(path)
+        cache.put(scripts[2], Parse_Script2(scripts[2]))
+        self.assertEqual(len(os.listdir(self.temp_dir.name)), 2)
+        self.assertIsNone(cache.get(scripts[1]))
+        self.assertIsNotNone(cache.get(scripts[0]))
+
+    def test_directory_is_made_on_first_store(self):
+        directory = os.path.join(self.temp_dir.name, 'ast')
+        cache = ASTCache(directory, 1 << 20)
+        self.assertIsNone(cache.get(SCRIPT))
+        self.assertFalse(os.path.exists(directory))
+        cache.put(SCRIPT, Parse_Script2(SCRIPT))
+        self.assertIsNotNone(cache.get(SCRIPT))
+
+    def test_deep_nesting_without_recursion(self):
+        depth = 300
+        script = ('COMPUTER_PLAYER 1 BEGIN ' + 'IF ( USER_A > 1 ) BEGIN ' * depth + 'SET USER_B 1 '
+                  + 'ENDIF ' * depth + 'END SCRIPT_END')
+        ast = Parse_Script2(script)
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(100)
+        try:
+            decoded = decode_ast(encode_ast(ast))
+        finally:
+            sys.setrecursionlimit(limit)
+        self.assertEqual(encode_ast(decoded), encode_ast(ast))
+
+if __name__ == '__main__':
+    unittest.main()
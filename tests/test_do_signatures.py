@@ -0,0 +1,55 @@
+"""
+DO commands: one grammar production, arguments checked against the command signatures
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Parse_Script2_With_Errors
+from Script2_Language.Parser.Signatures import check_do_arguments, compile_signatures
+
+def parse_body(lines):
+    ast, errors = Parse_Script2_With_Errors('COMPUTER_PLAYER 1\nBEGIN\n' + '\n'.join(lines) + '\nEND\n')
+    return ast.body.statements, errors
+
+class DoSignatureTest(unittest.TestCase):
+    def test_accepted_shapes(self):
+        statements, errors = parse_body([
+            'DO FLYBY_START',
+            'DO SET_AUTO_HOUSE ON',
+            'DO FLASH_BUTTON 3 OFF',
+            'DO ZOOM_TO 1 2 3',
+            'DO STATE_DEFEND 1 2 ON',
+            'DO STATE_SPELL_DEFENCE 1 2 OFF',
+            'DO AUTO_MESSAGES OFF',
+            'DO SOME_NEW_SWITCH ON',
+        ])
+        self.assertEqual(errors, [])
+        self.assertEqual(statements[2], ('do', 'FLASH_BUTTON', 3, 'OFF'))
+        self.assertEqual([s.command for s in statements][-1], 'SOME_NEW_SWITCH')
+
+    def test_mismatched_arguments_are_reported_and_dropped(self):
+        statements, errors = parse_body([
+            'DO SET_AUTO_HOUSE 5',
+            'DO ZOOM_TO 1 2',
+            'DO AUTO_MESSAGES ON',
+            'DO FLYBY_START ON',
+            'SET USER_A 1',
+        ])
+        self.assertEqual([(e.lineno, e.token_type, e.value) for e in errors],
+                         [(3, 'DO', 'SET_AUTO_HOUSE'), (4, 'DO', 'ZOOM_TO'),
+                          (5, 'DO', 'AUTO_MESSAGES'), (6, 'DO', 'FLYBY_START')])
+        self.assertEqual(str(errors[0]), "line 3: DO SET_AUTO_HOUSE takes 'ON|OFF', got 5")
+        self.assertEqual(str(errors[3]), "line 6: DO FLYBY_START takes no arguments, got ON")
+        self.assertEqual([s.tag for s in statements], ['set'])
+
+    def test_new_command_needs_only_a_table_entry(self):
+        table = compile_signatures({'NEW_COMMAND': ['arg ON|OFF'], 'ANY_ARGS': None})
+        self.assertIsNone(table['ANY_ARGS'])
+        self.assertEqual([text for text, _ in table['NEW_COMMAND']], ['arg ON|OFF'])
+        self.assertEqual(check_do_arguments('ZOOM_TO', (1, 2, 'USER_A')), None)
+        self.assertEqual(check_do_arguments('ZOOM_TO', (1, 'ON', 3)), ['arg arg arg'])
+
+if __name__ == '__main__':
+    unittest.main()
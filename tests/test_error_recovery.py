@@ -0,0 +1,107 @@
+"""
+Syntax error recovery: every error is reported in one pass and the parser never hangs
+"""
+import contextlib
+import io
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Parse_Script2, Parse_Script2_With_Errors, Script2SyntaxError
+
+# Seconds a single parse may take before it is treated as hung
+PARSE_TIMEOUT = 30
+
+def parse_with_timeout(script_code):
+    """Parse_Script2_With_Errors on a worker thread, failing instead of hanging"""
+    outcome = {}
+    def run():
+        outcome['result'] = Parse_Script2_With_Errors(script_code)
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    worker.join(PARSE_TIMEOUT)
+    if worker.is_alive():
+        raise AssertionError(f"Parser did not finish within {PARSE_TIMEOUT}s on: {script_code!r}")
+    return outcome['result']
+
+def statement_targets(ast):
+    return [statement[1] for statement in ast.body.statements]
+
+class ErrorRecoveryTest(unittest.TestCase):
+    def test_stray_endif_at_top_level(self):
+        ast, errors = parse_with_timeout('COMPUTER_PLAYER 1 BEGIN SET USER_A 5 ENDIF SET USER_E 8 END')
+        self.assertEqual([(e.lineno, e.token_type) for e in errors], [(1, 'ENDIF')])
+        self.assertEqual(statement_targets(ast), ['USER_A', 'USER_E'])
+
+    def test_stray_endif_in_every_block(self):
+        ast, errors = parse_with_timeout(
+            'COMPUTER_PLAYER 1 BEGIN EVERY 4 BEGIN SET USER_A 1 ENDIF SET USER_B 2 END SET USER_C 3 END')
+        self.assertEqual([e.token_type for e in errors], ['ENDIF'])
+        self.assertEqual(len(ast.body.statements[0].body), 2)
+        self.assertEqual(statement_targets(ast)[1:], ['USER_C'])
+
+    def test_malformed_if_condition(self):
+        ast, errors = parse_with_timeout(
+            'COMPUTER_PLAYER 1 BEGIN SET USER_A 5\n'
+            'IF ( USER_A > ) BEGIN SET USER_B 2 END ENDIF\n'
+            'SET USER_E 8 END')
+        self.assertEqual([(e.lineno, e.token_type) for e in errors], [(2, 'RPAREN')])
+        self.assertEqual(statement_targets(ast), ['USER_A', 'USER_E'])
+
+    def test_every_error_reported_in_one_pass(self):
+        script_code = (
+            'COMPUTER_PLAYER 3\n'
+            'BEGIN\n'
+            '    SET USER_A ( 1 + 2 )\n'
+            '    SET\n'
+            '    DO TRAIN_PEOPLE_NOW 2 INT_BRAVE\n'
+            '    IF ( USER_A == ) BEGIN\n'
+            '        SET USER_B 3\n'
+            '    ENDIF\n'
+            '    INCREMENT USER_A 1\n'
+            '    EVERY 4 BEGIN\n'
+            '        MULTIPLY USER_A\n'
+            '    END\n'
+            '    DECREMENT USER_A 2\n'
+            'END\n'
+            'SCRIPT_END\n')
+        ast, errors = parse_with_timeout(script_code)
+        self.assertEqual([e.lineno for e in errors], [5, 6, 12])
+        self.assertEqual([statement.tag for statement in ast.body.statements],
+                         ['set', 'do', 'increment', 'every', 'decrement'])
+
+        with self.assertRaises(Script2SyntaxError) as raised:
+            Parse_Script2(script_code, debug_on_failure=False)
+        self.assertEqual([e.lineno for e in raised.exception.errors], [5, 6, 12])
+        self.assertEqual(raised.exception.ast, ast)
+
+    def test_missing_end_keeps_completed_statements(self):
+        # The last statement is still waiting for the next token when the script ends
+        ast, errors = parse_with_timeout('COMPUTER_PLAYER 1 BEGIN SET USER_A 5\nSET USER_B 6\nSET USER_C 7\n')
+        self.assertEqual([(e.lineno, e.token_type) for e in errors], [(3, None)])
+        self.assertEqual(statement_targets(ast), ['USER_A', 'USER_B'])
+
+    def test_valid_script_has_no_errors(self):
+        ast, errors = parse_with_timeout('COMPUTER_PLAYER 1 BEGIN SET USER_A 5 END')
+        self.assertEqual(errors, [])
+        self.assertEqual(statement_targets(ast), ['USER_A'])
+
+    def test_divide_statement_after_an_expression(self):
+        # DIVIDE starts a statement; only '/' divides inside an expression
+        ast, errors = parse_with_timeout('COMPUTER_PLAYER 1 BEGIN SET INT_ATTR_EXPANSION ( INT_ATTR_EXPANSION + 5 ) '
+                                         'DIVIDE USER_Q INT_ATTR_EXPANSION 2 SET USER_B ( USER_Q / 2 ) END')
+        self.assertEqual(errors, [])
+        self.assertEqual(statement_targets(ast), ['INT_ATTR_EXPANSION', 'USER_Q', 'USER_B'])
+        self.assertEqual(ast.body.statements[2].value.operator, '/')
+
+    def test_argument_errors_are_reported_as_such(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            _, errors = parse_with_timeout('COMPUTER_PLAYER 1 BEGIN DO SET_AUTO_BUILD 1 2 3 END')
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(output.getvalue().startswith('Argument error at line 1: DO SET_AUTO_BUILD'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+"""
+Classification of pattern-based INT_ constants by convert_int_constant
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script4_Language.Converters.Expressions import convert_int_constant
+from Script2_Language.Script2_Parser import StringLiteral
+
+class IntConstantTest(unittest.TestCase):
+    def test_patterns(self):
+        cases = {
+            'INT_B_SPELL_LIGHTNING_BOLT_COST': 'PLAYERS_SPELL_COST(TRIBE_BLUE, M_SPELL_LIGHTNING_BOLT)',
+            'INT_R_PERSON_SUPER_WARRIOR': '_gsi.Players[TRIBE_RED].NumPeopleOfType[M_PERSON_SUPER_WARRIOR]',
+            'INT_M_BUILDING_DRUM_TOWER': 'PLAYERS_BUILDING_OF_TYPE(MY_TRIBE, M_BUILDING_DRUM_TOWER)',
+            'INT_G_BUILDING_UNKNOWN': 'PLAYERS_BUILDING_OF_TYPE(TRIBE_GREEN, M_BUILDING_UNKNOWN)',
+            'INT_BOAT_HUT_1': 'M_BUILDING_BOAT_HUT_1',
+            'INT_FIRESTORM': 'M_SPELL_FIRESTORM',
+            'INT_MEDICINE_MAN': 'M_PERSON_MEDICINE_MAN',
+            'INT_YELLOW_MANA': 'MANA(TRIBE_YELLOW)',
+            'INT_SOMETHING_ELSE': 'SOMETHING_ELSE',
+            'USER_INT_BURN': 'USER_INT_BURN',
+            'BLUE': 'TRIBE_BLUE',
+        }
+        for name, text in cases.items():
+            with self.subTest(name=name):
+                self.assertEqual(convert_int_constant(name), text)
+                self.assertEqual(convert_int_constant(name), text)  # Cached
+
+    def test_non_names_are_returned_as_they_are(self):
+        for value in (None, 0, 7, ''):
+            self.assertIs(convert_int_constant(value), value)
+        literal = StringLiteral('plain text')
+        self.assertIs(convert_int_constant(literal), literal)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Streaming Lua output: LuaWriter indentation and statements written through it
+"""
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Parse_Script2
+from Script4_Language.Converters.Statements import convert_statements, write_statements, conversion_memo
+from Script4_Language.Converters.Writer import LuaWriter
+
+SCRIPT = '''COMPUTER_PLAYER 1
+BEGIN
+    IF ( USER_A > 1 )
+    BEGIN
+        SET USER_B 2
+        EVERY 4
+        BEGIN
+        END
+    END
+    ELSE
+    BEGIN
+        INCREMENT USER_C 1
+    ENDIF
+    IF ( USER_A > 1 )
+    BEGIN
+        SET USER_B 2
+        EVERY 4
+        BEGIN
+        END
+    ENDIF
+    SET USER_D 5
+END
+SCRIPT_END
+'''
+
+class LuaWriterTest(unittest.TestCase):
+    def test_lines_are_indented_and_joined(self):
+        buffer = io.StringIO()
+        writer = LuaWriter(buffer, '  ')
+        writer.line('a')
+        writer.indent()
+        writer.converted(['b', 'c'])
+        writer.converted('')
+        writer.indent('-')
+        writer.line('d')
+        writer.dedent()
+        writer.dedent()
+        writer.line()
+        self.assertEqual(buffer.getvalue(), 'a\n  b\n  c\n  -d\n')
+        self.assertEqual(writer.lines_written, 5)
+        with self.assertRaises(ValueError):
+            writer.dedent()
+
+    def test_capture_is_relative_to_its_level(self):
+        writer = LuaWriter(io.StringIO())
+        writer.indent()
+        self.assertTrue(writer.begin_capture())
+        self.assertFalse(writer.begin_capture())
+        writer.line('if x then')
+        writer.indent()
+        writer.lines(['y = 1'])
+        writer.dedent()
+        writer.line('end')
+        self.assertEqual(writer.end_capture(), ['if x then', '    y = 1', 'end'])
+
+    def test_streamed_statements_match_converted_lines(self):
+        ast = Parse_Script2(SCRIPT)
+        for memo_enabled in (False, True):
+            with self.subTest(memo=memo_enabled):
+                conversion_memo.clear()
+                conversion_memo.enabled = memo_enabled
+                try:
+                    buffer = io.StringIO()
+                    writer = LuaWriter(buffer)
+                    writer.indent()
+                    write_statements(writer, ast, 1, {}, {})
+                    # The blocks stored while streaming are the ones the list conversion returns
+                    expected = convert_statements(ast, 1, {}, {})
+                    self.assertEqual(buffer.getvalue(), '\n'.join('    ' + line for line in expected))
+                    conversion_memo.clear()
+                    self.assertEqual(convert_statements(ast, 1, {}, {}), expected)
+                finally:
+                    conversion_memo.enabled = True
+                    conversion_memo.clear()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+"""
+Parse time must grow linearly with the length of statement and argument lists
+"""
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Script2Parser
+
+SMALL = 1000
+LARGE = 16000
+# Allowed growth of the time per item from SMALL to LARGE items. Copying the list
+# on every reduction made it grow about as fast as the list itself.
+MAX_GROWTH = 3.0
+
+def block_of(count):
+    statements = ''.join(f"    SET USER_{chr(65 + i % 26)} {i}\n" for i in range(count))
+    return f"COMPUTER_PLAYER 1\nBEGIN\n{statements}END\nSCRIPT_END\n"
+
+def command_with(count):
+    # A command parsed by the generic DO do_command arg_list rule
+    args = ' '.join(str(i) for i in range(count))
+    return f"COMPUTER_PLAYER 1\nBEGIN\n    DO DESELECT_ALL_BLUE_PEOPLE {args}\nEND\nSCRIPT_END\n"
+
+def time_per_item(parser, script_code, count, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser.parse(script_code)
+        best = min(best, time.perf_counter() - start)
+    return best / count
+
+class ParseScalingTest(unittest.TestCase):
+    def assert_linear(self, make_script):
+        parser = Script2Parser()
+        small = time_per_item(parser, make_script(SMALL), SMALL)
+        large = time_per_item(parser, make_script(LARGE), LARGE)
+        self.assertLess(large, small * MAX_GROWTH,
+                        f"{small * 1e6:.1f}us per item at {SMALL}, {large * 1e6:.1f}us at {LARGE}")
+
+    def test_statement_list_is_linear(self):
+        self.assert_linear(block_of)
+        self.assertEqual(len(Script2Parser().parse(block_of(SMALL)).body.statements), SMALL)
+
+    def test_argument_list_is_linear(self):
+        self.assert_linear(command_with)
+
+if __name__ == '__main__':
+    unittest.main()
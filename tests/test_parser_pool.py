@@ -0,0 +1,62 @@
+"""
+Parser pool stress test: many threads parsing valid and broken scripts at once
+must get exactly the results of a serial run
+"""
+import contextlib
+import io
+import os
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Script2ParserPool, LEXER_BACKENDS
+
+THREADS = 16
+JOBS = 300
+
+def valid_script(n):
+    statements = ''.join(f"    SET USER_{chr(65 + i % 26)} ( {i} + {n} )\n" for i in range(n))
+    return (f"COMPUTER_PLAYER {n % 4}\nBEGIN\n{statements}"
+            f"    IF ( INT_GAME_TURN > {n} )\n    BEGIN\n        DO TRAIN_PEOPLE_NOW {n} INT_BRAVE\n    ENDIF\n"
+            f"    EVERY {2 ** (n % 5)}\n    BEGIN\n        INCREMENT USER_A {n}\n    END\nEND\nSCRIPT_END\n")
+
+def broken_script(n):
+    # Errors on different lines for each n, so mixed up parser state would show
+    return (f"COMPUTER_PLAYER 1\nBEGIN\n" + "    SET USER_A 1\n" * n +
+            "    SET\nEND\n" + "    INCREMENT USER_B 2\n" * (n % 3) + "    IF ( USER_A > ) BEGIN ENDIF\nEND\n")
+
+def outcome(pool, script_code):
+    ast, errors = pool.parse_with_errors(script_code)
+    return repr(ast), [(error.lineno, error.token_type, error.value) for error in errors]
+
+class ParserPoolStressTest(unittest.TestCase):
+    def setUp(self):
+        self.switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # Switch threads as often as possible
+
+    def tearDown(self):
+        sys.setswitchinterval(self.switch_interval)
+
+    def check_backend(self, backend):
+        scripts = [valid_script(i % 40 + 1) if i % 3 else broken_script(i % 40 + 1) for i in range(JOBS)]
+        with contextlib.redirect_stdout(io.StringIO()):  # Broken scripts print their errors
+            serial_pool = Script2ParserPool(max_idle=1, lexer_backend=backend)
+            expected = [outcome(serial_pool, script_code) for script_code in scripts]
+
+            pool = Script2ParserPool(lexer_backend=backend)
+            with ThreadPoolExecutor(THREADS) as executor:
+                results = list(executor.map(lambda script_code: outcome(pool, script_code), scripts))
+
+        self.assertTrue(any(errors for _, errors in expected))
+        self.assertTrue(any(not errors for _, errors in expected))
+        for index, (result, serial) in enumerate(zip(results, expected)):
+            self.assertEqual(result, serial, f"job {index} differs from the serial run")
+
+    def test_threads_match_serial_run(self):
+        for backend in LEXER_BACKENDS:
+            with self.subTest(backend=backend):
+                self.check_backend(backend)
+
+if __name__ == '__main__':
+    unittest.main()
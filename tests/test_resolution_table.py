@@ -0,0 +1,50 @@
+"""
+Resolution table of Script2 names: contents, immutability and lookups
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script4_Language.Config import STATE_ATTR_MAP, OPERATOR_MAP
+from Script4_Language.Mappers.Variables import build_variable_map
+from Script4_Language.Converters.Expressions import convert_value, convert_int_constant
+from Script2_Language.Script2_Parser import intern_symbol
+
+class ResolutionTableTest(unittest.TestCase):
+    def setUp(self):
+        self.table = build_variable_map()
+
+    def test_built_once_and_read_only(self):
+        self.assertIs(build_variable_map(), self.table)
+        with self.assertRaises(TypeError):
+            self.table['INT_NEW'] = 'NEW'
+
+    def test_entries_are_final_text(self):
+        self.assertTrue(all(type(text) is str for text in self.table.values()))
+        self.assertEqual(self.table['INT_BLUE_MANA'], 'MANA(TRIBE_BLUE)')
+        self.assertEqual(self.table['BLUE'], 'TRIBE_BLUE')
+        # Fixed rules win over the spell mappings
+        self.assertEqual(self.table['INT_CONVERT'], 'M_SPELL_CONVERT_WILD')
+        self.assertEqual(self.table['INT_NO_SPECIFIC_BUILDING'], 'INT_NO_SPECIFIC_BUILDING')
+
+    def test_config_tables_are_merged(self):
+        for name in STATE_ATTR_MAP:
+            self.assertEqual(self.table[name], convert_int_constant(name))
+        for name, text in OPERATOR_MAP.items():
+            self.assertEqual(self.table[name], text)
+
+    def test_keys_are_interned(self):
+        name = ''.join(['INT_', 'MY_MANA'])
+        key = next(key for key in self.table if key == name)
+        self.assertIs(key, intern_symbol(name))
+
+    def test_names_outside_the_table(self):
+        self.assertEqual(convert_value('USER_A', self.table), 'SC2_USR_A')
+        self.assertEqual(convert_value('INT_M_BUILDING_TEPEE', self.table),
+                         'PLAYERS_BUILDING_OF_TYPE(MY_TRIBE, M_BUILDING_TEPEE)')
+        self.assertEqual(convert_value('ON', self.table), 'ON')
+        self.assertEqual(convert_value('INT_BLUE_MANA', {}), 'MANA(TRIBE_BLUE)')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+OnSave and OnLoad: user variables saved in a fixed order and restored in reverse
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Parse_Script2
+from Script4_Language.Converters.Core import convert_script
+from Script4_Language.Converters.Structure import generate_save_functions
+
+class SaveFunctionsTest(unittest.TestCase):
+    def test_variables_of_the_script(self):
+        script = 'COMPUTER_PLAYER 1 BEGIN SET USER_B 1 IF ( USER_A > 0 ) BEGIN SET USER_B USER_A ENDIF END SCRIPT_END'
+        lines = convert_script(Parse_Script2(script), 'a.scr', 'a.lua', 1, {}, {})
+        self.assertEqual(lines[lines.index('function OnSave(state)'):], [
+            'function OnSave(state)',
+            '    state:push_int(SC2_USR_A or 0)',
+            '    state:push_int(SC2_USR_B)',
+            '    state:push_int(2)',
+            'end',
+            '',
+            'function OnLoad(state)',
+            '    if state:pop_int() ~= 2 then',
+            '        return',
+            '    end',
+            '    SC2_USR_B = state:pop_int()',
+            '    SC2_USR_A = state:pop_int()',
+            'end',
+            '',
+        ])
+        self.assertNotIn('pairs(_G)', '\n'.join(lines))
+
+    def test_variables_only_multiplied(self):
+        script = 'COMPUTER_PLAYER 1 BEGIN MULTIPLY USER_R USER_Q 3 DIVIDE USER_S 2 USER_Q END SCRIPT_END'
+        lines = convert_script(Parse_Script2(script), 'a.scr', 'a.lua', 1, {}, {})
+        for name in ('SC2_USR_Q', 'SC2_USR_R', 'SC2_USR_S'):
+            self.assertIn(f'    state:push_int({name} or 0)', lines)
+            self.assertIn(f'    {name} = state:pop_int()', lines)
+
+    def test_debug_logging(self):
+        lines = generate_save_functions(['USER_A'], {'USER_A'}, debug=True)
+        self.assertIn('    log("OnSave: SC2_USR_A = " .. tostring(SC2_USR_A))', lines)
+        self.assertIn('    log("OnLoad: SC2_USR_A = " .. tostring(SC2_USR_A))', lines)
+        self.assertEqual(sum('log(' in line for line in generate_save_functions(['USER_A'], {'USER_A'})), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+"""
+ScriptInfo: everything the conversion stages need to know about a script, from one walk
+"""
+import os
+import sys
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Parse_Script2
+from Script4_Language.Converters.Analysis import analyze_script
+from Script4_Language.Converters.Core import extract_user_variables
+
+SCRIPT = '''COMPUTER_PLAYER 1
+BEGIN
+    SET USER_A INT_M_SPELL_BLAST
+    DO CREATE_MSG_NARRATIVE "USER_NOT_A_VARIABLE"
+    EVERY 64 3
+    BEGIN
+        IF ( INT_MY_NUM_PEOPLE > USER_B )
+        BEGIN
+            DO ATTACK BLUE 10 BUILDING INT_HUT 0 INT_BLAST INT_BLAST INT_BLAST
+            INCREMENT INT_ATTR_EXPANSION USER_C
+        ENDIF
+        SET USER_D ( INT_ATTR_MAX_ATTACKS + 1 )
+    END
+    EVERY 64
+    BEGIN
+        MULTIPLY USER_E USER_A 2
+        DO ATTACK BLUE 10 BUILDING INT_HUT 0 INT_BLAST INT_BLAST INT_BLAST
+    END
+END
+'''
+
+class ScriptInfoTest(unittest.TestCase):
+    def test_analysis(self):
+        ast = Parse_Script2(SCRIPT)
+        info = analyze_script(ast)
+        self.assertEqual(info.user_variables, {'USER_A', 'USER_D'})
+        self.assertEqual(info.user_variables_written, {'USER_A', 'USER_D', 'USER_E'})
+        self.assertEqual(info.variables_read, {'USER_A', 'USER_B', 'USER_C'})
+        self.assertEqual(info.all_user_variables(), ['USER_A', 'USER_B', 'USER_C', 'USER_D', 'USER_E'])
+        self.assertEqual(info.int_constants, {'INT_M_SPELL_BLAST', 'INT_MY_NUM_PEOPLE', 'INT_HUT', 'INT_BLAST'})
+        self.assertEqual(info.commands, Counter({'ATTACK': 2, 'CREATE_MSG_NARRATIVE': 1}))
+        self.assertEqual(info.attributes_read, {'INT_ATTR_EXPANSION', 'INT_ATTR_MAX_ATTACKS'})
+        self.assertEqual(info.attributes_written, {'INT_ATTR_EXPANSION'})
+        self.assertEqual(info.every_periods, Counter({64: 2}))
+        self.assertEqual(info.every_timings, Counter({(64, 3): 1, (64, None): 1}))
+        self.assertEqual(info.unsupported_commands({'ATTACK': None}), ['CREATE_MSG_NARRATIVE'])
+        self.assertEqual(extract_user_variables(ast), {'USER_A': 0, 'USER_D': 0})
+
+if __name__ == '__main__':
+    unittest.main()
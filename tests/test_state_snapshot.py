@@ -0,0 +1,97 @@
+"""
+Snapshot mode: game state read in more than one place is cached in locals of OnTurn
+and of the blocks reading it
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Parse_Script2
+from Script4_Language.Mappers.Variables import build_variable_map
+from Script4_Language.Mappers.Commands import build_command_map
+from Script4_Language.Converters.Core import convert_script
+from Script4_Language.Converters.Statements import conversion_memo
+from Script4_Language.Converters.Snapshot import StateSnapshot
+
+SCRIPT = '''COMPUTER_PLAYER 1
+BEGIN
+    IF ( INT_MY_NUM_PEOPLE > 30 AND INT_MY_MANA > INT_BLUE_MANA )
+    BEGIN
+        SET USER_A ( INT_MY_NUM_PEOPLE + INT_M_PERSON_WARRIOR )
+        SET USER_B INT_BLUE_PEOPLE
+    ENDIF
+    SET USER_C ( INT_MY_MANA - INT_ATTR_EXPANSION )
+    INCREMENT INT_ATTR_EXPANSION 2
+    SET USER_D INT_ATTR_EXPANSION
+END
+SCRIPT_END
+'''
+
+BLOCK_SCRIPT = '''COMPUTER_PLAYER 1
+BEGIN
+    EVERY 256
+    BEGIN
+        SET USER_A INT_MY_MANA
+        DO SET_AUTO_BUILD ON
+        DO TRAIN_PEOPLE_NOW 3 INT_WARRIOR
+        SET USER_B ( INT_MY_MANA + INT_ATTR_EXPANSION )
+    END
+END
+SCRIPT_END
+'''
+
+def on_turn(lines):
+    start = lines.index('function OnTurn()') + 1
+    return lines[start:lines.index('end', start)]
+
+class StateSnapshotTest(unittest.TestCase):
+    def test_repeated_reads_are_cached(self):
+        ast = Parse_Script2(SCRIPT)
+        state = StateSnapshot(ast, build_variable_map())
+        self.assertEqual(state.prologue(), [
+            'local _player_my_tribe = _gsi.Players[MY_TRIBE]',
+            'local _cached_attr_expansion = READ_CP_ATTRIB(MY_TRIBE, ATTR_EXPANSION)',
+            'local _cached_my_mana = MANA(MY_TRIBE)',
+            'local _cached_my_num_people = _player_my_tribe.NumPeople',
+        ])
+        self.assertEqual(state.variable_map.get('INT_M_PERSON_WARRIOR'),
+                         '_player_my_tribe.NumPeopleOfType[M_PERSON_WARRIOR]')
+        self.assertEqual(state.variable_map.get('INT_BLUE_PEOPLE'), '_gsi.Players[TRIBE_BLUE].NumPeople')
+
+    def test_attribute_writes_refresh_the_local(self):
+        lines = convert_script(Parse_Script2(SCRIPT), 'a.scr', 'a.lua', 1, {}, build_variable_map(), snapshot=True)
+        self.assertEqual(on_turn(lines)[4:], [
+            '    if (_cached_my_num_people > 30) and (_cached_my_mana > MANA(TRIBE_BLUE)) then',
+            '        SC2_USR_A = _cached_my_num_people + _player_my_tribe.NumPeopleOfType[M_PERSON_WARRIOR]',
+            '        SC2_USR_B = _gsi.Players[TRIBE_BLUE].NumPeople',
+            '    end',
+            '    SC2_USR_C = _cached_my_mana - _cached_attr_expansion',
+            '    WRITE_CP_ATTRIB(MY_TRIBE, ATTR_EXPANSION, _cached_attr_expansion + 2)',
+            '    _cached_attr_expansion = READ_CP_ATTRIB(MY_TRIBE, ATTR_EXPANSION)',
+            '    SC2_USR_D = _cached_attr_expansion',
+        ])
+        unchanged = convert_script(Parse_Script2(SCRIPT), 'a.scr', 'a.lua', 1, {}, build_variable_map())
+        self.assertIn('    SC2_USR_D = READ_CP_ATTRIB(MY_TRIBE, ATTR_EXPANSION)', unchanged)
+
+    def test_block_reads_are_cached_in_the_block(self):
+        variable_map = build_variable_map()
+        memoized = len(conversion_memo)
+        lines = convert_script(Parse_Script2(BLOCK_SCRIPT), 'a.scr', 'a.lua', 1, build_command_map(variable_map),
+                               variable_map, snapshot=True)
+        # Read only on the turns the block runs, and again after a DO that may spend mana
+        self.assertEqual(on_turn(lines)[2:], [
+            '    if _every_256 then',
+            '        local _cached_my_mana = MANA(MY_TRIBE)',
+            '        SC2_USR_A = _cached_my_mana',
+            '        SET_AUTO_BUILD(ON)',
+            '        TRAIN_PEOPLE_NOW(MY_TRIBE, 3, M_PERSON_WARRIOR)',
+            '        _cached_my_mana = MANA(MY_TRIBE)',
+            '        SC2_USR_B = _cached_my_mana + READ_CP_ATTRIB(MY_TRIBE, ATTR_EXPANSION)',
+            '    end',
+        ])
+        # Nothing converted through the tables of the script outlives it
+        self.assertEqual(len(conversion_memo), memoized)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Statement handler registry and the shared lowering of arithmetic statements
+"""
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Parse_Script2, Node, OP_IF
+from Script4_Language.Mappers.Variables import build_variable_map
+from Script4_Language.Converters.Statements import (
+    convert_statements, write_statements, register_statement_handler, STATEMENT_HANDLERS, conversion_memo
+)
+from Script4_Language.Converters.Writer import LuaWriter
+
+SCRIPT = '''COMPUTER_PLAYER 1
+BEGIN
+    SET USER_A ( USER_B + 5 ) * 2
+    SET INT_ATTR_EXPANSION ( INT_ATTR_EXPANSION + USER_A )
+    SET USER_C INT_ATTR_EXPANSION
+    INCREMENT INT_ATTR_EXPANSION USER_A
+    DECREMENT USER_A INT_ATTR_EXPANSION
+    MULTIPLY USER_A INT_ATTR_EXPANSION 3
+    DIVIDE INT_ATTR_EXPANSION USER_A 2
+END
+SCRIPT_END
+'''
+
+class LogStatement(Node):
+    """A node type the parser does not build"""
+    __slots__ = ('message',)
+    op = 100
+    tag = 'log'
+    fields = __slots__
+
+    def __init__(self, message):
+        self.message = message
+
+    def legacy(self):
+        return (self.tag, self.message)
+
+class StatementHandlerTest(unittest.TestCase):
+    def test_arithmetic_statements(self):
+        lines = convert_statements(Parse_Script2(SCRIPT), 1, {}, build_variable_map())
+        self.assertEqual(lines, [
+            'SC2_USR_A = (SC2_USR_B + 5) * 2',
+            'WRITE_CP_ATTRIB(MY_TRIBE, ATTR_EXPANSION, READ_CP_ATTRIB(MY_TRIBE, ATTR_EXPANSION) + SC2_USR_A)',
+            'SC2_USR_C = READ_CP_ATTRIB(MY_TRIBE, ATTR_EXPANSION)',
+            'WRITE_CP_ATTRIB(MY_TRIBE, ATTR_EXPANSION, READ_CP_ATTRIB(MY_TRIBE, ATTR_EXPANSION) + SC2_USR_A)',
+            'SC2_USR_A = SC2_USR_A - READ_CP_ATTRIB(MY_TRIBE, ATTR_EXPANSION)',
+            'SC2_USR_A = READ_CP_ATTRIB(MY_TRIBE, ATTR_EXPANSION) * 3',
+            'WRITE_CP_ATTRIB(MY_TRIBE, ATTR_EXPANSION, math.floor(SC2_USR_A / 2))',
+        ])
+
+    def test_long_expression_chain(self):
+        terms = 3000
+        script = f"COMPUTER_PLAYER 1 BEGIN SET USER_A {' - '.join(['USER_B'] * terms)} END SCRIPT_END"
+        line, = convert_statements(Parse_Script2(script), 1, {}, {})
+        self.assertEqual(line, 'SC2_USR_A = ' + ' - '.join(['SC2_USR_B'] * terms))
+
+    def test_registered_handler_for_a_new_node_type(self):
+        def convert_log(stmt, tribe, command_map, variable_map, indent_str):
+            return f'{indent_str}log("{stmt.message}")'
+        register_statement_handler(LogStatement.op, convert_log)
+        conversion_memo.clear()
+        try:
+            statements = [LogStatement('first'), LogStatement('second'), LogStatement('first')]
+            expected = ['log("first")', 'log("second")', 'log("first")']
+            self.assertEqual(convert_statements(statements, 1, {}, {}), expected)
+            buffer = io.StringIO()
+            write_statements(LuaWriter(buffer), statements, 1, {}, {})
+            self.assertEqual(buffer.getvalue(), '\n'.join(expected))
+        finally:
+            del STATEMENT_HANDLERS[LogStatement.op]
+            conversion_memo.clear()
+        self.assertIn('UNKNOWN STATEMENT TYPE: log', convert_statements([LogStatement('x')], 1, {}, {})[0])
+
+    def test_block_statements_cannot_be_registered(self):
+        with self.assertRaises(ValueError):
+            register_statement_handler(OP_IF, lambda *args: '')
+
+if __name__ == '__main__':
+    unittest.main()
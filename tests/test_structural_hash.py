@@ -0,0 +1,59 @@
+"""
+Structural hashes of AST subtrees and the conversion memo built on them
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Parse_Script2, structural_hash, subtree_hashes
+import Script4_Language.Converters.Statements as statements
+from Script4_Language.Converters.Statements import ConversionMemo, convert_statements
+
+BLOCK = '''    EVERY 64 3
+    BEGIN
+        IF ( USER_A > 1 )
+        BEGIN
+            SET USER_B 2
+        ENDIF
+    END
+'''
+
+def parse_body(*blocks):
+    return Parse_Script2('COMPUTER_PLAYER 1\nBEGIN\n' + ''.join(blocks) + 'END\n').body.statements
+
+class StructuralHashTest(unittest.TestCase):
+    def test_equal_subtrees_hash_equal_wherever_they_are(self):
+        first, set_statement, copy = parse_body(BLOCK, '    SET USER_C 1\n', '\n\n' + BLOCK)
+        self.assertEqual(structural_hash(first), structural_hash(copy))
+        self.assertNotEqual(structural_hash(first), structural_hash(set_statement))
+        hashes = subtree_hashes([first, copy])
+        self.assertEqual(hashes[id(first.body[0])], hashes[id(copy.body[0])])
+
+    def test_values_of_different_types_hash_differently(self):
+        number, name, text = parse_body('    SET USER_A 1\n    SET USER_A USER_B\n    DO CREATE_MSG_NARRATIVE "USER_A"\n')
+        self.assertNotEqual(structural_hash(name), structural_hash(parse_body('    SET USER_A USER_C\n')[0]))
+        self.assertNotEqual(structural_hash(parse_body('    DO CREATE_MSG_NARRATIVE USER_A\n')[0]), structural_hash(text))
+        self.assertNotEqual(structural_hash(number), structural_hash(name))
+
+    def test_repeated_blocks_are_converted_once(self):
+        calls = []
+        def set_mapper(stmt, variable_map):
+            calls.append(stmt.command)
+            return 'SET_AUTO_BUILD()'
+        command_map, variable_map = {'SET_AUTO_BUILD': set_mapper}, {}
+        body = parse_body(BLOCK, '    DO SET_AUTO_BUILD ON\n', BLOCK, '    DO SET_AUTO_BUILD ON\n')
+        memo, statements.conversion_memo = statements.conversion_memo, ConversionMemo()
+        try:
+            converted = convert_statements(body, 1, command_map, variable_map)
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(converted[:5], converted[6:11])
+            self.assertEqual(convert_statements(body, 1, command_map, variable_map), converted)
+            self.assertEqual(len(calls), 1)
+            convert_statements(body, 1, dict(command_map), variable_map)  # Other tables, no reuse
+            self.assertEqual(len(calls), 2)
+        finally:
+            statements.conversion_memo = memo
+
+if __name__ == '__main__':
+    unittest.main()
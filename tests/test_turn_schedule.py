@@ -0,0 +1,75 @@
+"""
+Turn schedule of EVERY blocks: the turn is read once per OnTurn and each timing tested once
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Parse_Script2
+from Script4_Language.Converters.Analysis import analyze_script
+from Script4_Language.Converters.Statements import (
+    convert_statements, build_turn_schedule, TurnSchedule, conversion_memo
+)
+from Script4_Language.Config import MAX_EVERY_FLAGS
+
+SCRIPT = '''COMPUTER_PLAYER 1
+BEGIN
+    EVERY 64 3
+    BEGIN
+        SET USER_A 1
+    END
+    EVERY 100
+    BEGIN
+        EVERY 64 3
+        BEGIN
+            SET USER_A 1
+        END
+    END
+    EVERY USER_B 2
+    BEGIN
+    END
+END
+SCRIPT_END
+'''
+
+class TurnScheduleTest(unittest.TestCase):
+    def test_blocks_test_the_flags_of_their_timing(self):
+        ast = Parse_Script2(SCRIPT)
+        schedule = build_turn_schedule(analyze_script(ast).every_timings)
+        self.assertEqual(schedule.prologue(), [
+            'local _turn = getTurn() + MY_TRIBE',
+            'local _every_64_3 = bit32.band(_turn + 3, 63) == 0',
+            'local _every_100 = _turn % 100 == 0',
+        ])
+        conversion_memo.clear()
+        try:
+            self.assertEqual(convert_statements(ast, 1, {}, {}, schedule=schedule), [
+                'if _every_64_3 then',
+                '    SC2_USR_A = 1',
+                'end',
+                'if _every_100 then',
+                '    if _every_64_3 then',
+                '        SC2_USR_A = 1',
+                '    end',
+                'end',
+                'if (_turn + 2) % SC2_USR_B == 0 then',
+                'end',
+            ])
+            # Without a schedule the memoized blocks are not reused, each block reads the turn
+            self.assertEqual(convert_statements(ast, 1, {}, {})[0], 'if ((getTurn() + MY_TRIBE + 3) % 64 == 0) then')
+        finally:
+            conversion_memo.clear()
+
+    def test_timings(self):
+        schedule = TurnSchedule([(1, None), (16, -1), (0, None)])
+        self.assertEqual(schedule.prologue()[1:], [
+            'local _every_0 = _turn % 0 == 0',
+            'local _every_1 = bit32.band(_turn, 0) == 0',
+            'local _every_16_m1 = bit32.band(_turn - 1, 15) == 0',
+        ])
+        self.assertEqual(TurnSchedule([]).prologue(), [])
+        self.assertIsNone(build_turn_schedule([(period, None) for period in range(1, MAX_EVERY_FLAGS + 2)]))
+
+if __name__ == '__main__':
+    unittest.main()
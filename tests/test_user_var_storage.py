@@ -0,0 +1,65 @@
+"""
+User variable storage: globals, chunk locals, or the fields of one chunk-local table
+"""
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Parse_Script2
+from Script4_Language.Config import MAX_USER_LOCALS
+from Script4_Language.Converters.Core import convert_script, user_variable_fields
+from Script4_Language.Converters.Structure import generate_user_variables
+
+SCRIPT = 'COMPUTER_PLAYER 1 BEGIN SET USER_B 1 IF ( USER_A > 0 ) BEGIN SET USER_B USER_A ENDIF END SCRIPT_END'
+
+def convert(script, user_vars):
+    return convert_script(Parse_Script2(script), 'a.scr', 'a.lua', 1, {}, {}, user_vars=user_vars)
+
+def user_variables(lines):
+    start = lines.index('-- USER VARIABLES') + 1
+    return lines[start:lines.index('', start)]
+
+class UserVarStorageTest(unittest.TestCase):
+    def test_locals(self):
+        lines = convert(SCRIPT, 'local')
+        # Read-only variables are declared too, or they would stay globals
+        self.assertEqual(user_variables(lines), ['local SC2_USR_A = 0', 'local SC2_USR_B = 0'])
+        self.assertIn('    state:push_int(SC2_USR_A)', lines)
+
+    def test_table(self):
+        lines = convert(SCRIPT, 'table')
+        self.assertEqual(user_variables(lines), ['local SC2_USR = {', '    A = 0,', '    B = 0,', '}'])
+        code = '\n'.join(lines)
+        self.assertNotIn('SC2_USR_', code)
+        self.assertIn('SC2_USR.B = SC2_USR.A', code)
+        self.assertIn('    SC2_USR.A = state:pop_int()', lines)
+
+    def test_every_written_variable_is_declared(self):
+        script = ('COMPUTER_PLAYER 1 BEGIN MULTIPLY USER_R USER_Q 3 DIVIDE USER_S 2 USER_Q '
+                  'INCREMENT USER_T 1 DECREMENT USER_U 1 SET USER_V 1 END SCRIPT_END')
+        for user_vars, declaration in (('local', 'local SC2_USR_{} = 0'), ('table', '    {} = 0,')):
+            with self.subTest(user_vars=user_vars):
+                lines = convert(script, user_vars)
+                body = '\n'.join(lines[lines.index('function OnTurn()'):lines.index('function OnSave(state)')])
+                written = set(re.findall(r'SC2_USR[_.](\w+) =', body))
+                self.assertEqual(written, {'R', 'S', 'T', 'U', 'V'})
+                declared = user_variables(lines)
+                for name in written:
+                    self.assertIn(declaration.format(name), declared)
+
+    def test_too_many_locals_use_a_table(self):
+        count = MAX_USER_LOCALS + 1
+        script = 'COMPUTER_PLAYER 1 BEGIN ' + ' '.join(f'SET USER_V{i} 1' for i in range(count)) + ' END SCRIPT_END'
+        variables = user_variables(convert(script, 'local'))
+        self.assertEqual((variables[0], len(variables)), ('local SC2_USR = {', count + 2))
+
+    def test_fields(self):
+        code = 'SC2_USR_A = SC2_USR_1 + x.SC2_USR_B -- SC2_USR_A\nlog("SC2_USR_A")'
+        self.assertEqual(user_variable_fields(code, 'T'), 'T.A = T["1"] + x.SC2_USR_B -- SC2_USR_A\nlog("SC2_USR_A")')
+        self.assertEqual(generate_user_variables(['USER_1'], 'T'), ['local T = {', '    ["1"] = 0,', '}'])
+        self.assertEqual(generate_user_variables([], 'T'), ['local T = {}'])
+
+if __name__ == '__main__':
+    unittest.main()
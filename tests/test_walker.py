@@ -0,0 +1,65 @@
+"""
+AST walker: hook order, and passes built on it work at any nesting depth
+"""
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Script2_Language.Script2_Parser import Parse_Script2, walk, statement_children
+from Script2_Language.Utils.Gen import generate_script
+from Script4_Language.Converters.Core import extract_user_variables
+from Script4_Language.Converters.Statements import convert_statements
+
+# Deeper than the recursion limit, which the recursive passes used to hit
+DEPTH = sys.getrecursionlimit() + 100
+
+def nested_ifs(depth, innermost='SET USER_B ( USER_A + 1 )'):
+    return ("COMPUTER_PLAYER 1\nBEGIN\n" + "IF ( USER_A > 1 )\nBEGIN\n" * depth
+            + innermost + "\n" + "ENDIF\n" * depth + "END\n")
+
+def time_walk(ast, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        walk(ast, children=statement_children)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+class WalkerTest(unittest.TestCase):
+    def test_hook_order_and_results(self):
+        ast = Parse_Script2('COMPUTER_PLAYER 1\nBEGIN\nSET USER_A ( USER_B + 2 )\nEVERY 4\nBEGIN\nEND\nEND\n')
+        events = []
+        def pre(node, depth):
+            events.append(('pre', getattr(node, 'tag', node), depth))
+            if getattr(node, 'tag', None) == 'every':
+                return 'skipped'
+        def post(node, results, depth):
+            events.append(('post', getattr(node, 'tag', node), depth))
+            return [getattr(node, 'tag', node), results]
+        result = walk(ast.body, pre, post)
+        self.assertEqual(result, ['statements', [['set', [['+', [['USER_B', []], [2, []]]]]], 'skipped']])
+        self.assertEqual(events[:4], [('pre', 'statements', 0), ('pre', 'set', 1), ('pre', '+', 2), ('pre', 'USER_B', 3)])
+        self.assertEqual(events[-3:], [('post', 'set', 1), ('pre', 'every', 1), ('post', 'statements', 0)])
+
+    def test_deep_nesting(self):
+        ast = Parse_Script2(nested_ifs(DEPTH))
+        self.assertEqual(extract_user_variables(ast), {'USER_B': 0})
+        generated = generate_script(ast).splitlines()
+        self.assertEqual(generated[-2:], ['    ENDIF', 'END'])
+        self.assertEqual(generated[2 * DEPTH + 3].strip(), 'SET USER_B USER_A + 1')
+        converted = convert_statements(ast, 1, {}, {})
+        self.assertEqual(len(converted), 2 * DEPTH + 1)
+        self.assertTrue(converted[DEPTH].startswith(' ' * 4 * DEPTH + 'SC2_USR_B = '))
+
+    def test_walk_time_is_linear_in_depth(self):
+        small, large = 500, 4000
+        per_small = time_walk(Parse_Script2(nested_ifs(small))) / small
+        per_large = time_walk(Parse_Script2(nested_ifs(large))) / large
+        self.assertLess(per_large, per_small * 3.0,
+                        f"walk took {per_small * 1e6:.2f} us per level at depth {small}, "
+                        f"{per_large * 1e6:.2f} us at depth {large}")
+
+if __name__ == '__main__':
+    unittest.main()